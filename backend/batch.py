@@ -0,0 +1,497 @@
+import asyncio
+import io
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from rate_limit import (
+    LANE_BULK, AsyncTokenBucket, QuotaExceeded, RateLimitExceeded, client_scope, current_client,
+)
+
+
+# 单项状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class BatchStore:
+    """
+    批量任务的持久化存储(SQLite，与异步任务队列共用 JOB_QUEUE_PATH 数据库文件)
+
+    gunicorn 的多个worker进程共享同一个数据库：任意进程都能查询任务进度，各进程的 BatchManager
+    以租约领取待处理的简历。worker重启(如达到 max_requests)时进行中的简历放回队列，
+    崩溃时在租约到期后由其他进程重新领取
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0, max_attempts: int = 3):
+        """
+        Args:
+            path: 数据库文件路径
+            lease_seconds: 领取简历的租约时长，处理期间由领取者定期续约
+            max_attempts: 每份简历最多处理次数(包括worker崩溃后的重新领取)
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls) -> "BatchStore":
+        path = os.getenv("JOB_QUEUE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.db")
+        return cls(
+            path,
+            lease_seconds=float(os.getenv("BATCH_LEASE_SECONDS", 60)),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 3)),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 首次使用时才创建数据库文件
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                "id TEXT PRIMARY KEY, client TEXT, created_at REAL NOT NULL, finished_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batch_items ("
+                "batch_id TEXT NOT NULL, idx INTEGER NOT NULL, filename TEXT NOT NULL, content BLOB, "
+                "status TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "started_at REAL, finished_at REAL, lease_until REAL, owner TEXT, PRIMARY KEY (batch_id, idx))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS batch_items_queue ON batch_items (status, lease_until)")
+            self._conn = conn
+        return self._conn
+
+    def create(self, files: List[Tuple[str, bytes]], client: Optional[str] = None) -> str:
+        """写入新任务及其全部简历，返回任务ID"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO batches (id, client, created_at) VALUES (?, ?, ?)", (job_id, client, time.time())
+                )
+                conn.executemany(
+                    "INSERT INTO batch_items (batch_id, idx, filename, content, status) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, index, filename, content, PENDING) for index, (filename, content) in enumerate(files)],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self, owner: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        按提交顺序领取最多 limit 份待处理的简历(或租约已过期的执行中简历)
+
+        Returns:
+            包含 batch_id、index、filename、content、client 的字典列表
+        """
+        now = time.time()
+        claimed = []
+        with self._lock:
+            conn = self._connect()
+            # IMMEDIATE事务先获取写锁，多个进程不会领取同一份简历
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT i.batch_id, i.idx, i.filename, i.content, i.attempts, b.client "
+                    "FROM batch_items i JOIN batches b ON b.id = i.batch_id "
+                    "WHERE i.status = ? OR (i.status = ? AND i.lease_until <= ?) ORDER BY i.rowid LIMIT ?",
+                    (PENDING, RUNNING, now, limit),
+                ).fetchall()
+                for batch_id, index, filename, content, attempts, client in rows:
+                    if attempts >= self.max_attempts:
+                        # 反复导致worker崩溃或超时的简历不再重试
+                        self._finish(conn, batch_id, index, FAILED, None, "多次处理未完成，已放弃", now)
+                        continue
+                    conn.execute(
+                        "UPDATE batch_items SET status = ?, attempts = attempts + 1, started_at = ?, "
+                        "lease_until = ?, owner = ? WHERE batch_id = ? AND idx = ?",
+                        (RUNNING, now, now + self.lease_seconds, owner, batch_id, index),
+                    )
+                    claimed.append({
+                        "batch_id": batch_id, "index": index, "filename": filename, "content": content,
+                        "client": client,
+                    })
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def renew(self, owner: str) -> None:
+        """延长该进程正在处理的简历的租约"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE batch_items SET lease_until = ? WHERE owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, owner, RUNNING),
+            )
+
+    def release(self, owner: str) -> None:
+        """把该进程正在处理的简历放回队列(进程关闭时调用)，不计入处理次数"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE batch_items SET status = ?, attempts = MAX(attempts - 1, 0), started_at = NULL, "
+                "lease_until = NULL, owner = NULL WHERE owner = ? AND status = ?",
+                (PENDING, owner, RUNNING),
+            )
+
+    def finish(self, batch_id: str, index: int, status: str, result: Optional[Dict[str, Any]],
+               error: Optional[str]) -> None:
+        """记录单份简历的结果并释放文件内容，全部简历结束时标记任务完成"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._finish(conn, batch_id, index, status, result, error, time.time())
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _finish(self, conn: sqlite3.Connection, batch_id: str, index: int, status: str,
+                result: Optional[Dict[str, Any]], error: Optional[str], now: float) -> None:
+        conn.execute(
+            "UPDATE batch_items SET status = ?, result = ?, error = ?, content = NULL, finished_at = ?, "
+            "lease_until = NULL WHERE batch_id = ? AND idx = ?",
+            (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, now,
+             batch_id, index),
+        )
+        conn.execute(
+            "UPDATE batches SET finished_at = ? WHERE id = ? AND finished_at IS NULL AND NOT EXISTS "
+            "(SELECT 1 FROM batch_items WHERE batch_id = ? AND status IN (?, ?))",
+            (now, batch_id, batch_id, PENDING, RUNNING),
+        )
+
+    def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务的状态和进度，不存在时返回None"""
+        with self._lock:
+            conn = self._connect()
+            batch = conn.execute("SELECT created_at, finished_at FROM batches WHERE id = ?", (job_id,)).fetchone()
+            if batch is None:
+                return None
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM batch_items WHERE batch_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        created_at, finished_at = batch
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        total = sum(counts.values())
+        finished = counts[DONE] + counts[FAILED]
+        if finished_at is not None:
+            status = DONE
+        elif counts[PENDING] < total:
+            status = RUNNING
+        else:
+            status = PENDING
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "pending": counts[PENDING],
+            "running": counts[RUNNING],
+            "succeeded": counts[DONE],
+            "failed": counts[FAILED],
+            "progress": round(finished / total, 4) if total else 1.0,
+            "created_at": created_at,
+            "finished_at": finished_at,
+        }
+
+    def items(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """按顺序分页返回每份简历的状态和结果"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT idx, filename, status, result, error, started_at, finished_at FROM batch_items "
+                "WHERE batch_id = ? ORDER BY idx LIMIT ? OFFSET ?", (job_id, limit, offset)
+            ).fetchall()
+        items = []
+        for index, filename, status, result, error, started_at, finished_at in rows:
+            duration = None
+            if started_at is not None and finished_at is not None:
+                duration = round(finished_at - started_at, 3)
+            items.append({
+                "index": index,
+                "filename": filename,
+                "status": status,
+                "result": json.loads(result) if result is not None else None,
+                "error": error,
+                "duration": duration,
+            })
+        return items
+
+    def prune(self, ttl: float, max_jobs: int) -> None:
+        """删除完成超过 ttl 秒的任务，任务数超出上限时删除最早完成的任务"""
+        with self._lock:
+            conn = self._connect()
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM batches WHERE finished_at IS NOT NULL AND finished_at <= ?", (time.time() - ttl,)
+            )]
+            excess = conn.execute("SELECT COUNT(*) FROM batches").fetchone()[0] - len(expired) - max_jobs + 1
+            if excess > 0:
+                expired += [row[0] for row in conn.execute(
+                    "SELECT id FROM batches WHERE finished_at IS NOT NULL AND finished_at > ? "
+                    "ORDER BY finished_at LIMIT ?", (time.time() - ttl, excess)
+                )]
+            for job_id in expired:
+                conn.execute("DELETE FROM batch_items WHERE batch_id = ?", (job_id,))
+                conn.execute("DELETE FROM batches WHERE id = ?", (job_id,))
+
+    def pending(self) -> int:
+        """所有任务中等待处理的简历数"""
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM batch_items WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+
+    def collect_metrics(self):
+        """供 /metrics 抓取的待处理简历数(未使用批量任务时不创建数据库)"""
+        if self._conn is None and not os.path.exists(self.path):
+            return
+        yield ("batch_items_pending", "gauge", "批量任务中等待处理的简历数", [({}, self.pending())])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class BatchLimitError(Exception):
+    """批量任务超出数量或大小限制"""
+    pass
+
+
+def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, name: str,
+                 max_file_bytes: int, remaining: int) -> bytes:
+    """按块解压单个文件并统计实际字节数，不信任压缩包头部声明的大小"""
+    chunks = []
+    size = 0
+    with archive.open(info) as member:
+        while True:
+            chunk = member.read(64 * 1024)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_file_bytes:
+                raise BatchLimitError(f"压缩包中的文件 {name} 过大")
+            if size > remaining:
+                raise BatchLimitError("压缩包解压后的总大小超出限制")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def expand_uploads(files: List[Tuple[str, bytes]], supported_extensions: Tuple[str, ...],
+                   max_files: int, max_file_bytes: int = 20 * 1024 * 1024,
+                   max_total_bytes: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """
+    展开上传文件：zip压缩包中的受支持文件被逐个取出
+
+    Args:
+        files: (文件名, 内容) 列表
+        supported_extensions: 受支持的扩展名
+        max_files: 最多文件数
+        max_file_bytes: 压缩包内单个文件解压后的大小上限
+        max_total_bytes: 所有压缩包解压后的总大小上限，默认读取 BATCH_MAX_UNCOMPRESSED_BYTES
+
+    Returns:
+        (文件名, 内容) 列表
+    """
+    if max_total_bytes is None:
+        max_total_bytes = int(os.getenv("BATCH_MAX_UNCOMPRESSED_BYTES", 200 * 1024 * 1024))
+    remaining = max_total_bytes
+    expanded = []
+    for filename, content in files:
+        extension = filename.split('.')[-1].lower()
+        if extension == "zip":
+            try:
+                archive = zipfile.ZipFile(io.BytesIO(content))
+            except zipfile.BadZipFile as e:
+                raise BatchLimitError(f"无法读取压缩包 {filename}: {e}")
+            with archive:
+                for info in archive.infolist():
+                    name = os.path.basename(info.filename)
+                    # 跳过目录和 macOS 生成的元数据文件
+                    if info.is_dir() or not name or name.startswith("._") or "__MACOSX" in info.filename:
+                        continue
+                    if name.split('.')[-1].lower() not in supported_extensions:
+                        continue
+                    if len(expanded) >= max_files:
+                        raise BatchLimitError(f"单个批量任务最多包含 {max_files} 份简历")
+                    # 头部声明的大小可以伪造，这里只用于提前拒绝，实际大小在解压时统计
+                    if info.file_size > max_file_bytes:
+                        raise BatchLimitError(f"压缩包中的文件 {name} 过大")
+                    try:
+                        data = _read_member(archive, info, name, max_file_bytes, remaining)
+                    except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+                        raise BatchLimitError(f"无法解压 {name}: {e}")
+                    remaining -= len(data)
+                    expanded.append((name, data))
+        else:
+            if len(expanded) >= max_files:
+                raise BatchLimitError(f"单个批量任务最多包含 {max_files} 份简历")
+            expanded.append((filename, content))
+    return expanded
+
+
+class BatchManager:
+    """
+    批量任务管理器：在并发上限和限流器约束下并行处理简历
+
+    任务保存在 BatchStore 中，每个worker进程的管理器从中领取简历处理，
+    因此轮询请求可以落到任意进程，进程重启后未完成的简历由其他进程继续处理
+    """
+
+    def __init__(self, extract: Callable[[bytes, str], Awaitable[str]],
+                 analyze: Callable[[str], Awaitable[Dict[str, Any]]],
+                 concurrency: Optional[int] = None, rate_limiter: Optional[AsyncTokenBucket] = None,
+                 max_jobs: Optional[int] = None, job_ttl: Optional[float] = None,
+                 on_result: Optional[Callable[[str, str, Dict[str, Any]], Awaitable[None]]] = None,
+                 store: Optional[BatchStore] = None, poll_interval: Optional[float] = None):
+        """
+        Args:
+            extract: 提取文本的协程函数 (内容, 扩展名) -> 文本
+            analyze: 分析文本的协程函数 文本 -> 结果
+            concurrency: 本进程同时处理的简历数上限
+            rate_limiter: 上游调用限流器
+            max_jobs: 保留的任务数上限
+            job_ttl: 已完成任务的保留时间(秒)
+            on_result: 每份简历分析成功后调用的协程函数 (文件名, 文本, 结果)，例如写入匹配索引
+            store: 任务存储，默认由环境变量创建
+            poll_interval: 空闲时检查其他进程留下的待处理简历的间隔(秒)
+        """
+        self.extract = extract
+        self.analyze = analyze
+        self.on_result = on_result
+        self.concurrency = concurrency or int(os.getenv("BATCH_CONCURRENCY", 8))
+        self.rate_limiter = rate_limiter or AsyncTokenBucket(float(os.getenv("BATCH_RATE_LIMIT_RPM", 60)))
+        self.max_jobs = max_jobs or int(os.getenv("BATCH_MAX_JOBS", 100))
+        self.job_ttl = job_ttl or float(os.getenv("BATCH_JOB_TTL", 24 * 3600))
+        self.store = store or BatchStore.from_env()
+        self.poll_interval = poll_interval or float(os.getenv("BATCH_POLL_INTERVAL", 5))
+        # 进程重启后pid可能被复用，加随机后缀区分租约的持有者
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """开始在后台领取和处理简历"""
+        self._runner = asyncio.create_task(self._run())
+
+    async def create_job(self, files: List[Tuple[str, bytes]]) -> Dict[str, Any]:
+        """创建任务(由当前客户端提交，以其名义调用上游)，返回任务进度"""
+        job_id = await asyncio.to_thread(self._create, files, current_client().id)
+        self._wakeup.set()
+        return await self.get(job_id)
+
+    def _create(self, files: List[Tuple[str, bytes]], client: str) -> str:
+        self.store.prune(self.job_ttl, self.max_jobs)
+        return self.store.create(files, client)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务进度，不存在或已过期时返回None"""
+        return await asyncio.to_thread(self.store.progress, job_id)
+
+    async def results(self, job_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """任务进度和分页的单份简历结果，不存在或已过期时返回None"""
+        progress = await self.get(job_id)
+        if progress is None:
+            return None
+        items = await asyncio.to_thread(self.store.items, job_id, offset, limit)
+        return {**progress, "offset": offset, "items": items}
+
+    async def _run(self) -> None:
+        """领取循环：有空闲名额时领取简历，新任务创建、简历处理完成或到达轮询间隔时再次检查"""
+        last_renew = time.monotonic()
+        while True:
+            self._wakeup.clear()
+            free = self.concurrency - len(self._running)
+            try:
+                if self._running and time.monotonic() - last_renew > self.store.lease_seconds / 4:
+                    last_renew = time.monotonic()
+                    await asyncio.to_thread(self.store.renew, self.name)
+                claimed = await asyncio.to_thread(self.store.claim, self.name, free) if free > 0 else []
+            except sqlite3.Error as e:
+                print(f"领取批量任务时出错: {e}")
+                claimed = []
+            for item in claimed:
+                key = (item["batch_id"], item["index"])
+                task = asyncio.create_task(self._run_item(item))
+                self._running[key] = task
+                task.add_done_callback(lambda _, key=key: self._item_done(key))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(self.poll_interval, self.store.lease_seconds / 4))
+            except asyncio.TimeoutError:
+                pass
+
+    def _item_done(self, key: Tuple[str, int]) -> None:
+        self._running.pop(key, None)
+        self._wakeup.set()
+
+    async def _run_item(self, item: Dict[str, Any]) -> None:
+        status, result, error, text = FAILED, None, None, ""
+        try:
+            # 以提交者的名义调用上游：计入其每日额度，排在交互请求之后
+            with client_scope(item["client"] or "batch", LANE_BULK):
+                extension = item["filename"].split('.')[-1].lower()
+                text = await self.extract(item["content"], extension)
+                if not text.strip():
+                    raise ValueError("无法从文件中提取有效文本内容。")
+                result = await self._analyze_with_backoff(text)
+            status = DONE
+        except asyncio.CancelledError:
+            # 进程关闭时由 shutdown 把简历放回队列
+            raise
+        except Exception as e:
+            error = str(e)
+        try:
+            await asyncio.to_thread(self.store.finish, item["batch_id"], item["index"], status, result, error)
+        except sqlite3.Error as e:
+            # 租约到期后由其他进程重新处理
+            print(f"保存 {item['filename']} 的批量分析结果时出错: {e}")
+            return
+        if status == DONE and self.on_result is not None:
+            try:
+                await self.on_result(item["filename"], text, result)
+            except Exception as e:
+                print(f"处理 {item['filename']} 的分析结果时出错: {e}")
+
+    async def _analyze_with_backoff(self, text: str) -> Dict[str, Any]:
+        """批量任务不急于返回，被准入控制拒绝时按 Retry-After 等待后重试"""
+        while True:
+            await self.rate_limiter.acquire()
+            try:
+                return await self.analyze(text)
+            except QuotaExceeded:
+                # 当日额度用完，等待到次日没有意义
+                raise
+            except RateLimitExceeded as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def shutdown(self) -> None:
+        """停止领取简历，取消进行中的简历并放回队列，由其他worker进程或重启后的进程继续处理"""
+        tasks = list(self._running.values())
+        if self._runner is not None:
+            tasks.append(self._runner)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await asyncio.to_thread(self.store.release, self.name)
+        except sqlite3.Error as e:
+            print(f"归还未完成的批量简历时出错: {e}")
+        self.store.close()
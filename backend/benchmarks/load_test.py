@@ -0,0 +1,293 @@
+"""
+本地基准与压测：解析、提示词构建的微基准 + 针对模拟上游的端到端压测
+
+用法:
+    python backend/benchmarks/load_test.py --requests 200 --concurrency 20 --mock-latency 0.8
+
+流程:
+1. 在当前进程中测量各格式/大小简历的解析耗时和提示词构建耗时
+2. 启动模拟 DeepSeek 服务(mock_deepseek.py)和被测服务(uvicorn main:app)两个子进程
+3. 并发请求 /api/analyze、/analyze 和 /api/analyze/stream，统计吞吐量和 p50/p95/p99
+4. 从被测服务的 /metrics 读取事件循环延迟，p99 明显升高说明有同步代码阻塞了事件循环
+
+默认关闭分析缓存和提取缓存，保证每个请求都走完整流程
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(BACKEND_DIR)
+sys.path.append(BENCHMARK_DIR)
+
+from resumes import FORMATS, SIZES, make_resume  # noqa: E402
+
+_CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩法计算百分位"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, seconds: List[float], elapsed: Optional[float] = None, errors: int = 0) -> str:
+    ms = [s * 1000 for s in seconds]
+    throughput = f"{len(seconds) / elapsed:8.1f}" if elapsed else f"{'-':>8}"
+    return (f"{name:<34} {len(seconds):>6} {throughput} {statistics.mean(ms) if ms else float('nan'):>9.1f} "
+            f"{percentile(ms, 50):>9.1f} {percentile(ms, 95):>9.1f} {percentile(ms, 99):>9.1f} {errors:>6}")
+
+
+def print_header(title: str) -> None:
+    print(f"\n== {title} ==")
+    print(f"{'场景':<34} {'次数':>6} {'吞吐/s':>8} {'均值ms':>9} {'p50ms':>9} {'p95ms':>9} {'p99ms':>9} {'错误':>6}")
+
+
+def time_calls(func: Callable[[], object], runs: int) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_micro_benchmarks(formats: List[str], sizes: List[str], runs: int) -> None:
+    """进程内测量解析和提示词构建，不涉及网络"""
+    from deepseek_wrapper import DeepSeekWrapper
+    from extractors import extract_text
+    from keywords import KeywordExtractor
+
+    print_header("解析(进程内)")
+    texts: Dict[str, str] = {}
+    for file_format in formats:
+        for size in sizes:
+            content = make_resume(file_format, size)
+            texts[f"{file_format}/{size}"] = extract_text(content, file_format)
+            timings = time_calls(lambda: extract_text(content, file_format), runs)
+            print(summarize(f"extract {file_format}/{size} ({len(content) // 1024}KB)", timings))
+
+    print_header("提示词构建(进程内)")
+    wrapper = DeepSeekWrapper(api_key="bench", keyword_extractor=KeywordExtractor.from_env())
+
+    def build_prompts(text: str) -> None:
+        wrapper.local_keywords(text)
+        for chunk in wrapper._prepare_chunks(text):
+            wrapper.providers.primary.build_body(wrapper.prompt.format(resume_text=chunk), system=wrapper.system_prompt)
+
+    for name, text in texts.items():
+        if not name.startswith("txt/"):
+            continue
+        timings = time_calls(lambda: build_prompts(text), runs)
+        print(summarize(f"prompt {name} ({len(text)} chars)", timings))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_process(args: List[str], env: Dict[str, str], cwd: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable] + args, env=env, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"服务启动失败: {process.stderr.read().decode(errors='replace')[-2000:]}")
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"等待 {url} 超时")
+
+
+async def _one_request(client: httpx.AsyncClient, endpoint: str, file_format: str, size: str,
+                       seed: int) -> Tuple[float, Optional[float], int]:
+    """发送一个请求，返回 (总耗时, 首个事件耗时, 状态码)"""
+    content = make_resume(file_format, size, seed)
+    files = {"file": (f"resume.{file_format}", content, _CONTENT_TYPES[file_format])}
+    started = time.perf_counter()
+    first_event = None
+    if endpoint.endswith("/stream"):
+        async with client.stream("POST", endpoint, files=files) as response:
+            async for line in response.aiter_lines():
+                if first_event is None and line.startswith("event:"):
+                    first_event = time.perf_counter() - started
+            status = response.status_code
+    else:
+        response = await client.post(endpoint, files=files)
+        status = response.status_code
+    return time.perf_counter() - started, first_event, status
+
+
+async def run_load(base_url: str, endpoint: str, formats: List[str], sizes: List[str],
+                   requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    results: Dict[str, List[Tuple[float, Optional[float], int]]] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        async def worker(index: int) -> None:
+            file_format = formats[index % len(formats)]
+            size = sizes[(index // len(formats)) % len(sizes)]
+            async with semaphore:
+                try:
+                    outcome = await _one_request(client, endpoint, file_format, size, index)
+                except httpx.HTTPError:
+                    outcome = (0.0, None, 0)
+            results.setdefault(f"{file_format}/{size}", []).append(outcome)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    print_header(f"端到端 {endpoint} (并发 {concurrency})")
+    all_ok = []
+    for name in sorted(results):
+        ok = [r[0] for r in results[name] if r[2] == 200]
+        errors = sum(1 for r in results[name] if r[2] != 200)
+        all_ok.extend(ok)
+        print(summarize(f"{endpoint} {name}", ok, errors=errors))
+        first_events = [r[1] for r in results[name] if r[1] is not None]
+        if first_events:
+            print(summarize(f"  首个事件 {name}", first_events))
+    total_errors = sum(1 for rs in results.values() for r in rs if r[2] != 200)
+    print(summarize(f"{endpoint} 合计", all_ok, elapsed, total_errors))
+
+
+_BUCKET_PATTERN = re.compile(r'^(\w+)_bucket\{(.*?)le="([^"]+)"\}\s+(\S+)$')
+_TOKENS_PATTERN = re.compile(r'^llm_tokens_total\{kind="(\w+)"\}\s+(\S+)$', re.MULTILINE)
+
+
+def histogram_quantile(metrics_text: str, name: str, q: float) -> Optional[float]:
+    """按Prometheus的方式从累计分桶中线性插值估算分位数(合并所有标签)"""
+    buckets: Dict[float, float] = {}
+    for line in metrics_text.splitlines():
+        match = _BUCKET_PATTERN.match(line)
+        if match and match.group(1) == name:
+            bound = float("inf") if match.group(3) == "+Inf" else float(match.group(3))
+            buckets[bound] = buckets.get(bound, 0.0) + float(match.group(4))
+    if not buckets:
+        return None
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if total == 0:
+        return 0.0
+    rank = q * total
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            fraction = (rank - previous_count) / max(buckets[bound] - previous_count, 1e-9)
+            return previous_bound + (bound - previous_bound) * fraction
+        previous_bound, previous_count = bound, buckets[bound]
+    return previous_bound
+
+
+async def report_server_metrics(base_url: str) -> None:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        text = (await client.get("/metrics")).text
+    print("\n== 被测服务指标(/metrics 分桶估算) ==")
+    for name, label in [
+        ("event_loop_lag_seconds", "事件循环延迟"),
+        ("resume_extraction_seconds", "解析耗时(服务端)"),
+        ("llm_upstream_latency_seconds", "上游延迟"),
+        ("http_request_duration_seconds", "请求耗时(服务端)"),
+    ]:
+        values = [histogram_quantile(text, name, q) for q in (0.5, 0.95, 0.99)]
+        if values[0] is None:
+            continue
+        print(f"{label:<20} p50={values[0] * 1000:8.1f}ms  p95={values[1] * 1000:8.1f}ms  "
+              f"p99={values[2] * 1000:8.1f}ms")
+
+    tokens = {kind: value for kind, value in _TOKENS_PATTERN.findall(text)}
+    prompt_tokens = float(tokens.get("prompt", 0))
+    if prompt_tokens:
+        cached = float(tokens.get("prompt_cached", 0))
+        print(f"{'输入token':<20} {prompt_tokens:.0f}，命中前缀缓存 {cached:.0f} ({cached / prompt_tokens:.0%})")
+
+
+async def run_end_to_end(args: argparse.Namespace) -> None:
+    mock_port, app_port = _free_port(), _free_port()
+    mock = _start_process(
+        [os.path.join(BENCHMARK_DIR, "mock_deepseek.py"), "--port", str(mock_port),
+         "--latency", str(args.mock_latency), "--jitter", str(args.mock_jitter),
+         "--error-rate", str(args.mock_error_rate)],
+        dict(os.environ), BENCHMARK_DIR,
+    )
+    env = dict(os.environ)
+    env.update({
+        "DEEPSEEK_API_KEY": "bench",
+        "DEEPSEEK_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+    })
+    if not args.keep_cache:
+        env.update({"ANALYSIS_CACHE_MAX_ENTRIES": "0", "EXTRACTION_CACHE_MAX_ENTRIES": "0",
+                    "ANALYSIS_CACHE_DISK": "", "EXTRACTION_CACHE_DISK": ""})
+    app = _start_process(
+        ["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"],
+        env, BACKEND_DIR,
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        await _wait_ready(f"http://127.0.0.1:{mock_port}/docs", mock)
+        await _wait_ready(f"{base_url}/", app)
+        for endpoint in args.endpoints:
+            await run_load(base_url, endpoint, args.formats, args.sizes, args.requests, args.concurrency)
+        await report_server_metrics(base_url)
+    finally:
+        for process in (app, mock):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="每个端点的请求数")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--endpoints", nargs="+", default=["/api/analyze", "/analyze", "/api/analyze/stream"])
+    parser.add_argument("--micro-runs", type=int, default=20, help="进程内微基准的重复次数")
+    parser.add_argument("--mock-latency", type=float, default=0.5)
+    parser.add_argument("--mock-jitter", type=float, default=0.1)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--keep-cache", action="store_true", help="保留分析/提取缓存(默认关闭)")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_micro:
+        run_micro_benchmarks(args.formats, args.sizes, args.micro_runs)
+    if not args.skip_load:
+        asyncio.run(run_end_to_end(args))
+
+
+if __name__ == "__main__":
+    main()
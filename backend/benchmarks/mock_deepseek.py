@@ -0,0 +1,146 @@
+"""
+本地模拟的 DeepSeek Chat Completions 服务，用于压测和基准测试
+
+用法:
+    python backend/benchmarks/mock_deepseek.py --port 8900 --latency 0.8 --jitter 0.2 --error-rate 0.02
+
+然后把被测服务的 DEEPSEEK_BASE_URL 设置为 http://127.0.0.1:8900/v1
+
+支持普通响应和流式(SSE)响应，返回 usage 字段；按 --error-rate 随机返回
+500 或带 Retry-After 的 429，用于验证重试和熔断路径
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, Set
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class MockSettings:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, error_rate: float = 0.0,
+                 chunk_delay: float = 0.02, chunk_size: int = 12, invalid_json_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.invalid_json_rate = invalid_json_rate
+
+
+def _estimate_prompt_tokens(body: Dict[str, Any]) -> int:
+    return sum(len(message.get("content", "")) for message in body.get("messages", [])) // 2
+
+
+def _cached_prefix_tokens(body: Dict[str, Any], seen_prefixes: Set[str]) -> int:
+    """模拟上游的前缀缓存：系统提示与之前的请求完全相同时按64 token为单位计为命中"""
+    messages = body.get("messages", [])
+    if not messages or messages[0].get("role") != "system":
+        return 0
+    prefix = messages[0]["content"]
+    if prefix not in seen_prefixes:
+        seen_prefixes.add(prefix)
+        return 0
+    return len(prefix) // 2 // 64 * 64
+
+
+def _completion_text(body: Dict[str, Any], settings: MockSettings) -> str:
+    prompt = body["messages"][-1]["content"]
+    if random.random() < settings.invalid_json_rate:
+        return "抱歉，我无法按要求的格式输出。"
+    # 合并分块摘要的请求只需要纯文本
+    if "合并为一段" in prompt:
+        return "候选人具有多年后端开发经验，熟悉分布式系统和云原生技术。"
+    # 职位匹配的详细比较
+    if prompt.startswith("职位描述:"):
+        return json.dumps({
+            "score": random.randint(50, 95),
+            "strengths": ["核心技术栈与职位要求一致"],
+            "gaps": ["缺少大规模团队管理经验"],
+            "verdict": "基本匹配，建议进入面试",
+        }, ensure_ascii=False)
+    result = {
+        "summary": "候选人具有扎实的软件工程背景，主导过多个后端服务的设计与交付。",
+        "suggestions": ["量化项目成果，例如性能提升比例", "补充技术栈的使用深度", "精简与目标岗位无关的经历"],
+    }
+    if '"keywords"' in prompt:
+        result["keywords"] = ["Python", "FastAPI", "Docker", "微服务", "PostgreSQL"]
+    return json.dumps(result, ensure_ascii=False)
+
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="Mock DeepSeek")
+    seen_prefixes: Set[str] = set()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(max(0.0, random.gauss(settings.latency, settings.jitter)))
+
+        if random.random() < settings.error_rate:
+            if random.random() < 0.5:
+                return JSONResponse({"error": {"message": "rate limited"}}, status_code=429,
+                                    headers={"Retry-After": "1"})
+            return JSONResponse({"error": {"message": "internal error"}}, status_code=500)
+
+        content = _completion_text(body, settings)
+        prompt_tokens = _estimate_prompt_tokens(body)
+        cached_tokens = _cached_prefix_tokens(body, seen_prefixes)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 2,
+            "total_tokens": prompt_tokens + len(content) // 2,
+            "prompt_cache_hit_tokens": cached_tokens,
+            "prompt_cache_miss_tokens": prompt_tokens - cached_tokens,
+        }
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return {
+                "id": "mock", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def stream():
+            for start in range(0, len(content), settings.chunk_size):
+                delta = content[start:start + settings.chunk_size]
+                chunk = {"id": "mock", "object": "chat.completion.chunk", "created": created,
+                         "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(settings.chunk_delay)
+            final = {"id": "mock", "object": "chat.completion.chunk", "created": created,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="平均响应延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="延迟的标准差(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500/429的比例")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="返回非JSON内容的比例")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="流式响应中每个分块的间隔(秒)")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        chunk_delay=args.chunk_delay, invalid_json_rate=args.invalid_json_rate,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+生成不同格式、不同大小的合成简历，供基准测试和压测使用
+
+每份简历带有随机编号，保证内容(和缓存键)互不相同
+"""
+import io
+import random
+import uuid
+from typing import Dict, List
+
+from docx import Document
+
+
+# 大小档位 -> 每个经历章节的条目数
+SIZES: Dict[str, int] = {"small": 3, "medium": 15, "large": 80}
+
+FORMATS = ("pdf", "docx", "txt")
+
+_COMPANIES = ["星云科技", "蓝海数据", "极光网络", "远航智能", "青松软件", "北辰云计算"]
+_SKILLS = ["Python", "Java", "Go", "Docker", "Kubernetes", "MySQL", "Redis", "Kafka",
+           "React", "TypeScript", "Spring Boot", "FastAPI", "Elasticsearch", "AWS", "机器学习"]
+_DUTIES = [
+    "负责核心交易服务的设计与开发，日均处理请求量超过{n}万",
+    "主导数据平台重构，查询延迟降低{n}%",
+    "搭建CI/CD流水线，发布效率提升{n}%",
+    "优化缓存策略，数据库负载下降{n}%",
+    "带领{n}人小组完成微服务拆分",
+]
+_DUTIES_EN = [
+    "Designed and built the core order service handling {n}k requests per day",
+    "Led the data platform rewrite and cut query latency by {n}%",
+    "Built CI/CD pipelines and improved release frequency by {n}%",
+    "Tuned caching and reduced database load by {n}%",
+    "Managed a team of {n} engineers through a microservice migration",
+]
+
+
+def _lines(size: str, english: bool, rng: random.Random) -> List[str]:
+    entries = SIZES[size]
+    duties = _DUTIES_EN if english else _DUTIES
+    skills = rng.sample(_SKILLS, 8)
+    if english:
+        skills = [skill for skill in skills if skill.isascii()] or ["Python"]
+        lines = [f"Alex Zhang  |  alex.{uuid.uuid4().hex[:8]}@example.com  |  138-0000-0000", "",
+                 "Summary", "Backend engineer with eight years of experience in distributed systems.", "",
+                 "Experience"]
+        for i in range(entries):
+            lines.append(f"Company {i + 1}  Senior Engineer  20{10 + i % 14}-20{11 + i % 14}")
+            lines.extend(rng.choice(duties).format(n=rng.randint(2, 90)) for _ in range(3))
+        lines += ["", "Skills", ", ".join(skills), "", "Education", "B.S. Computer Science, 2012"]
+        return lines
+
+    lines = [f"张三  |  zhangsan.{uuid.uuid4().hex[:8]}@example.com  |  13800000000", "",
+             "个人简介", "八年后端开发经验，熟悉分布式系统与云原生技术。", "", "工作经历"]
+    for i in range(entries):
+        lines.append(f"{rng.choice(_COMPANIES)}  高级工程师  20{10 + i % 14}-20{11 + i % 14}")
+        lines.extend(rng.choice(duties).format(n=rng.randint(2, 90)) for _ in range(3))
+    lines += ["", "专业技能", "、".join(skills), "", "教育背景", "某某大学 计算机科学与技术 本科 2012"]
+    return lines
+
+
+def make_txt(size: str, rng: random.Random) -> bytes:
+    return "\n".join(_lines(size, False, rng)).encode("utf-8")
+
+
+def make_docx(size: str, rng: random.Random) -> bytes:
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "个人简历"
+    lines = _lines(size, False, rng)
+    for line in lines:
+        doc.add_paragraph(line)
+    table = doc.add_table(rows=3, cols=2)
+    for row, (name, level) in zip(table.rows, [("Python", "精通"), ("Docker", "熟练"), ("英语", "CET-6")]):
+        row.cells[0].text = name
+        row.cells[1].text = level
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _pdf_escape(text: str) -> bytes:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace")
+
+
+def make_pdf(size: str, rng: random.Random, lines_per_page: int = 45) -> bytes:
+    """生成只含标准字体(Helvetica)的最小PDF，内容为英文"""
+    lines = _lines(size, True, rng)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    objects: Dict[int, bytes] = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    next_id = 4
+    for page_lines in pages:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        stream = b"BT /F1 10 Tf 50 760 Td 14 TL " + b" ".join(
+            b"(" + _pdf_escape(line) + b") '" for line in page_lines
+        ) + b" ET"
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        kids.append(page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % next_id
+    for object_id in range(1, next_id):
+        out += b"%010d 00000 n \n" % offsets[object_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_id, xref)
+    return bytes(out)
+
+
+_MAKERS = {"pdf": make_pdf, "docx": make_docx, "txt": make_txt}
+
+
+def make_resume(file_format: str, size: str, seed: int = 0) -> bytes:
+    """
+    生成一份合成简历
+
+    Args:
+        file_format: pdf / docx / txt
+        size: small / medium / large
+        seed: 随机种子(联系方式中的随机编号不受种子影响，保证每份内容不同)
+    """
+    return _MAKERS[file_format](size, random.Random(seed))
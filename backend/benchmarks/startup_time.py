@@ -0,0 +1,165 @@
+"""
+冷启动基准：导入耗时报告 + 从启动进程到首个请求完成的时间
+
+用法:
+    python backend/benchmarks/startup_time.py
+    python backend/benchmarks/startup_time.py --top 30 --skip-cold-start
+
+流程:
+1. 用 python -X importtime 导入 main，按累计耗时列出 main 直接导入的模块和自身耗时最高的模块
+2. 分别在关闭和开启启动预热(STARTUP_WARMUP)时启动被测服务(uvicorn main:app)，测量
+   端口可用时间、首个PDF关键词请求和首个分析请求(针对模拟上游)的耗时，模拟休眠实例被唤醒的场景
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BENCHMARK_DIR)
+
+from load_test import (  # noqa: E402
+    BACKEND_DIR, _CONTENT_TYPES, _free_port, _start_process, _wait_ready
+)
+from resumes import make_resume  # noqa: E402
+
+
+def print_header(title: str) -> None:
+    print(f"\n== {title} ==")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, int, str]]:
+    """解析 -X importtime 的输出，返回 (层级, 自身微秒, 累计微秒, 模块名) 列表"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def report_import_time(module: str, top: int) -> None:
+    print_header(f"导入耗时 (python -X importtime -c 'import {module}')")
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        return
+    rows = parse_importtime(result.stderr)
+    total = next((cumulative for depth, _, cumulative, name in rows if name == module and depth == 0), 0)
+    print(f"import {module}: {total / 1000:.1f} ms (含解释器启动的进程耗时 {wall * 1000:.0f} ms)")
+
+    # -X importtime 按导入完成的顺序输出，子模块在父模块之前，层级为1的是被测模块直接导入的模块
+    direct = sorted((row for row in rows if row[0] == 1), key=lambda row: -row[2])[:top]
+    print(f"\n{module} 直接导入的模块(按累计耗时):")
+    for _, _, cumulative, name in direct:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    heaviest = sorted(rows, key=lambda row: -row[1])[:top]
+    print("\n自身耗时最高的模块:")
+    for _, self_us, _, name in heaviest:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+
+async def _timed_post(client: httpx.AsyncClient, url: str, file_format: str, seed: int) -> float:
+    content = make_resume(file_format, "medium", seed=seed)
+    files = {"file": (f"resume.{file_format}", content, _CONTENT_TYPES[file_format])}
+    started = time.perf_counter()
+    response = await client.post(url, files=files)
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    return elapsed
+
+
+async def measure_cold_start(warmup: bool, mock_port: int, idle: float) -> Dict[str, float]:
+    """启动一次被测服务，返回各阶段耗时(秒)"""
+    app_port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "DEEPSEEK_API_KEY": "bench",
+        "DEEPSEEK_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "STARTUP_WARMUP": "true" if warmup else "false",
+        "ANALYSIS_CACHE_MAX_ENTRIES": "0", "EXTRACTION_CACHE_MAX_ENTRIES": "0",
+        "ANALYSIS_CACHE_DISK": "", "EXTRACTION_CACHE_DISK": "",
+        "MATCH_AUTO_INDEX": "false",
+    })
+    base_url = f"http://127.0.0.1:{app_port}"
+    started = time.perf_counter()
+    app = _start_process(
+        ["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning"],
+        env, BACKEND_DIR,
+    )
+    timings = {}
+    try:
+        await _wait_ready(f"{base_url}/healthz", app)
+        timings["listen"] = time.perf_counter() - started
+        if idle:
+            await asyncio.sleep(idle)
+        async with httpx.AsyncClient(timeout=60) as client:
+            timings["first_pdf_keywords"] = await _timed_post(client, f"{base_url}/api/keywords", "pdf", 1)
+            timings["first_analyze"] = await _timed_post(client, f"{base_url}/api/analyze", "docx", 2)
+            timings["second_analyze"] = await _timed_post(client, f"{base_url}/api/analyze", "docx", 3)
+        timings["first_request_done"] = time.perf_counter() - started
+    finally:
+        app.terminate()
+        try:
+            app.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            app.kill()
+    return timings
+
+
+async def run_cold_starts(runs: int, idle: float, mock_latency: float) -> None:
+    mock_port = _free_port()
+    mock = _start_process(
+        [os.path.join(BENCHMARK_DIR, "mock_deepseek.py"), "--port", str(mock_port),
+         "--latency", str(mock_latency), "--jitter", "0"],
+        dict(os.environ), BENCHMARK_DIR,
+    )
+    try:
+        await _wait_ready(f"http://127.0.0.1:{mock_port}/docs", mock)
+        for warmup in (False, True):
+            print_header(f"冷启动 STARTUP_WARMUP={'true' if warmup else 'false'} (端口可用后等待 {idle:.1f} 秒再请求)")
+            results = [await measure_cold_start(warmup, mock_port, idle) for _ in range(runs)]
+            for key in results[0]:
+                values = sorted(result[key] for result in results)
+                print(f"  {key:<20} 中位数 {values[len(values) // 2] * 1000:8.1f} ms")
+    finally:
+        mock.terminate()
+        try:
+            mock.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            mock.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="测量导入耗时的模块")
+    parser.add_argument("--top", type=int, default=15, help="列出的模块数")
+    parser.add_argument("--runs", type=int, default=3, help="每种模式的冷启动次数")
+    parser.add_argument("--idle", type=float, default=0.0,
+                        help="端口可用后等待多久再发出首个请求(秒)，0 表示立即请求")
+    parser.add_argument("--mock-latency", type=float, default=0.2)
+    parser.add_argument("--skip-import", action="store_true")
+    parser.add_argument("--skip-cold-start", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_import:
+        report_import_time(args.module, args.top)
+    if not args.skip_cold_start:
+        asyncio.run(run_cold_starts(args.runs, args.idle, args.mock_latency))
+
+
+if __name__ == "__main__":
+    main()
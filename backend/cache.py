@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：统一Unicode形式、合并空白，使排版差异不影响缓存命中"""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+
+def make_cache_key(*parts: Any) -> str:
+    """把若干组成部分哈希为缓存键"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class CacheStats:
+    """缓存命中/未命中/淘汰计数"""
+
+    def __init__(self):
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class MemoryLRU:
+    """内存LRU层，支持条目数、字节数和TTL限制"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: Optional[float] = None, stats: Optional[CacheStats] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = stats or CacheStats()
+        self.current_bytes = 0
+        self._data: "OrderedDict[str, Tuple[Optional[float], int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.current_bytes -= size
+                self.stats.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, size: int, expires_at: Optional[float] = None) -> None:
+        if size > self.max_bytes:
+            return
+        if expires_at is None and self.ttl:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._data[key] = (expires_at, size, value)
+            self.current_bytes += size
+            while self._data and (len(self._data) > self.max_entries or self.current_bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+
+class DiskBackend(ABC):
+    """磁盘缓存层基类，值以JSON文本存储，重启后仍然有效"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """返回(JSON文本, 过期时间)，不存在或已过期时返回None"""
+
+    @abstractmethod
+    def set(self, key: str, payload: str, expires_at: Optional[float]) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBackend(DiskBackend):
+    """基于SQLite的磁盘缓存层"""
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, expires_at REAL)"
+        )
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= time.time():
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            return row[0], row[1]
+
+    def set(self, key: str, payload: str, expires_at: Optional[float]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, payload, size, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), time.time(), expires_at),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _prune(self) -> None:
+        """清理过期条目，超出字节上限时按写入时间淘汰最旧的条目"""
+        self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM cache ORDER BY created_at").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class DirectoryBackend(DiskBackend):
+    """基于目录的磁盘缓存层，每个条目一个JSON文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        file_path = self._file(key)
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        expires_at = record.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            return None
+        return record["payload"], expires_at
+
+    def set(self, key: str, payload: str, expires_at: Optional[float]) -> None:
+        file_path = self._file(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"payload": payload, "expires_at": expires_at}, f, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+
+def make_disk_backend(spec: Optional[str], max_bytes: Optional[int] = None) -> Optional[DiskBackend]:
+    """
+    根据配置创建磁盘缓存层
+
+    Args:
+        spec: "sqlite:///path/to/cache.db" 或 "dir:///path/to/dir"，为空时不启用磁盘层
+        max_bytes: 磁盘层字节上限(仅SQLite)
+    """
+    if not spec:
+        return None
+    if spec.startswith("sqlite://"):
+        return SQLiteBackend(spec[len("sqlite://"):], max_bytes=max_bytes)
+    if spec.startswith("dir://"):
+        return DirectoryBackend(spec[len("dir://"):])
+    raise ValueError(f"不支持的磁盘缓存配置: {spec}")
+
+
+class TieredCache:
+    """两级缓存：内存LRU在前，可选的磁盘层在后"""
+
+    def __init__(self, memory: Optional[MemoryLRU] = None, disk: Optional[DiskBackend] = None,
+                 ttl: Optional[float] = None, name: str = "cache"):
+        self.name = name
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.memory = memory or MemoryLRU(ttl=ttl)
+        self.memory.stats = self.stats
+        self.disk = disk
+
+    @classmethod
+    def from_env(cls, prefix: str, name: str) -> "TieredCache":
+        """
+        从环境变量创建缓存，例如 prefix="ANALYSIS_CACHE" 时读取:
+        ANALYSIS_CACHE_MAX_ENTRIES / _MAX_BYTES / _TTL / _DISK / _DISK_MAX_BYTES
+        """
+        ttl = float(os.getenv(f"{prefix}_TTL", 7 * 24 * 3600)) or None
+        memory = MemoryLRU(
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", 1024)),
+            max_bytes=int(os.getenv(f"{prefix}_MAX_BYTES", 64 * 1024 * 1024)),
+            ttl=ttl,
+        )
+        disk_max_bytes = os.getenv(f"{prefix}_DISK_MAX_BYTES")
+        disk = make_disk_backend(
+            os.getenv(f"{prefix}_DISK"), int(disk_max_bytes) if disk_max_bytes else None
+        )
+        return cls(memory=memory, disk=disk, ttl=ttl, name=name)
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            self.stats.memory_hits += 1
+        return value
+
+    def _get_disk(self, key: str) -> Optional[Any]:
+        if self.disk is not None:
+            try:
+                record = self.disk.get(key)
+                if record is not None:
+                    payload, expires_at = record
+                    value = json.loads(payload)
+            except ValueError as e:
+                # 损坏的条目按未命中处理并删除
+                print(f"磁盘缓存条目已损坏，已删除: {e}")
+                record = None
+                self._delete_disk(key)
+            except Exception as e:
+                print(f"读取磁盘缓存时出错: {e}")
+                record = None
+            if record is not None:
+                # 回填内存层
+                self.memory.set(key, value, len(payload.encode("utf-8")), expires_at)
+                self.stats.hits += 1
+                self.stats.disk_hits += 1
+                return value
+        self.stats.misses += 1
+        return None
+
+    def _delete_disk(self, key: str) -> None:
+        try:
+            self.disk.delete(key)
+        except Exception as e:
+            print(f"删除磁盘缓存条目时出错: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        return self._get_disk(key)
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self.memory.set(key, value, len(payload.encode("utf-8")), expires_at)
+        self.stats.sets += 1
+        if self.disk is not None:
+            try:
+                self.disk.set(key, payload, expires_at)
+            except Exception as e:
+                print(f"写入磁盘缓存时出错: {e}")
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """异步读取：内存层直接返回，磁盘层在线程中读取"""
+        value = self._get_memory(key)
+        if value is not None or self.disk is None:
+            if value is None:
+                self.stats.misses += 1
+            return value
+        return await asyncio.to_thread(self._get_disk, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        if self.disk is None:
+            self.set(key, value)
+        else:
+            await asyncio.to_thread(self.set, key, value)
+
+    def info(self) -> Dict[str, Any]:
+        """导出缓存统计信息"""
+        info = self.stats.to_dict()
+        info.update({
+            "name": self.name,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.current_bytes,
+            "disk": type(self.disk).__name__ if self.disk is not None else None,
+        })
+        return info
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
@@ -0,0 +1,177 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+
+# DeepSeek 官方估算：1个英文字符约0.3个token，1个中文字符约0.6个token
+_CJK_TOKEN_RATIO = 0.6
+_OTHER_TOKEN_RATIO = 0.3
+
+_CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿　-〿＀-￯]")
+
+# 页码、分隔线等无信息量的行
+_BOILERPLATE_PATTERNS = [
+    re.compile(r"^(page\s*)?\d+\s*(/|of)\s*\d+$", re.IGNORECASE),
+    re.compile(r"^第\s*\d+\s*页(\s*[/，,]?\s*共\s*\d+\s*页)?$"),
+    re.compile(r"^-?\s*\d{1,3}\s*-?$"),
+    re.compile(r"^[\-_=*·•.。…—\s]{3,}$"),
+]
+
+# 常见的简历章节标题
+_SECTION_HEADINGS = [
+    "个人信息", "基本信息", "联系方式", "求职意向", "个人简介", "自我评价", "个人总结",
+    "教育背景", "教育经历", "工作经历", "工作经验", "实习经历", "项目经历", "项目经验",
+    "专业技能", "技能特长", "技能", "证书", "荣誉奖项", "获奖情况", "校园经历", "社会实践",
+    "语言能力", "发表论文", "科研经历",
+    "summary", "profile", "objective", "about me", "education", "experience",
+    "work experience", "professional experience", "employment", "internship", "internships",
+    "projects", "project experience", "skills", "technical skills", "certifications",
+    "certificates", "awards", "honors", "publications", "languages", "activities",
+]
+_HEADING_PATTERN = re.compile(
+    r"^[\s#*【\[]*(" + "|".join(re.escape(h) for h in sorted(_SECTION_HEADINGS, key=len, reverse=True)) + r")[\s】\]:：]*$",
+    re.IGNORECASE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """本地估算文本的token数(无需调用分词器)"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return int(cjk * _CJK_TOKEN_RATIO + other * _OTHER_TOKEN_RATIO) + 1
+
+
+def clean_resume_text(text: str) -> str:
+    """
+    预处理提取出的简历文本：规范空白、删除页码和分隔线、
+    删除在多页中重复出现的页眉页脚(保留第一次出现)
+    """
+    text = unicodedata.normalize("NFKC", text)
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+
+    # 多次重复出现的短行通常是页眉页脚，只保留第一次出现
+    counts = Counter(line for line in lines if line)
+    repeated = {line for line, count in counts.items() if count >= 3 and len(line) <= 80}
+    seen_repeated = set()
+
+    cleaned = []
+    for line in lines:
+        if line in repeated:
+            if line in seen_repeated:
+                continue
+            seen_repeated.add(line)
+        if any(pattern.match(line) for pattern in _BOILERPLATE_PATTERNS):
+            continue
+        if not line:
+            # 合并连续空行
+            if cleaned and cleaned[-1] == "":
+                continue
+        cleaned.append(line)
+    return "\n".join(cleaned).strip()
+
+
+def section_heading(line: str) -> Optional[str]:
+    """行是章节标题时返回标题名(英文转为小写)，否则返回None"""
+    match = _HEADING_PATTERN.match(line)
+    return match.group(1).lower() if match else None
+
+
+def split_sections(text: str) -> List[str]:
+    """按章节标题把简历拆分为若干段"""
+    sections: List[List[str]] = [[]]
+    for line in text.splitlines():
+        if _HEADING_PATTERN.match(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    return ["\n".join(section).strip() for section in sections if "\n".join(section).strip()]
+
+
+def _split_oversized(section: str, max_tokens: int) -> List[str]:
+    """把超出预算的章节按行拆分，单行仍超出时按字符截断"""
+    pieces: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in section.splitlines():
+        line_tokens = estimate_tokens(line)
+        if line_tokens > max_tokens:
+            # 按比例估算每段字符数
+            step = max(1, int(len(line) * max_tokens / line_tokens))
+            for start in range(0, len(line), step):
+                pieces.append(line[start:start + step])
+            continue
+        if current and current_tokens + line_tokens > max_tokens:
+            pieces.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_resume(text: str, max_tokens: int) -> List[str]:
+    """
+    按章节边界把简历切分为不超过预算的若干块
+
+    Args:
+        text: 预处理后的简历文本
+        max_tokens: 每块的token预算
+
+    Returns:
+        文本块列表
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for section in split_sections(text):
+        section_tokens = estimate_tokens(section)
+        pieces = [section] if section_tokens <= max_tokens else _split_oversized(section, max_tokens)
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _dedupe_key(value: str) -> str:
+    # 只忽略空白和句末标点，保留 C++ / C# 这类有意义的符号
+    key = re.sub(r"\s+", "", unicodedata.normalize("NFKC", value)).lower()
+    return key.rstrip("。.;；,，!！")
+
+
+def dedupe(values: List[str]) -> List[str]:
+    """去重(忽略大小写、空白和句末标点)，保留首次出现的顺序"""
+    seen = set()
+    result = []
+    for value in values:
+        if not isinstance(value, str) or not value.strip():
+            continue
+        key = _dedupe_key(value)
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(value.strip())
+    return result
+
+
+def merge_analyses(analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并多个分块的分析结果，关键词和建议去重"""
+    keywords: List[str] = []
+    suggestions: List[str] = []
+    summaries: List[str] = []
+    for analysis in analyses:
+        keywords.extend(analysis.get("keywords", []))
+        suggestions.extend(analysis.get("suggestions", []))
+        if analysis.get("summary"):
+            summaries.append(analysis["summary"])
+    return {
+        "summary": " ".join(dedupe(summaries)),
+        "keywords": dedupe(keywords),
+        "suggestions": dedupe(suggestions),
+    }
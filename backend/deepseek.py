@@ -1,24 +1,81 @@
-import json
-import requests
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional
+
+from llm_output import aparse_or_repair, error_analysis, parse_or_repair, placeholder_analysis
+from llm_provider import ProviderChain
+from prompts import RESUME_USER_TEMPLATE, PromptTemplate, analysis_system_prompt
+from rate_limit import RateLimitExceeded
+from resilience import UpstreamUnavailable
+
+# 不变的分析要求和输出格式，作为系统提示放在每次请求的最前面
+_SYSTEM_PROMPT = analysis_system_prompt(
+    """
+请分析用户提供的简历内容，并提供:
+1. **简历内容摘要** (不超过150字)
+2. **关键技能提取** (列出5-10个最重要的技能关键词)
+3. **优化建议列表** (针对语言、结构、内容提出3-5条具体建议)
+""",
+    """
+请按照以下JSON格式返回结果 (确保是有效的JSON):
+{
+    "summary": "<简历内容摘要>",
+    "keywords": ["<关键词1>", "<关键词2>", ...],
+    "suggestions": ["<建议1>", "<建议2>", ...]
+}
+""",
+)
+
+_USER_PROMPT = PromptTemplate(template=RESUME_USER_TEMPLATE, input_variables=["resume_text"])
 
 class DeepSeek:
     """DeepSeek API客户端，用于与DeepSeek API进行交互"""
     
-    BASE_URL = "https://api.deepseek.com/v1"  # DeepSeek API基础URL
-    
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, providers: Optional[ProviderChain] = None):
         """
         初始化DeepSeek客户端
         
         Args:
             api_key: DeepSeek API密钥
+            providers: 模型服务链，默认按 LLM_PROVIDERS 环境变量创建
+        """
+        self.providers = providers or ProviderChain.from_env(api_key=api_key)
+        if self.providers is None:
+            raise ValueError("没有可用的模型服务，请设置 DEEPSEEK_API_KEY 或 LLM_PROVIDERS")
+    
+    def _build_prompt(self, resume_text: str) -> str:
+        """构建分析简历的提示词(只包含简历文本，分析要求在系统提示中)"""
+        return _USER_PROMPT.format(resume_text=resume_text)
+    
+    def _parse_content(self, content: str) -> Dict[str, Any]:
+        """
+        解析API返回的内容，不符合格式时发起一次修复请求
+        
+        Args:
+            content: 模型输出文本
+            
+        Returns:
+            Dict 包含摘要、关键词、建议
         """
-        self.api_key = api_key
-        self.headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        try:
+            return parse_or_repair(
+                content, lambda prompt: self.providers.complete(prompt, json_mode=True, system=_SYSTEM_PROMPT), client="deepseek"
+            )
+        except ValueError as parse_error:
+            print(f"解析DeepSeek输出时出错: {parse_error}")
+            return placeholder_analysis(client="deepseek")
+    
+    async def _aparse_content(self, content: str) -> Dict[str, Any]:
+        """异步解析API返回的内容"""
+        try:
+            return await aparse_or_repair(
+                content, lambda prompt: self.providers.acomplete(prompt, json_mode=True, system=_SYSTEM_PROMPT), client="deepseek"
+            )
+        except ValueError as parse_error:
+            print(f"解析DeepSeek输出时出错: {parse_error}")
+            return placeholder_analysis(client="deepseek")
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """分析失败时返回的基本结果"""
+        return error_analysis(error)
     
     def analyze_resume(self, resume_text: str) -> Dict[str, Any]:
         """
@@ -31,111 +88,34 @@ class DeepSeek:
             Dict 包含简历分析结果(摘要、关键词、建议)
         """
         try:
-            # 构建分析简历的提示词
-            prompt = f"""
-            请分析以下简历内容，并提供:
-            1. **简历内容摘要** (不超过150字)
-            2. **关键技能提取** (列出5-10个最重要的技能关键词)
-            3. **优化建议列表** (针对语言、结构、内容提出3-5条具体建议)
-
-            简历内容:
-            --- START ---
-            {resume_text}
-            --- END ---
-
-            请按照以下JSON格式返回结果 (确保是有效的JSON):
-            {{
-                "summary": "<简历内容摘要>",
-                "keywords": ["<关键词1>", "<关键词2>", ...],
-                "suggestions": ["<建议1>", "<建议2>", ...]
-            }}
-            """
-            
-            # 向DeepSeek API发送请求
-            response = self._call_completion_api(prompt)
-            
-            # 解析API返回的内容
-            content = response.get("content", "")
-            
-            # 尝试从内容中提取JSON
-            try:
-                # 尝试直接解析完整JSON
-                result = json.loads(content)
-            except json.JSONDecodeError:
-                # 如果不是有效JSON，尝试从文本中提取JSON部分
-                try:
-                    # 尝试找到JSON部分并解析
-                    json_start = content.find('{')
-                    json_end = content.rfind('}') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = content[json_start:json_end]
-                        result = json.loads(json_str)
-                    else:
-                        raise ValueError("无法从响应中提取JSON内容")
-                except Exception:
-                    # 如果仍然失败，创建一个基本结果
-                    result = {
-                        "summary": "无法从API响应中解析有效的摘要内容。",
-                        "keywords": [],
-                        "suggestions": ["API返回的数据格式有误，无法提取有效建议。"]
-                    }
-            
-            # 确保结果包含所有需要的字段
-            if not isinstance(result, dict):
-                result = {}
-            
-            return {
-                "summary": result.get("summary", "未能生成摘要"),
-                "keywords": result.get("keywords", []),
-                "suggestions": result.get("suggestions", [])
-            }
+            # 向模型服务发送请求并解析返回的内容
+            content = self.providers.complete(
+                self._build_prompt(resume_text), json_mode=True, system=_SYSTEM_PROMPT
+            )
+            return self._parse_content(content)
             
+        except (UpstreamUnavailable, RateLimitExceeded):
+            # 上游不可用或超出限流时直接抛出，由调用方返回503/429
+            raise
         except Exception as e:
-            print(f"调用DeepSeek API分析简历时出错: {e}")
-            return {
-                "summary": f"分析过程中出错: {str(e)}",
-                "keywords": [],
-                "suggestions": ["服务暂时不可用，请稍后重试"]
-            }
+            return self._error_result(e)
     
-    def _call_completion_api(self, prompt: str) -> Dict[str, Any]:
+    async def aanalyze_resume(self, resume_text: str) -> Dict[str, Any]:
         """
-        调用DeepSeek的文本生成API
+        异步分析简历内容
         
         Args:
-            prompt: 提示词
+            resume_text: 简历文本内容
             
         Returns:
-            Dict 包含API响应
+            Dict 包含简历分析结果(摘要、关键词、建议)
         """
         try:
-            payload = {
-                "model": "deepseek-chat",  # 使用的模型，根据DeepSeek API实际支持的模型调整
-                "messages": [
-                    {"role": "system", "content": "你是一个专业的简历分析助手，擅长提取简历中的关键信息并给出改进建议。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.5,
-                "max_tokens": 800
-            }
-            
-            response = requests.post(
-                f"{self.BASE_URL}/chat/completions",
-                headers=self.headers,
-                data=json.dumps(payload),
-                timeout=30
+            content = await self.providers.acomplete(
+                self._build_prompt(resume_text), json_mode=True, system=_SYSTEM_PROMPT
             )
-            
-            response.raise_for_status()  # 如果请求不成功则抛出异常
-            result = response.json()
-            
-            # 提取回复内容
-            try:
-                content = result["choices"][0]["message"]["content"]
-                return {"content": content}
-            except (KeyError, IndexError):
-                raise ValueError("API返回的数据格式不符合预期")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"请求DeepSeek API时出错: {e}")
-            raise Exception(f"DeepSeek API请求失败: {str(e)}") 
\ No newline at end of file
+            return await self._aparse_content(content)
+        except (UpstreamUnavailable, RateLimitExceeded):
+            raise
+        except Exception as e:
+            return self._error_result(e)
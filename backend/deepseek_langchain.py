@@ -1,7 +1,12 @@
 import json
-import requests
 from typing import Dict, Any, List, Optional, Mapping
 
+from llm_output import aparse_or_repair, error_analysis, parse_or_repair, placeholder_analysis
+from llm_provider import ProviderChain
+from prompts import RESUME_USER_TEMPLATE, PromptTemplate, analysis_system_prompt
+from rate_limit import RateLimitExceeded
+from resilience import UpstreamUnavailable
+
 
 class LLM:
     """基础LLM类"""
@@ -16,6 +21,13 @@ class LLM:
         stop: Optional[List[str]] = None,
     ) -> str:
         pass
+    
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+    ) -> str:
+        pass
 
 
 class BaseModel:
@@ -28,15 +40,6 @@ def Field(description=None):
     return None
 
 
-class PromptTemplate:
-    """提示模板类"""
-    
-    def __init__(self, template, input_variables, partial_variables=None):
-        self.template = template
-        self.input_variables = input_variables
-        self.partial_variables = partial_variables or {}
-
-
 class PydanticOutputParser:
     """Pydantic输出解析器"""
     
@@ -62,20 +65,20 @@ class LLMChain:
     
     def __init__(self, llm, prompt):
         self.llm = llm
+        # 模板在创建时已编译，这里只填充变量
         self.prompt = prompt
     
+    def _format_prompt(self, **kwargs):
+        """格式化提示词"""
+        return self.prompt.format(**kwargs)
+    
     def run(self, **kwargs):
         """运行链"""
-        # 简单实现
-        formatted_prompt = self.prompt.template
-        for key, value in kwargs.items():
-            if key in self.prompt.input_variables:
-                formatted_prompt = formatted_prompt.replace(f"{{{key}}}", value)
-                
-        for key, value in self.prompt.partial_variables.items():
-            formatted_prompt = formatted_prompt.replace(f"{{{key}}}", value)
-                
-        return self.llm._call(formatted_prompt)
+        return self.llm._call(self._format_prompt(**kwargs))
+    
+    async def arun(self, **kwargs):
+        """异步运行链"""
+        return await self.llm._acall(self._format_prompt(**kwargs))
 
 
 class KeywordsModel(BaseModel):
@@ -87,50 +90,40 @@ class KeywordsModel(BaseModel):
 class DeepSeekLLM(LLM):
     """DeepSeek API的LangChain LLM适配器"""
     
-    api_key: str = None
-    base_url: str = "https://api.deepseek.com/v1"
-    model_name: str = "deepseek-chat"
-    temperature: float = 0.5
-    max_tokens: int = 800
-    
     @property
     def _llm_type(self) -> str:
         return "deepseek"
     
+    def __init__(self, api_key: str = None, providers: Optional[ProviderChain] = None, json_mode: bool = True,
+                 system_prompt: Optional[str] = None):
+        # 以JSON模式(response_format)请求输出
+        self.json_mode = json_mode
+        # 不变的指令放在系统提示中，便于上游缓存前缀
+        self.system_prompt = system_prompt
+        self.providers = providers or ProviderChain.from_env(api_key=api_key)
+        if self.providers is None:
+            raise ValueError("没有可用的模型服务，请设置 DEEPSEEK_API_KEY 或 LLM_PROVIDERS")
+    
     def _call(
         self,
         prompt: str,
         stop: Optional[List[str]] = None,
     ) -> str:
-        """调用DeepSeek API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": self.model_name,
-            "messages": [
-                {"role": "system", "content": "你是一个专业的简历分析助手，擅长提取简历中的关键信息并给出改进建议。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens
-        }
-        
+        """调用模型服务(主服务不可用时自动切换后备服务)"""
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=30
-            )
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            return result["choices"][0]["message"]["content"]
-            
+            return self.providers.complete(prompt, json_mode=self.json_mode, system=self.system_prompt)
+        except Exception as e:
+            print(f"调用DeepSeek API时出错: {e}")
+            raise e
+    
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+    ) -> str:
+        """异步调用模型服务"""
+        try:
+            return await self.providers.acomplete(prompt, json_mode=self.json_mode, system=self.system_prompt)
         except Exception as e:
             print(f"调用DeepSeek API时出错: {e}")
             raise e
@@ -139,34 +132,42 @@ class DeepSeekLLM(LLM):
 class ResumeAnalyzer:
     """使用LangChain处理简历分析的类"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, providers: Optional[ProviderChain] = None):
         """初始化简历分析器"""
-        self.llm = DeepSeekLLM(api_key=api_key)
-        
         # 定义输出格式
         self.output_parser = PydanticOutputParser(pydantic_object=KeywordsModel)
         
-        # 创建提示模板
-        self.template = """
-        请分析以下简历内容，并提供详细的反馈：
-
-        {format_instructions}
-
-        简历内容:
-        --- START ---
-        {resume_text}
-        --- END ---
-        """
-        
-        self.prompt = PromptTemplate(
-            template=self.template,
-            input_variables=["resume_text"],
-            partial_variables={"format_instructions": self.output_parser.get_format_instructions()}
+        # 分析要求和格式说明作为系统提示，用户消息只包含简历文本
+        system_prompt = analysis_system_prompt(
+            "请分析用户提供的简历内容，并提供详细的反馈。", self.output_parser.get_format_instructions()
         )
+        self.llm = DeepSeekLLM(api_key=api_key, providers=providers, system_prompt=system_prompt)
+        
+        # 创建提示模板
+        self.prompt = PromptTemplate(template=RESUME_USER_TEMPLATE, input_variables=["resume_text"])
         
         # 创建分析链
         self.chain = LLMChain(llm=self.llm, prompt=self.prompt)
     
+    def _parse_output(self, result: str) -> Dict[str, Any]:
+        """按schema校验结构化输出，失败时修复一次"""
+        try:
+            return parse_or_repair(result, self.llm._call, client="langchain")
+        except ValueError as parse_error:
+            print(f"解析DeepSeek输出时出错: {parse_error}")
+            return placeholder_analysis(client="langchain")
+    
+    async def _aparse_output(self, result: str) -> Dict[str, Any]:
+        try:
+            return await aparse_or_repair(result, self.llm._acall, client="langchain")
+        except ValueError as parse_error:
+            print(f"解析DeepSeek输出时出错: {parse_error}")
+            return placeholder_analysis(client="langchain")
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """分析失败时返回的基本结果"""
+        return error_analysis(error)
+    
     def analyze_resume(self, resume_text: str) -> Dict[str, Any]:
         """分析简历内容"""
         try:
@@ -174,42 +175,20 @@ class ResumeAnalyzer:
             result = self.chain.run(resume_text=resume_text)
             
             # 解析结构化输出
-            try:
-                parsed_output = self.output_parser.parse(result)
-                return {
-                    "summary": parsed_output.get("summary", ""),
-                    "keywords": parsed_output.get("keywords", []),
-                    "suggestions": parsed_output.get("suggestions", [])
-                }
-            except Exception as parse_error:
-                print(f"解析DeepSeek输出时出错: {parse_error}")
-                
-                # 尝试从文本中提取JSON部分
-                try:
-                    json_start = result.find('{')
-                    json_end = result.rfind('}') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = result[json_start:json_end]
-                        parsed_json = json.loads(json_str)
-                        return {
-                            "summary": parsed_json.get("summary", "未能生成摘要"),
-                            "keywords": parsed_json.get("keywords", []),
-                            "suggestions": parsed_json.get("suggestions", [])
-                        }
-                except Exception:
-                    pass
-                
-                # 如果都失败，返回一个基本结果
-                return {
-                    "summary": "无法从API响应中解析有效的摘要内容。",
-                    "keywords": [],
-                    "suggestions": ["API返回的数据格式有误，无法提取有效建议。"]
-                }
+            return self._parse_output(result)
                 
+        except (UpstreamUnavailable, RateLimitExceeded):
+            # 上游不可用或超出限流时直接抛出，由调用方返回503/429
+            raise
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def aanalyze_resume(self, resume_text: str) -> Dict[str, Any]:
+        """异步分析简历内容"""
+        try:
+            result = await self.chain.arun(resume_text=resume_text)
+            return await self._aparse_output(result)
+        except (UpstreamUnavailable, RateLimitExceeded):
+            raise
         except Exception as e:
-            print(f"LangChain分析简历过程中出错: {e}")
-            return {
-                "summary": f"分析过程中出错: {str(e)}",
-                "keywords": [],
-                "suggestions": ["服务暂时不可用，请稍后重试"]
-            } 
\ No newline at end of file
+            return self._error_result(e)
@@ -1,156 +1,453 @@
-import json
-import requests
-from typing import Dict, Any, List, Optional
+import asyncio
+import os
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+
+from cache import TieredCache, make_cache_key, normalize_text
+from chunking import chunk_resume, clean_resume_text, estimate_tokens, merge_analyses
+from keywords import KeywordExtractor
+from llm_output import aparse_or_repair, error_analysis, extract_comparison, parse_or_repair, placeholder_analysis
+from llm_provider import ProviderChain
+from prompts import (
+    MATCH_FORMAT_INSTRUCTIONS, MATCH_INSTRUCTIONS, MATCH_USER_TEMPLATE, RESUME_USER_TEMPLATE, PromptTemplate,
+    analysis_system_prompt,
+)
+from quick_analysis import TIER_LLM, QuickAnalyzer
+from rate_limit import AdmissionController, RateLimitExceeded
+from resilience import UpstreamUnavailable
+from singleflight import SingleFlight
+from streaming_json import IncrementalAnalysisParser
+
+# 提示模板版本，修改模板或输出格式时递增，使旧的缓存结果失效
+PROMPT_VERSION = "3"
 
 class OutputFormatter:
     """格式化输出解析器，类似于LangChain的OutputParser"""
     
-    def __init__(self):
+    def __init__(self, include_keywords: bool = True):
+        # 关键词由本地提取时不再要求模型输出，减少输出token
+        self.include_keywords = include_keywords
         self.format_description = {
             "summary": "简历的简短摘要，不超过150字",
             "keywords": "从简历中提取的5-10个关键技能和经验",
             "suggestions": "改进简历的3-5条具体建议"
         }
+        if not include_keywords:
+            del self.format_description["keywords"]
     
     def get_format_instructions(self) -> str:
         """获取格式化指令"""
+        keywords_line = '    "keywords": ["技能1", "技能2", ...],\n' if self.include_keywords else ""
         return f"""
 请按照以下JSON格式返回结果:
 {{
     "summary": "简历的简短摘要，不超过150字",
-    "keywords": ["技能1", "技能2", ...],
-    "suggestions": ["建议1", "建议2", ...]
+{keywords_line}    "suggestions": ["建议1", "建议2", ...]
 }}
 务必确保返回的是有效的JSON格式。
 """
 
-class PromptTemplate:
-    """提示模板，类似于LangChain的PromptTemplate"""
-    
-    def __init__(self, template: str, input_variables: List[str], partial_variables: Dict[str, str] = None):
-        self.template = template
-        self.input_variables = input_variables
-        self.partial_variables = partial_variables or {}
-    
-    def format(self, **kwargs) -> str:
-        """格式化提示模板"""
-        template = self.template
-        
-        # 首先替换部分变量
-        for key, value in self.partial_variables.items():
-            template = template.replace(f"{{{key}}}", value)
-        
-        # 然后替换输入变量
-        for key in self.input_variables:
-            if key in kwargs:
-                template = template.replace(f"{{{key}}}", kwargs[key])
-        
-        return template
+SUMMARY_MERGE_TEMPLATE = """
+以下是同一份简历各部分的摘要，请合并为一段不超过150字的整体摘要，只输出摘要文本：
+
+{summaries}
+"""
 
 class DeepSeekWrapper:
     """DeepSeek API包装器，提供类似LangChain的接口但不依赖LangChain"""
     
-    def __init__(self, api_key: str):
-        """初始化DeepSeek包装器"""
-        self.api_key = api_key
-        self.base_url = "https://api.deepseek.com/v1"
-        self.model_name = "deepseek-chat"
-        self.temperature = 0.5
-        self.max_tokens = 800
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[TieredCache] = None,
+                 admission: Optional[AdmissionController] = None,
+                 keyword_extractor: Optional[KeywordExtractor] = None,
+                 providers: Optional[ProviderChain] = None,
+                 quick_analyzer: Optional[QuickAnalyzer] = None):
+        """
+        初始化DeepSeek包装器
         
-        # 创建输出格式化器
-        self.output_formatter = OutputFormatter()
+        Args:
+            api_key: DeepSeek API密钥(未传入 providers 时使用)
+            providers: 模型服务链，默认按 LLM_PROVIDERS 环境变量创建
+            quick_analyzer: 本地快速分析(可选)，模型分析失败时代替占位结果，流式分析时先推送
+        """
+        # 分析结果缓存(可选)，命中时跳过API调用
+        self.cache = cache
+        # 模型服务链(主服务 + 可选的后备服务)，admission 为主服务的限流和并发控制
+        self.providers = providers or ProviderChain.from_env(api_key=api_key, admission=admission)
+        if self.providers is None:
+            raise ValueError("没有可用的模型服务，请设置 DEEPSEEK_API_KEY 或 LLM_PROVIDERS")
+        self.admission = self.providers.primary.admission
+        # 相同简历的并发分析合并为一次上游调用
+        self.inflight = SingleFlight("analysis")
+        # 单次请求中简历文本的token预算，超出时分块并发分析后合并
+        self.max_input_tokens = int(os.getenv("LLM_MAX_INPUT_TOKENS", 3000))
+        # 分块数上限，保证单份简历的调用次数和延迟有界
+        self.max_chunks = int(os.getenv("LLM_MAX_CHUNKS", 4))
         
-        # 创建提示模板
-        self.template = """
-请分析以下简历内容，并提供详细的反馈：
-
-{format_instructions}
-
-简历内容:
---- START ---
-{resume_text}
---- END ---
-"""
+        # 本地关键词提取(可选)，启用后提示词只要求摘要和建议
+        self.keyword_extractor = keyword_extractor
+        
+        # 本地快速分析(可选)，结果的 tier 字段为 local
+        self.quick_analyzer = quick_analyzer
+        
+        # 创建输出格式化器
+        self.output_formatter = OutputFormatter(include_keywords=keyword_extractor is None)
         
-        self.prompt = PromptTemplate(
-            template=self.template,
-            input_variables=["resume_text"],
-            partial_variables={"format_instructions": self.output_formatter.get_format_instructions()}
+        # 分析要求和输出格式放在系统提示中，每次请求逐字节相同，可以命中上游的前缀缓存
+        self.system_prompt = analysis_system_prompt(
+            "请分析用户提供的简历内容，并提供详细的反馈。", self.output_formatter.get_format_instructions()
         )
-    
-    def _call_api(self, prompt: str) -> str:
-        """调用DeepSeek API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
         
-        payload = {
-            "model": self.model_name,
-            "messages": [
-                {"role": "system", "content": "你是一个专业的简历分析助手，擅长提取简历中的关键信息并给出改进建议。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens
-        }
+        # 用户消息模板只包含简历文本，启动时编译一次
+        self.prompt = PromptTemplate(template=RESUME_USER_TEMPLATE, input_variables=["resume_text"])
         
+        # 职位匹配的详细比较使用单独的系统提示，同样保持逐字节不变
+        self.match_system_prompt = analysis_system_prompt(MATCH_INSTRUCTIONS, MATCH_FORMAT_INSTRUCTIONS)
+        self.match_prompt = PromptTemplate(
+            template=MATCH_USER_TEMPLATE, input_variables=["job_description", "resume_text"]
+        )
+    
+    def _call_api(self, prompt: str, json_mode: bool = False, system: Optional[str] = None) -> str:
+        """调用模型服务(主服务不可用时自动切换后备服务)"""
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=30
-            )
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            return result["choices"][0]["message"]["content"]
-            
+            return self.providers.complete(prompt, json_mode=json_mode, system=system)
         except Exception as e:
             print(f"调用DeepSeek API时出错: {e}")
             raise e
     
+    async def _acall_api(self, prompt: str, json_mode: bool = False, system: Optional[str] = None) -> str:
+        """异步调用模型服务，复用共享连接池"""
+        try:
+            return await self.providers.acomplete(prompt, json_mode=json_mode, system=system)
+        except Exception as e:
+            print(f"调用DeepSeek API时出错: {e}")
+            raise e
+    
+    def _parse_or_repair(self, result: str) -> Dict[str, Any]:
+        """按schema校验模型输出，失败时发起一次修复请求；仍然失败时抛出 ValueError"""
+        return parse_or_repair(
+            result, lambda prompt: self._call_api(prompt, json_mode=True, system=self.system_prompt), client="wrapper"
+        )
+    
+    async def _aparse_or_repair(self, result: str) -> Dict[str, Any]:
+        return await aparse_or_repair(
+            result, lambda prompt: self._acall_api(prompt, json_mode=True, system=self.system_prompt),
+            client="wrapper"
+        )
+    
+    def cache_key(self, resume_text: str) -> str:
+        """分析结果的缓存键：规范化文本 + 模型参数 + 提示模板版本"""
+        keyword_source = "local" if self.keyword_extractor is not None else "llm"
+        return make_cache_key(
+            normalize_text(resume_text), self.providers.cache_identity(), PROMPT_VERSION, keyword_source
+        )
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """分析失败时返回的基本结果"""
+        return error_analysis(error)
+    
+    def local_keywords(self, resume_text: str) -> Optional[List[str]]:
+        """本地提取关键词，未启用时返回None(关键词由模型给出)"""
+        if self.keyword_extractor is None:
+            return None
+        return self.keyword_extractor.extract(resume_text)
+    
+    async def alocal_keywords(self, resume_text: str) -> Optional[List[str]]:
+        if self.keyword_extractor is None:
+            return None
+        # 启用实体识别时较慢，放到线程中执行
+        return await asyncio.to_thread(self.keyword_extractor.extract, resume_text)
+    
+    def _fallback(self, resume_text: str, keywords: Optional[List[str]],
+                  error: Optional[Exception] = None) -> Dict[str, Any]:
+        """模型分析失败或输出无法解析时的结果：有本地快速分析时使用它，否则返回占位结果"""
+        if self.quick_analyzer is not None:
+            if error is not None:
+                print(f"分析简历过程中出错，返回本地快速分析结果: {error}")
+            return self._with_keywords(self.quick_analyzer.analyze(resume_text), keywords)
+        fallback = self._error_result(error) if error is not None else placeholder_analysis()
+        return self._with_keywords(fallback, keywords)
+    
+    async def _afallback(self, resume_text: str, keywords: Optional[List[str]],
+                         error: Optional[Exception] = None) -> Dict[str, Any]:
+        """异步路径的 _fallback，本地快速分析放到线程中执行，不阻塞事件循环"""
+        if self.quick_analyzer is not None:
+            if error is not None:
+                print(f"分析简历过程中出错，返回本地快速分析结果: {error}")
+            return self._with_keywords(await asyncio.to_thread(self.quick_analyzer.analyze, resume_text), keywords)
+        return self._fallback(resume_text, keywords, error)
+    
+    @staticmethod
+    def _with_keywords(analysis: Dict[str, Any], keywords: Optional[List[str]]) -> Dict[str, Any]:
+        """用本地提取的关键词填充结果(解析失败的占位结果也保留关键词)"""
+        if keywords is not None:
+            analysis["keywords"] = keywords
+        return analysis
+    
+    def _prepare_chunks(self, resume_text: str) -> List[str]:
+        """预处理简历文本，超出token预算时按章节切分"""
+        text = clean_resume_text(resume_text) or resume_text.strip()
+        if estimate_tokens(text) <= self.max_input_tokens:
+            return [text]
+        chunks = chunk_resume(text, self.max_input_tokens)
+        if len(chunks) > self.max_chunks:
+            print(f"简历过长，仅分析前 {self.max_chunks}/{len(chunks)} 个分块")
+        return chunks[:self.max_chunks]
+    
+    def _merge_chunk_results(self, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        merged = merge_analyses(analyses)
+        # 分块摘要合并前先保留第一块(通常包含个人概况)的摘要作为后备
+        merged["summary"] = analyses[0]["summary"]
+        return merged
+    
     def analyze_resume(self, resume_text: str) -> Dict[str, Any]:
         """分析简历内容"""
+        key = self.cache_key(resume_text)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        # 相同简历的并发请求(如用户重复提交)只调用一次上游，共享同一结果
+        return self.inflight.do_sync(key, lambda: self._analyze_uncached(resume_text, key))
+    
+    def _analyze_uncached(self, resume_text: str, key: str) -> Dict[str, Any]:
+        keywords = self.local_keywords(resume_text)
         try:
-            # 格式化提示
-            formatted_prompt = self.prompt.format(resume_text=resume_text)
+            analyses = []
+            chunks = self._prepare_chunks(resume_text)
+            for chunk in chunks:
+                # 格式化提示
+                formatted_prompt = self.prompt.format(resume_text=chunk)
+                
+                # 以JSON模式调用API
+                result = self._call_api(formatted_prompt, json_mode=True, system=self.system_prompt)
+                
+                # 校验结果，失败时修复一次
+                try:
+                    analyses.append(self._parse_or_repair(result))
+                except ValueError as parse_error:
+                    print(f"解析DeepSeek输出时出错: {parse_error}")
             
-            # 调用API
-            result = self._call_api(formatted_prompt)
+            if not analyses:
+                return self._fallback(resume_text, keywords)
             
-            # 解析结果
-            try:
-                # 尝试从文本中提取JSON部分
-                json_start = result.find('{')
-                json_end = result.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = result[json_start:json_end]
-                    parsed_json = json.loads(json_str)
-                    return {
-                        "summary": parsed_json.get("summary", "未能生成摘要"),
-                        "keywords": parsed_json.get("keywords", []),
-                        "suggestions": parsed_json.get("suggestions", [])
-                    }
-                else:
-                    raise ValueError("无法从响应中提取JSON内容")
-            except Exception as parse_error:
-                print(f"解析DeepSeek输出时出错: {parse_error}")
-                
-                # 如果解析失败，返回一个基本结果
-                return {
-                    "summary": "无法从API响应中解析有效的摘要内容。",
-                    "keywords": [],
-                    "suggestions": ["API返回的数据格式有误，无法提取有效建议。"]
-                }
+            analysis = analyses[0]
+            if len(analyses) > 1:
+                analysis = self._merge_chunk_results(analyses)
+                try:
+                    analysis["summary"] = self._call_api(self._summary_merge_prompt(analyses)).strip()
+                except Exception as e:
+                    print(f"合并分块摘要时出错: {e}")
+            self._with_keywords(analysis, keywords)
+            analysis["tier"] = TIER_LLM
+            
+            # 只缓存所有分块都成功解析的结果，缺少分块时下次重新分析
+            if self.cache is not None and len(analyses) == len(chunks):
+                self.cache.set(key, analysis)
+            return analysis
                 
+        except (UpstreamUnavailable, RateLimitExceeded):
+            # 上游不可用或超出限流时直接抛出，由调用方返回503/429，而不是伪装成正常结果
+            raise
+        except Exception as e:
+            return self._fallback(resume_text, keywords, e)
+    
+    def _summary_merge_prompt(self, analyses: List[Dict[str, Any]]) -> str:
+        summaries = "\n".join(f"{i + 1}. {a['summary']}" for i, a in enumerate(analyses))
+        return SUMMARY_MERGE_TEMPLATE.format(summaries=summaries)
+    
+    async def _aanalyze_chunk(self, chunk: str) -> Dict[str, Any]:
+        """分析单个文本块，修复后仍然解析失败时抛出 ValueError"""
+        result = await self._acall_api(
+            self.prompt.format(resume_text=chunk), json_mode=True, system=self.system_prompt
+        )
+        try:
+            return await self._aparse_or_repair(result)
+        except ValueError as parse_error:
+            print(f"解析DeepSeek输出时出错: {parse_error}")
+            raise
+    
+    async def aanalyze_resume(self, resume_text: str) -> Dict[str, Any]:
+        """异步分析简历内容，不阻塞事件循环；长简历分块并发分析后合并"""
+        key = self.cache_key(resume_text)
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                return cached
+        
+        # 相同简历的并发请求共享一次上游调用；某个客户端断开只取消它自己的等待
+        return await self.inflight.do(key, lambda: self._aanalyze_uncached(resume_text, key))
+    
+    async def _aanalyze_uncached(self, resume_text: str, key: str) -> Dict[str, Any]:
+        keywords = await self.alocal_keywords(resume_text)
+        try:
+            chunks = self._prepare_chunks(resume_text)
+            # 输出无法解析而被跳过的分块数
+            missing = 0
+            if len(chunks) == 1:
+                try:
+                    analysis = await self._aanalyze_chunk(chunks[0])
+                except ValueError:
+                    return await self._afallback(resume_text, keywords)
+            else:
+                # map: 各分块并发分析
+                outcomes = await asyncio.gather(
+                    *(self._aanalyze_chunk(chunk) for chunk in chunks), return_exceptions=True
+                )
+                # 任一分块请求出错(上游不可用、限流等)时整体按错误处理，不返回缺少分块的结果
+                for outcome in outcomes:
+                    if isinstance(outcome, BaseException) and not isinstance(outcome, ValueError):
+                        raise outcome
+                analyses = [outcome for outcome in outcomes if isinstance(outcome, dict)]
+                if not analyses:
+                    return await self._afallback(resume_text, keywords)
+                missing = len(chunks) - len(analyses)
+                # reduce: 关键词和建议本地去重合并，摘要用一次短请求合并
+                analysis = self._merge_chunk_results(analyses)
+                if len(analyses) > 1:
+                    try:
+                        merged_summary = await self._acall_api(self._summary_merge_prompt(analyses))
+                        analysis["summary"] = merged_summary.strip()
+                    except Exception as e:
+                        print(f"合并分块摘要时出错: {e}")
+            self._with_keywords(analysis, keywords)
+            analysis["tier"] = TIER_LLM
+            
+            # 有分块输出无法解析时不缓存，下次重新分析
+            if self.cache is not None and not missing:
+                await self.cache.aset(key, analysis)
+            return analysis
+        except (UpstreamUnavailable, RateLimitExceeded):
+            raise
+        except Exception as e:
+            return await self._afallback(resume_text, keywords, e)
+    
+    async def acompare_with_job(self, job_description: str, resume_text: str) -> Dict[str, Any]:
+        """
+        对照职位描述详细比较一份简历，返回 score(0-100)、strengths、gaps、verdict
+
+        输出无法解析时抛出 ValueError，上游错误原样抛出；结果按(职位描述, 简历)缓存
+        """
+        key = make_cache_key(
+            "match", normalize_text(job_description), normalize_text(resume_text), self.providers.cache_identity(), PROMPT_VERSION
+        )
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                return cached
+        
+        async def compare() -> Dict[str, Any]:
+            # 简历和职位描述都按token预算截取，长简历只比较第一个分块
+            prompt = self.match_prompt.format(
+                job_description=chunk_resume(job_description.strip(), self.max_input_tokens)[0],
+                resume_text=self._prepare_chunks(resume_text)[0],
+            )
+            result = await self._acall_api(prompt, json_mode=True, system=self.match_system_prompt)
+            comparison = extract_comparison(result)
+            if self.cache is not None:
+                await self.cache.aset(key, comparison)
+            return comparison
+        
+        return await self.inflight.do(key, compare)
+    
+    def _astream_api(self, prompt: str) -> AsyncIterator[str]:
+        """以流式方式(JSON模式)调用模型服务，逐段产出模型输出"""
+        return self.providers.astream(prompt, json_mode=True, system=self.system_prompt)
+    
+    async def astream_analysis(self, resume_text: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        流式分析简历内容
+        
+        依次产出 (事件名, 数据)：
+        partial(本地快速分析结果，tier=local，未命中缓存时最先产出)、
+        token(模型输出片段)、summary、keyword、suggestion(字段完整时立即产出)、
+        result(最终完整结果，tier 标明来源) 或 error({"status", "detail"})
+        """
+        key = self.cache_key(resume_text)
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                for event in self._replay_events(cached):
+                    yield event
+                return
+        
+        # 本地快速分析在等待模型之前推送，上游较慢或不可用时客户端也能立即显示结果
+        if self.quick_analyzer is not None:
+            yield "partial", await asyncio.to_thread(self.quick_analyzer.analyze, resume_text)
+        
+        # 同一份简历已有进行中的分析时，等待其结果后重放，不再单独调用上游
+        if self.inflight.inflight(key) is not None:
+            try:
+                analysis = await self.aanalyze_resume(resume_text)
+            except (UpstreamUnavailable, RateLimitExceeded) as e:
+                yield "error", self._stream_error(e)
+                return
+            for event in self._replay_events(analysis):
+                yield event
+            return
+        
+        # 本地关键词在调用模型之前立即推送
+        keywords = await self.alocal_keywords(resume_text)
+        for keyword in keywords or []:
+            yield "keyword", keyword
+        
+        text_chunks = self._prepare_chunks(resume_text)
+        if len(text_chunks) > 1:
+            # 长简历需要分块分析和合并，无法逐token输出
+            try:
+                analysis = await self.aanalyze_resume(resume_text)
+            except (UpstreamUnavailable, RateLimitExceeded) as e:
+                yield "error", self._stream_error(e)
+                return
+            for event in self._replay_events(analysis, emit_keywords=keywords is None):
+                yield event
+            return
+        
+        parser = IncrementalAnalysisParser()
+        chunks = []
+        try:
+            formatted_prompt = self.prompt.format(resume_text=text_chunks[0])
+            async for delta in self._astream_api(formatted_prompt):
+                chunks.append(delta)
+                yield "token", delta
+                for event in parser.feed(delta):
+                    # 关键词已由本地提取并推送过
+                    if keywords is not None and event[0] == "keyword":
+                        continue
+                    yield event
         except Exception as e:
-            print(f"分析简历过程中出错: {e}")
-            return {
-                "summary": f"分析过程中出错: {str(e)}",
-                "keywords": [],
-                "suggestions": ["服务暂时不可用，请稍后重试"]
-            } 
\ No newline at end of file
+            print(f"流式调用DeepSeek API时出错: {e}")
+            yield "error", self._stream_error(e)
+            return
+        
+        result = "".join(chunks)
+        try:
+            # 流式输出不符合schema时用一次非流式请求修复，修复结果只在 result 事件中给出
+            analysis = self._with_keywords(await self._aparse_or_repair(result), keywords)
+        except ValueError as parse_error:
+            print(f"解析DeepSeek输出时出错: {parse_error}")
+            yield "result", await self._afallback(resume_text, keywords)
+            return
+        analysis["tier"] = TIER_LLM
+        
+        if self.cache is not None:
+            await self.cache.aset(key, analysis)
+        yield "result", analysis
+    
+    @staticmethod
+    def _replay_events(analysis: Dict[str, Any], emit_keywords: bool = True) -> List[Tuple[str, Any]]:
+        """把完整结果转换为流式事件序列"""
+        events = [("summary", analysis["summary"])]
+        if emit_keywords:
+            events.extend(("keyword", keyword) for keyword in analysis["keywords"])
+        events.extend(("suggestion", suggestion) for suggestion in analysis["suggestions"])
+        events.append(("result", analysis))
+        return events
+    
+    @staticmethod
+    def _stream_error(error: Exception) -> Dict[str, Any]:
+        """流式接口的错误事件数据"""
+        if isinstance(error, UpstreamUnavailable):
+            return {"status": 503, "detail": str(error), "retry_after": error.retry_after}
+        if isinstance(error, RateLimitExceeded):
+            return {"status": 429, "detail": str(error), "retry_after": error.retry_after}
+        return {"status": 502, "detail": f"调用 DeepSeek 分析服务时出错: {error}"}
@@ -0,0 +1,214 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from extractors import (
+    ExtractionCancelled, ExtractionError, ExtractionTimeout, Source, extract_text, extract_txt, preload_parsers
+)
+from metrics import (
+    EXTRACTION_FAILURES, EXTRACTION_PAGES, EXTRACTION_SECONDS, EXTRACTION_TRUNCATED, PDF_PAGE_SECONDS,
+    PDF_PAGES_SKIPPED,
+)
+from settings import env_float
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，此时不做CPU限制
+    resource = None
+
+
+class _CpuLimitExceeded(BaseException):
+    # 继承BaseException，避免被解析器内部的 except Exception 吞掉
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise _CpuLimitExceeded()
+
+
+def _init_worker():
+    """进程池worker初始化：把SIGXCPU转换为异常，避免进程被直接杀死；预先导入解析库"""
+    if resource is not None and hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    preload_parsers()
+
+
+def _cpu_seconds_used() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _extract_with_stats(source: Source, file_extension: str, time_limit: Optional[float],
+                       max_tokens: int = 0,
+                       should_stop: Optional[Callable[[], bool]] = None) -> Tuple[str, Dict[str, Any]]:
+    """提取文本并返回解析统计(页数、解析耗时)，统计由主进程汇总到指标"""
+    stats: Dict[str, Any] = {}
+    started = time.perf_counter()
+    text = extract_text(source, file_extension, time_limit, should_stop, stats, max_tokens)
+    stats["seconds"] = time.perf_counter() - started
+    return text, stats
+
+
+def _run_job(source: Source, file_extension: str, time_limit: Optional[float],
+             cpu_limit: Optional[float], max_tokens: int = 0) -> Tuple[str, Dict[str, Any]]:
+    """在worker进程中执行解析任务，按任务设置CPU时间软限制"""
+    limited = cpu_limit and resource is not None and hasattr(signal, "SIGXCPU")
+    if limited:
+        # 任务结束后恢复原来的限制(硬限制有限时，软限制不能设为无限)
+        original = resource.getrlimit(resource.RLIMIT_CPU)
+        hard = original[1]
+        soft = int(_cpu_seconds_used() + cpu_limit) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    try:
+        return _extract_with_stats(source, file_extension, time_limit, max_tokens)
+    except _CpuLimitExceeded:
+        raise ExtractionTimeout("文件解析超出CPU时间限制，请上传更小或更规范的文件")
+    finally:
+        if limited:
+            resource.setrlimit(resource.RLIMIT_CPU, original)
+
+
+class ExtractionPool:
+    """文件解析工作池，把CPU密集的PDF/DOCX解析移出事件循环"""
+
+    def __init__(self, mode: Optional[str] = None, max_workers: Optional[int] = None,
+                 timeout: Optional[float] = None, cpu_limit: Optional[float] = None,
+                 max_tokens: Optional[int] = None):
+        """
+        初始化解析池
+
+        Args:
+            mode: "process"(默认，适合CPU密集的PyPDF2) 或 "thread"
+            max_workers: worker数量，默认等于CPU核数
+            timeout: 单个任务的时间上限(秒)
+            cpu_limit: 单个任务的CPU时间上限(秒)，仅进程模式有效
+            max_tokens: PDF文本预算(估算token数)，达到后不再解析后续页面，0 表示不限制
+        """
+        self.mode = (mode or os.getenv("EXTRACTION_POOL_MODE", "process")).lower()
+        self.max_workers = max_workers or int(os.getenv("EXTRACTION_POOL_WORKERS", 0)) or os.cpu_count() or 1
+        self.timeout = timeout if timeout is not None else env_float("EXTRACTION_TIMEOUT", 20.0)
+        self.cpu_limit = cpu_limit if cpu_limit is not None else env_float("EXTRACTION_CPU_LIMIT", 10.0)
+        self.max_tokens = max_tokens if max_tokens is not None else int(env_float("EXTRACTION_MAX_TOKENS", 16000))
+        self.poll_interval = 0.25
+        self._executor: Optional[Executor] = None
+        # 已提交但未完成的任务数(排队 + 执行中)
+        self.pending = 0
+
+    def _create_executor(self) -> Executor:
+        if self.mode == "thread":
+            return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="extract")
+        # 使用spawn避免在已有线程/事件循环的进程中fork
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = self._create_executor()
+
+    async def warm_up(self) -> None:
+        """启动全部worker进程并导入解析库，首个PDF/DOCX请求不再承担进程启动和导入的耗时"""
+        if self.mode == "thread":
+            await asyncio.to_thread(preload_parsers)
+            return
+        self.start()
+        # 进程池按需创建进程，同时提交与worker数相同的任务才会把进程全部启动
+        await asyncio.gather(*(
+            asyncio.wrap_future(self._executor.submit(preload_parsers)) for _ in range(self.max_workers)
+        ))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _submit(self, source: Source, file_extension: str, cancel_event: threading.Event):
+        if self.mode == "thread":
+            return self._executor.submit(
+                _extract_with_stats, source, file_extension, self.timeout, self.max_tokens, cancel_event.is_set
+            )
+        return self._executor.submit(
+            _run_job, source, file_extension, self.timeout, self.cpu_limit, self.max_tokens
+        )
+
+    async def extract(self, source: Source, file_extension: str,
+                      is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> str:
+        """
+        在工作池中提取文本
+
+        Args:
+            source: 文件内容(字节)或临时文件路径，传路径时worker直接读取磁盘，不跨进程复制内容
+            file_extension: 小写的文件扩展名
+            is_disconnected: 检测客户端是否已断开的协程函数，断开时取消任务
+
+        Returns:
+            提取出的文本
+        """
+        if file_extension == 'txt':
+            # 纯文本解码很便宜，不值得跨进程传输
+            with EXTRACTION_SECONDS.labels(format=file_extension).time():
+                return extract_txt(source)
+
+        try:
+            text, stats = await self._extract_in_pool(source, file_extension, is_disconnected)
+        except ExtractionError as e:
+            EXTRACTION_FAILURES.labels(format=file_extension, reason=type(e).__name__).inc()
+            raise
+        EXTRACTION_SECONDS.labels(format=file_extension).observe(stats["seconds"])
+        if "pages" in stats:
+            EXTRACTION_PAGES.labels(format=file_extension).observe(stats["pages"])
+        for seconds in stats.get("page_seconds", ()):
+            PDF_PAGE_SECONDS.observe(seconds)
+        if stats.get("pages_skipped"):
+            PDF_PAGES_SKIPPED.inc(stats["pages_skipped"])
+        if stats.get("truncated"):
+            EXTRACTION_TRUNCATED.labels(format=file_extension).inc()
+        return text
+
+    async def _extract_in_pool(self, source: Source, file_extension: str,
+                               is_disconnected: Optional[Callable[[], Awaitable[bool]]]) -> Tuple[str, Dict[str, Any]]:
+        self.start()
+        cancel_event = threading.Event()
+        try:
+            future = asyncio.wrap_future(self._submit(source, file_extension, cancel_event))
+        except BrokenProcessPool:
+            self._executor = None
+            raise ExtractionError("解析进程异常退出，请重试")
+
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise ExtractionTimeout("文件解析超时，请上传更小或更规范的文件")
+                done, _ = await asyncio.wait({future}, timeout=min(self.poll_interval, remaining))
+                if done:
+                    return future.result()
+                if is_disconnected is not None and await is_disconnected():
+                    raise ExtractionCancelled("客户端已断开，解析已取消")
+        except BrokenProcessPool:
+            # worker进程被杀死时重建进程池
+            self.shutdown()
+            raise ExtractionError("解析进程异常退出，请重试")
+        finally:
+            self.pending -= 1
+            if not future.done():
+                cancel_event.set()
+                future.cancel()
+
+    def collect_metrics(self):
+        """供 /metrics 抓取的解析池状态"""
+        yield ("extraction_pool_pending", "gauge", "解析池中排队和执行中的任务数", [({}, self.pending)])
+        yield ("extraction_pool_workers", "gauge", "解析池worker数量", [({"mode": self.mode}, self.max_workers)])
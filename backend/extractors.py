@@ -0,0 +1,366 @@
+import hashlib
+import io
+import re
+import time
+import zipfile
+from xml.etree import ElementTree
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from cache import make_cache_key
+from chunking import estimate_tokens
+
+# python-docx(依赖lxml)和PyPDF2导入较慢，首次解析对应格式时才导入，缩短冷启动时间
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader
+
+
+SUPPORTED_EXTENSIONS = ("docx", "pdf", "txt")
+
+# 文件内容：内存中的字节或磁盘上的文件路径(大文件转存后直接从磁盘读取)
+Source = Union[bytes, str]
+
+# 解析器版本，修改解析逻辑时递增，使旧的提取缓存失效
+PARSER_VERSION = "3"
+
+
+def preload_parsers() -> None:
+    """预先导入各格式的解析库(启动预热和解析进程初始化时调用)"""
+    import docx  # noqa: F401
+    import PyPDF2  # noqa: F401
+
+
+class ExtractionError(Exception):
+    """文件解析失败，对应HTTP 400"""
+    pass
+
+
+class ExtractionTimeout(ExtractionError):
+    """文件解析超出时间或CPU限制"""
+    pass
+
+
+class ExtractionCancelled(ExtractionError):
+    """文件解析被取消(例如客户端已断开)"""
+    pass
+
+
+def open_source(source: Source) -> BinaryIO:
+    """以只读二进制流打开文件内容，字节不会被复制"""
+    if isinstance(source, str):
+        return open(source, "rb")
+    return io.BytesIO(source)
+
+
+def fingerprint(source: Source) -> str:
+    """计算上传文件内容的指纹"""
+    digest = hashlib.sha256()
+    with open_source(source) as stream:
+        for chunk in iter(lambda: stream.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extraction_cache_key(file_hash: str, file_extension: str, max_tokens: int = 0) -> str:
+    """提取缓存键：(文件指纹, 扩展名, 解析器版本, 文本预算)"""
+    return make_cache_key(file_hash, file_extension, PARSER_VERSION, max_tokens)
+
+
+def _check_budget(deadline: Optional[float], should_stop: Optional[Callable[[], bool]]):
+    """在页面/段落之间检查时间限制和取消信号"""
+    if should_stop is not None and should_stop():
+        raise ExtractionCancelled("文件解析已取消")
+    if deadline is not None and time.monotonic() > deadline:
+        raise ExtractionTimeout("文件解析超时，请上传更小或更规范的文件")
+
+
+# WordprocessingML 命名空间
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+_DOCX_PART_PATTERN = re.compile(r"^word/(header|footer)\d*\.xml$")
+# 每处理这么多个XML元素检查一次时间限制
+_DOCX_BUDGET_INTERVAL = 2000
+
+
+def _docx_parts(archive: zipfile.ZipFile) -> List[str]:
+    """按阅读顺序返回需要解析的部件：页眉、正文、页脚"""
+    names = archive.namelist()
+    headers = sorted(n for n in names if _DOCX_PART_PATTERN.match(n) and "header" in n)
+    footers = sorted(n for n in names if _DOCX_PART_PATTERN.match(n) and "footer" in n)
+    return headers + ["word/document.xml"] + footers
+
+
+def _iter_docx_part_lines(stream: BinaryIO, deadline: Optional[float],
+                          should_stop: Optional[Callable[[], bool]]) -> Iterator[str]:
+    """
+    用增量XML解析器读取一个部件，按阅读顺序产出文本行
+
+    表格每行输出为一行，单元格之间用 " | " 分隔；文本框(w:txbxContent)中的段落
+    按普通段落处理；mc:Fallback 是同一文本框的旧格式副本，整体跳过以免重复
+    """
+    paragraphs: List[List[str]] = []
+    cells: List[List[str]] = []
+    rows: List[List[str]] = []
+    pending: List[str] = []
+    fallback_depth = 0
+    props_depth = 0
+
+    def emit(line: str) -> None:
+        if cells:
+            if line:
+                cells[-1].append(line)
+        else:
+            pending.append(line)
+
+    for count, (event, elem) in enumerate(ElementTree.iterparse(stream, events=("start", "end"))):
+        if count % _DOCX_BUDGET_INTERVAL == 0:
+            _check_budget(deadline, should_stop)
+        tag = elem.tag
+        if tag == _MC + "Fallback":
+            fallback_depth += 1 if event == "start" else -1
+            continue
+        if fallback_depth:
+            continue
+        if tag == _W + "pPr":
+            # 段落属性中的 w:tabs/w:tab 是制表位定义，不是文本
+            props_depth += 1 if event == "start" else -1
+            continue
+        if props_depth:
+            continue
+
+        if event == "start":
+            if tag == _W + "p":
+                paragraphs.append([])
+            elif tag == _W + "tc":
+                cells.append([])
+            elif tag == _W + "tr":
+                rows.append([])
+            continue
+
+        if tag == _W + "t":
+            if paragraphs and elem.text:
+                paragraphs[-1].append(elem.text)
+        elif tag == _W + "tab":
+            if paragraphs:
+                paragraphs[-1].append("\t")
+        elif tag in (_W + "br", _W + "cr"):
+            if paragraphs:
+                paragraphs[-1].append("\n")
+        elif tag == _W + "p":
+            emit("".join(paragraphs.pop()) if paragraphs else "")
+            elem.clear()
+        elif tag == _W + "tc":
+            text = " ".join(cells.pop()) if cells else ""
+            if rows:
+                rows[-1].append(text)
+        elif tag == _W + "tr":
+            row = rows.pop() if rows else []
+            emit(" | ".join(cell for cell in row if cell))
+            elem.clear()
+
+        while pending:
+            yield pending.pop(0)
+
+
+def _extract_docx_xml(source: Source, deadline: Optional[float],
+                      should_stop: Optional[Callable[[], bool]], stats: Optional[Dict[str, Any]]) -> str:
+    with open_source(source) as stream, zipfile.ZipFile(stream) as archive:
+        names = set(archive.namelist())
+        lines: List[str] = []
+        seen_parts = set()
+        for part in _docx_parts(archive):
+            if part not in names:
+                raise KeyError(f"缺少部件 {part}")
+            with archive.open(part) as xml_stream:
+                part_lines = list(_iter_docx_part_lines(xml_stream, deadline, should_stop))
+            # 不同节的页眉页脚经常完全相同，只保留一份
+            key = "\n".join(part_lines)
+            if part != "word/document.xml":
+                if key in seen_parts:
+                    continue
+                seen_parts.add(key)
+            lines.extend(part_lines)
+    if stats is not None:
+        stats["engine"] = "xml"
+    return "\n".join(lines)
+
+
+def _extract_docx_python_docx(source: Source, deadline: Optional[float] = None,
+                              should_stop: Optional[Callable[[], bool]] = None) -> str:
+    """python-docx 对象模型路径，只能读取正文段落(作为XML路径失败时的后备)"""
+    from docx import Document
+
+    with open_source(source) as stream:
+        doc = Document(stream)
+    paragraphs = []
+    for para in doc.paragraphs:
+        _check_budget(deadline, should_stop)
+        paragraphs.append(para.text)
+    return "\n".join(paragraphs)
+
+
+def extract_docx(source: Source, deadline: Optional[float] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 stats: Optional[Dict[str, Any]] = None) -> str:
+    """
+    提取DOCX文本：流式解析正文、页眉页脚的XML，覆盖表格和文本框；
+    XML路径失败(例如非标准命名空间)时回退到 python-docx
+    """
+    try:
+        return _extract_docx_xml(source, deadline, should_stop, stats)
+    except ExtractionError:
+        raise
+    except Exception as e:
+        print(f"DOCX XML解析失败，回退到python-docx: {e}")
+    try:
+        text = _extract_docx_python_docx(source, deadline, should_stop)
+        if stats is not None:
+            stats["engine"] = "python-docx"
+        return text
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise ExtractionError(f"无法解析 DOCX 文件: {e}")
+
+
+def _page_may_have_text(page) -> bool:
+    """
+    根据页面资源判断是否可能含有文字：没有内容流，或只有图片没有字体的页面
+    (扫描件)直接跳过，不调用代价较高的extract_text；无法判断时按有文字处理
+    """
+    try:
+        if page.get("/Contents") is None:
+            return False
+        resources = page.get("/Resources")
+        if resources is None:
+            return True
+        resources = resources.get_object()
+        if "/Font" in resources:
+            return True
+        xobjects = resources.get("/XObject")
+        if xobjects is None:
+            return False
+        # 表单XObject中可能嵌有文字
+        return any(x.get_object().get("/Subtype") == "/Form" for x in xobjects.get_object().values())
+    except Exception:
+        return True
+
+
+def iter_pdf_pages(reader: "PdfReader", deadline: Optional[float] = None,
+                   should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[int, str, float]]:
+    """
+    逐页惰性提取PDF文本
+
+    Yields:
+        (页码, 文本, 耗时秒数)；空白页、纯图片页和无法解析的页面文本为空字符串
+    """
+    for index, page in enumerate(reader.pages):
+        _check_budget(deadline, should_stop)
+        started = time.perf_counter()
+        text = ""
+        if _page_may_have_text(page):
+            try:
+                text = page.extract_text() or ""
+            except Exception as e:
+                # 单页损坏时跳过该页，不影响其余页面
+                print(f"解析PDF第 {index + 1} 页时出错: {e}")
+        yield index, text, time.perf_counter() - started
+
+
+def extract_pdf(source: Source, deadline: Optional[float] = None,
+                should_stop: Optional[Callable[[], bool]] = None,
+                stats: Optional[Dict[str, Any]] = None, max_tokens: int = 0) -> str:
+    """
+    逐页提取PDF文本，累计达到token预算后不再解析后续页面
+
+    Args:
+        source: 文件内容(字节)或临时文件路径
+        deadline: 解析截止时间(time.monotonic)
+        should_stop: 返回True时中止解析的回调
+        stats: 传入字典时写入页数、跳过页数、每页耗时等统计
+        max_tokens: 文本预算(估算token数)，0 表示不限制
+    """
+    from PyPDF2 import PdfReader
+
+    try:
+        # PdfReader按需从流中读取对象，解析期间保持文件打开
+        with open_source(source) as stream:
+            reader = PdfReader(stream)
+            parts = []
+            used_tokens = 0
+            skipped = 0
+            truncated = False
+            page_seconds = []
+            for _, page_text, seconds in iter_pdf_pages(reader, deadline, should_stop):
+                page_seconds.append(seconds)
+                if not page_text.strip():
+                    skipped += 1
+                    continue
+                if max_tokens:
+                    page_tokens = estimate_tokens(page_text)
+                    if used_tokens + page_tokens > max_tokens:
+                        # 按比例保留预算内的部分，后续页面不再解析
+                        keep = int(len(page_text) * (max_tokens - used_tokens) / page_tokens)
+                        if keep > 0:
+                            parts.append(page_text[:keep])
+                        truncated = True
+                        break
+                    used_tokens += page_tokens
+                parts.append(page_text)
+            if stats is not None:
+                stats.update({
+                    "pages": len(reader.pages),
+                    "pages_parsed": len(page_seconds),
+                    "pages_skipped": skipped,
+                    "page_seconds": page_seconds,
+                    "truncated": truncated,
+                })
+        return "\n".join(parts)
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise ExtractionError(f"无法解析 PDF 文件: {e}")
+
+
+def extract_txt(source: Source) -> str:
+    """解码TXT文本"""
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            content_bytes = f.read()
+    else:
+        content_bytes = source
+    try:
+        return content_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        try:
+            return content_bytes.decode('latin-1')  # 尝试其他编码
+        except Exception as e:
+            raise ExtractionError(f"无法解码 TXT 文件: {e}")
+
+
+def extract_text(source: Source, file_extension: str, time_limit: Optional[float] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 stats: Optional[Dict[str, Any]] = None, max_tokens: int = 0) -> str:
+    """
+    根据文件类型提取文本
+
+    Args:
+        source: 文件内容(字节)或临时文件路径
+        file_extension: 小写的文件扩展名
+        time_limit: 单个任务的解析时间上限(秒)，在页面之间检查
+        should_stop: 返回True时中止解析的回调
+        stats: 传入字典时写入解析统计(例如PDF页数)
+        max_tokens: PDF文本预算(估算token数)，达到后停止解析后续页面，0 表示不限制
+
+    Returns:
+        提取出的文本
+    """
+    deadline = time.monotonic() + time_limit if time_limit else None
+
+    if file_extension == 'docx':
+        return extract_docx(source, deadline, should_stop, stats)
+    elif file_extension == 'pdf':
+        return extract_pdf(source, deadline, should_stop, stats, max_tokens)
+    elif file_extension == 'txt':
+        return extract_txt(source)
+    else:
+        raise ExtractionError("不支持的文件类型，请上传 .docx, .pdf 或 .txt 文件")
@@ -0,0 +1,77 @@
+"""
+生产环境的 gunicorn 配置：多个 uvicorn worker 进程
+
+用法:
+    cd backend && gunicorn main:app -c gunicorn.conf.py
+
+所有参数都可以用环境变量覆盖(见 .env.example 中的 GUNICORN_* / WEB_CONCURRENCY)
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# gunicorn 按文件路径加载本配置，需要把所在目录加入模块搜索路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from settings import env_int
+
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+# uvicorn worker是异步的，等待上游时单个进程即可处理大量并发请求；每个worker都有自己的解析进程池、
+# 缓存和上游连接池，多于核数只会重复占用内存和连接，因此默认每核一个，并设上限控制内存
+workers = env_int("WEB_CONCURRENCY", 0) or min(cpu_count, env_int("GUNICORN_MAX_WORKERS", 8))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# 每个worker都有自己的解析进程池，未显式配置时按核数平分，避免进程数超出CPU
+os.environ.setdefault("EXTRACTION_POOL_WORKERS", str(max(1, cpu_count // workers)))
+
+# 监听队列长度和keep-alive(前面有负载均衡时，keep-alive 应略长于其空闲超时)
+backlog = env_int("GUNICORN_BACKLOG", 2048)
+keepalive = env_int("GUNICORN_KEEPALIVE", 75)
+
+# 处理一定数量的请求后重启worker，限制PDF解析等带来的内存增长；加入抖动避免同时重启
+max_requests = env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+# worker无响应超过该时间会被重启；需大于单次分析的最长耗时(见 LLM_TOTAL_TIMEOUT)
+timeout = env_int("GUNICORN_TIMEOUT", 120)
+# 收到 SIGTERM 后等待进行中的请求和上游调用完成的时间，超时后强制退出
+graceful_timeout = env_int("GUNICORN_GRACEFUL_TIMEOUT", 90)
+
+# 只信任这些地址(逗号分隔的IP或网段)发来的 X-Forwarded-For/X-Forwarded-Proto；部署在 nginx 或平台负载均衡之后时
+# 设为代理的地址，否则所有匿名用户都被识别为代理的IP，共用一份额度。不要设为 "*"：服务可被直接访问时客户端可以伪造来源IP
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# 心跳文件放在内存文件系统，避免磁盘较慢时worker被误判为无响应
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# 由gunicorn主进程同时启动异步任务worker(python worker.py)：Render、Railway等平台的实例之间不共享磁盘，
+# worker必须与API在同一实例中运行才能访问任务队列数据库；单独运行 worker.py 时设为0
+job_workers = env_int("JOB_EMBEDDED_WORKERS", 1)
+_job_processes = []
+
+
+def when_ready(server):
+    if job_workers > 0:
+        worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+        _job_processes.append(subprocess.Popen([sys.executable, worker_script, "--processes", str(job_workers)]))
+        server.log.info("已启动 %d 个异步任务worker", job_workers)
+
+
+def on_exit(server):
+    # worker收到SIGTERM后完成当前任务再退出，超时则强制结束(未完成的任务在租约到期后重新处理)
+    for process in _job_processes:
+        process.terminate()
+        try:
+            process.wait(timeout=graceful_timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
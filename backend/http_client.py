@@ -0,0 +1,87 @@
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+from settings import env_float, env_int
+
+if TYPE_CHECKING:
+    import requests
+
+
+class PoolConfig:
+    """上游HTTP连接池配置，可通过环境变量调整"""
+
+    def __init__(self):
+        # 连接池上限：单个worker可同时持有的上游连接数
+        self.max_connections = env_int("LLM_POOL_MAX_CONNECTIONS", 200)
+        # 保持keep-alive的空闲连接数
+        self.max_keepalive_connections = env_int("LLM_POOL_MAX_KEEPALIVE", 50)
+        # 空闲连接的保活时间(秒)
+        self.keepalive_expiry = env_float("LLM_POOL_KEEPALIVE_EXPIRY", 60.0)
+        # 请求超时(秒)
+        self.timeout = env_float("LLM_REQUEST_TIMEOUT", 30.0)
+
+
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_session: Optional["requests.Session"] = None
+_sync_lock = threading.Lock()
+# 启动预热在线程中创建异步客户端(创建SSL上下文较慢)，与请求路径上的按需创建互斥
+_async_lock = threading.Lock()
+
+
+def _build_async_client(config: PoolConfig) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.max_connections,
+        max_keepalive_connections=config.max_keepalive_connections,
+        keepalive_expiry=config.keepalive_expiry,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=config.timeout)
+
+
+async def open_async_client(config: Optional[PoolConfig] = None) -> httpx.AsyncClient:
+    """创建全局共享的异步客户端，应在应用启动时调用"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = _build_async_client(config or PoolConfig())
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """关闭全局异步客户端，释放连接池，应在应用关闭时调用"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """获取共享的异步客户端；未在启动阶段打开时按需创建(可在线程中调用)"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        with _async_lock:
+            if _async_client is None or _async_client.is_closed:
+                _async_client = _build_async_client(PoolConfig())
+    return _async_client
+
+
+def get_sync_session() -> "requests.Session":
+    """获取共享的同步Session，复用keep-alive连接"""
+    global _sync_session
+    if _sync_session is None:
+        with _sync_lock:
+            if _sync_session is None:
+                # 只有同步调用路径(worker进程、脚本)使用requests，首次使用时才导入
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                config = PoolConfig()
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=config.max_keepalive_connections,
+                    pool_maxsize=config.max_connections,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _sync_session = session
+    return _sync_session
@@ -0,0 +1,271 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+STATUSES = (PENDING, RUNNING, DONE, FAILED)
+
+
+class JobStore:
+    """
+    持久化的分析任务队列(SQLite)
+
+    API进程写入任务后立即返回任务ID，独立的worker进程领取并执行。领取时加租约：
+    worker崩溃或服务重启后，租约到期的任务会被重新领取，任务不会丢失。
+    SQLite的WAL模式允许多个进程同时读写同一个数据库文件
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        """
+        Args:
+            path: 数据库文件路径
+            lease_seconds: 领取任务的租约时长，需大于单个任务的最长处理时间
+            max_attempts: 每个任务最多处理次数(包括worker崩溃后的重新领取)
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls) -> "JobStore":
+        path = os.getenv("JOB_QUEUE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.db")
+        return cls(
+            path,
+            lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", 300)),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 3)),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 首次使用时才创建数据库文件，未使用异步模式时不产生任何文件
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT NOT NULL, extension TEXT NOT NULL, "
+                "content BLOB, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, available_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                "lease_until REAL, worker TEXT, client TEXT, lane TEXT)"
+            )
+            # 旧版本创建的数据库没有提交者字段
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column in ("client", "lane"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, available_at, created_at)")
+            # worker心跳：API据此判断是否有worker在处理队列
+            conn.execute("CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, filename: str, extension: str, content: bytes, worker: Optional[str] = None,
+                partial: Optional[Dict[str, Any]] = None, client: Optional[str] = None,
+                lane: Optional[str] = None) -> str:
+        """
+        写入新任务，返回任务ID
+
+        Args:
+            client: 提交任务的客户端，worker以该客户端的名义调用上游(公平调度权重和每日额度)
+            lane: 提交者的优先级通道
+            worker: 由调用方自己执行时传入执行者名称，任务直接以执行中状态写入并持有租约；
+                调用方在租约到期前没有完成时，任务由worker进程重新领取
+            partial: 已有的部分结果(如本地快速分析)，任务完成前查询时返回
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        result = json.dumps(partial, ensure_ascii=False) if partial is not None else None
+        with self._lock:
+            if worker is None:
+                self._connect().execute(
+                    "INSERT INTO jobs (id, status, filename, extension, content, result, created_at, available_at, "
+                    "client, lane) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, PENDING, filename, extension, content, result, now, now, client, lane),
+                )
+            else:
+                self._connect().execute(
+                    "INSERT INTO jobs (id, status, filename, extension, content, result, attempts, created_at, "
+                    "available_at, started_at, lease_until, worker, client, lane) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, RUNNING, filename, extension, content, result, now, now, now,
+                     now + self.lease_seconds, worker, client, lane),
+                )
+        return job_id
+
+    def set_partial(self, job_id: str, partial: Dict[str, Any]) -> None:
+        """记录未完成任务的部分结果(已有部分结果或任务已结束时不覆盖)"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET result = ? WHERE id = ? AND result IS NULL AND status IN (?, ?)",
+                (json.dumps(partial, ensure_ascii=False), job_id, PENDING, RUNNING),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务状态和结果，不存在时返回None
+
+        任务完成前 result 为部分结果(tier=local)或None，完成后为最终结果
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, status, filename, attempts, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "filename": row[2],
+            "attempts": row[3],
+            "result": json.loads(row[4]) if row[4] is not None else None,
+            "error": row[5],
+            "created_at": row[6],
+            "started_at": row[7],
+            "finished_at": row[8],
+        }
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """
+        领取最早的待处理任务(或租约已过期的执行中任务)
+
+        Returns:
+            包含 id、filename、extension、content、client、lane 的字典，没有可领取的任务时返回None
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            # IMMEDIATE事务先获取写锁，多个worker进程不会领取同一个任务
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = conn.execute(
+                        "SELECT id, filename, extension, content, attempts, client, lane FROM jobs "
+                        "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until <= ?) "
+                        "ORDER BY created_at LIMIT 1",
+                        (PENDING, now, RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        conn.execute("COMMIT")
+                        return None
+                    if row[4] >= self.max_attempts:
+                        # 反复导致worker崩溃或超时的任务不再重试
+                        conn.execute(
+                            "UPDATE jobs SET status = ?, error = ?, content = NULL, finished_at = ?, "
+                            "lease_until = NULL WHERE id = ?",
+                            (FAILED, "任务多次处理未完成，已放弃", now, row[0]),
+                        )
+                        continue
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_until = ?, "
+                        "worker = ? WHERE id = ?",
+                        (RUNNING, now, now + self.lease_seconds, worker, row[0]),
+                    )
+                    conn.execute("COMMIT")
+                    return {
+                        "id": row[0], "filename": row[1], "extension": row[2], "content": row[3],
+                        "client": row[5], "lane": row[6],
+                    }
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        """记录结果并释放文件内容"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, content = NULL, finished_at = ?, "
+                "lease_until = NULL WHERE id = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str) -> None:
+        """标记为失败(不再重试)"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, error = ?, content = NULL, finished_at = ?, lease_until = NULL "
+                "WHERE id = ?",
+                (FAILED, error, time.time(), job_id),
+            )
+
+    def retry(self, job_id: str, error: str, delay: float = 0.0) -> None:
+        """放回队列，延迟后重新领取；已达到最多处理次数时标记为失败"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            if row[0] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, content = NULL, finished_at = ?, lease_until = NULL "
+                    "WHERE id = ?",
+                    (FAILED, error, time.time(), job_id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_until = NULL WHERE id = ?",
+                    (PENDING, error, time.time() + delay, job_id),
+                )
+
+    def heartbeat(self, worker: str) -> None:
+        """记录worker仍在轮询队列"""
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO workers (name, seen_at) VALUES (?, ?)", (worker, time.time())
+            )
+
+    def retire(self, worker: str) -> None:
+        """worker正常退出时删除心跳记录"""
+        with self._lock:
+            self._connect().execute("DELETE FROM workers WHERE name = ?", (worker,))
+
+    def active_workers(self, within: Optional[float] = None) -> int:
+        """最近 within 秒(默认一个租约时长)内有心跳的worker数"""
+        since = time.time() - (self.lease_seconds if within is None else within)
+        with self._lock:
+            row = self._connect().execute("SELECT COUNT(*) FROM workers WHERE seen_at > ?", (since,)).fetchone()
+        return row[0]
+
+    def prune(self, ttl: float) -> int:
+        """删除完成超过 ttl 秒的任务和长时间没有心跳的worker记录，返回删除的任务数量"""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at <= ?", (DONE, FAILED, time.time() - ttl)
+            )
+            conn.execute("DELETE FROM workers WHERE seen_at <= ?", (time.time() - ttl,))
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        counts = {status: 0 for status in STATUSES}
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts.update(dict(rows))
+        return counts
+
+    def collect_metrics(self):
+        """供 /metrics 抓取的队列状态(未使用异步模式时不创建数据库)"""
+        if self._conn is None and not os.path.exists(self.path):
+            return
+        counts = self.counts()
+        yield ("job_queue_jobs", "gauge", "异步任务队列中各状态的任务数",
+               [({"status": status}, count) for status, count in counts.items()])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,227 @@
+import os
+import threading
+import unicodedata
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+_DEFAULT_DICTIONARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "skills.txt")
+
+# 只转换ASCII大写字母，保证转换前后字符位置一一对应
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+# 英文名称右侧紧跟这些字符时不算完整单词(避免 C 匹配到 C++、C#，R 匹配到 R&D)
+_WORD_TAIL = set("+#&")
+
+# 作为关键词补充的实体类型
+_NER_LABELS = {"ORG", "PRODUCT"}
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class AhoCorasick:
+    """多模式匹配自动机，一次扫描找出文本中出现的所有模式"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, pattern_id: int) -> None:
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern_id)
+        self._built = False
+
+    def build(self) -> None:
+        """按层构建失败指针，并把失败链上的输出合并到每个状态"""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._built = True
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int]]:
+        """产出 (结束位置, 模式ID)，结束位置不含"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in output[state]:
+                yield index + 1, pattern_id
+
+
+class SkillDictionary:
+    """技能词典：标准名 + 中英文别名，编译为一个Aho-Corasick自动机"""
+
+    def __init__(self, entries: List[Tuple[str, List[str]]]):
+        """
+        Args:
+            entries: (标准名, 别名列表) 列表；以 "=" 开头的别名区分大小写
+        """
+        self.automaton = AhoCorasick()
+        # 模式ID -> (标准名, 模式长度, 区分大小写时的原文)
+        self.patterns: List[Tuple[str, int, Optional[str]]] = []
+        for canonical, aliases in entries:
+            canonical_name = canonical.lstrip("=")
+            for alias in [canonical] + aliases:
+                case_sensitive = alias.startswith("=")
+                alias = unicodedata.normalize("NFKC", alias.lstrip("=")).strip()
+                if not alias:
+                    continue
+                self.automaton.add(alias.translate(_ASCII_LOWER), len(self.patterns))
+                self.patterns.append((canonical_name, len(alias), alias if case_sensitive else None))
+        self.automaton.build()
+        self.size = len(entries)
+
+    @classmethod
+    def load(cls, path: str = _DEFAULT_DICTIONARY) -> "SkillDictionary":
+        """从词典文件加载，每行 "标准名|别名1|别名2"，# 开头为注释"""
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                names = [name.strip() for name in line.split("|") if name.strip()]
+                entries.append((names[0], names[1:]))
+        return cls(entries)
+
+    def _is_boundary(self, text: str, start: int, end: int) -> bool:
+        """英文名称要求两侧不是字母数字(中文名称不检查)"""
+        if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(text[end - 1]) and end < len(text):
+            following = text[end]
+            if _is_word_char(following) or following in _WORD_TAIL:
+                return False
+        return True
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        找出文本中的技能，重叠时保留最左最长的匹配
+
+        Returns:
+            (起始位置, 结束位置, 标准名) 列表，按位置排序
+        """
+        text = unicodedata.normalize("NFKC", text)
+        lowered = text.translate(_ASCII_LOWER)
+        candidates = []
+        for end, pattern_id in self.automaton.iter(lowered):
+            canonical, length, exact = self.patterns[pattern_id]
+            start = end - length
+            if exact is not None and text[start:end] != exact:
+                continue
+            if not self._is_boundary(text, start, end):
+                continue
+            candidates.append((start, end, canonical))
+
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        matches = []
+        last_end = -1
+        for start, end, canonical in candidates:
+            if start >= last_end:
+                matches.append((start, end, canonical))
+                last_end = end
+        return matches
+
+
+class KeywordExtractor:
+    """本地关键词提取：技能词典匹配 + 可选的spaCy实体识别，无需调用LLM"""
+
+    def __init__(self, dictionary: SkillDictionary, max_keywords: int = 15, ner_model: Optional[str] = None):
+        """
+        Args:
+            dictionary: 技能词典
+            max_keywords: 返回的关键词数量上限
+            ner_model: spaCy模型名(如 zh_core_web_sm)，为空时不做实体识别
+        """
+        self.dictionary = dictionary
+        self.max_keywords = max_keywords
+        self.ner_model = ner_model or None
+        self._nlp = None
+        self._nlp_lock = threading.Lock()
+        self._nlp_failed = False
+
+    @classmethod
+    def from_env(cls) -> "KeywordExtractor":
+        return cls(
+            SkillDictionary.load(os.getenv("SKILLS_DICTIONARY_PATH") or _DEFAULT_DICTIONARY),
+            max_keywords=int(os.getenv("KEYWORD_MAX", 15)),
+            ner_model=os.getenv("KEYWORD_NER_MODEL"),
+        )
+
+    def _load_nlp(self):
+        """首次使用时加载spaCy模型；未安装或加载失败时只打印一次警告"""
+        if self.ner_model is None or self._nlp_failed:
+            return None
+        with self._nlp_lock:
+            if self._nlp is None and not self._nlp_failed:
+                try:
+                    import spacy
+                    self._nlp = spacy.load(self.ner_model, disable=["parser", "lemmatizer"])
+                except Exception as e:
+                    print(f"警告：无法加载spaCy模型 {self.ner_model}，仅使用技能词典: {e}")
+                    self._nlp_failed = True
+        return self._nlp
+
+    def warm_up(self) -> None:
+        """预先加载spaCy模型(启动预热时调用)，未配置实体识别时不做任何事"""
+        self._load_nlp()
+
+    def _entities(self, text: str) -> List[str]:
+        nlp = self._load_nlp()
+        if nlp is None:
+            return []
+        # 实体识别较慢，只看前面的部分(通常包含工作经历中的公司和产品)
+        doc = nlp(text[:20000])
+        return [ent.text.strip() for ent in doc.ents if ent.label_ in _NER_LABELS and len(ent.text.strip()) > 1]
+
+    def extract(self, text: str, limit: Optional[int] = None, entities: bool = True) -> List[str]:
+        """
+        提取关键词：词典命中按出现次数排序(次数相同按首次出现位置)，实体识别结果补充在后
+
+        Args:
+            text: 简历文本
+            limit: 返回数量上限，默认为 max_keywords(职位匹配时需要全部技能)
+            entities: 是否用实体识别补充(快速分析时只用词典，保证耗时可控)
+
+        Returns:
+            关键词列表
+        """
+        counts: Dict[str, int] = {}
+        first_seen: Dict[str, int] = {}
+        for start, _, canonical in self.dictionary.find(text):
+            counts[canonical] = counts.get(canonical, 0) + 1
+            first_seen.setdefault(canonical, start)
+        keywords = sorted(counts, key=lambda name: (-counts[name], first_seen[name]))
+
+        seen = {keyword.lower() for keyword in keywords}
+        for entity in self._entities(text) if entities else []:
+            if entity.lower() not in seen:
+                seen.add(entity.lower())
+                keywords.append(entity)
+        return keywords[:limit or self.max_keywords]
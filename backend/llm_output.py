@@ -0,0 +1,159 @@
+from typing import Any, Awaitable, Callable, Dict, List
+
+from pydantic import BaseModel, ValidationError
+
+from metrics import JSON_PARSE_FALLBACKS, LLM_OUTPUT_PARSE, LLM_OUTPUT_REPAIRS
+
+
+class ResumeAnalysis(BaseModel):
+    summary: str # 摘要字段
+    # 关键词由本地提取时模型不输出该字段
+    keywords: List[str] = []
+    suggestions: List[str]
+
+
+class MatchComparison(BaseModel):
+    score: int # 0-100 的匹配分数
+    strengths: List[str] = []
+    gaps: List[str] = []
+    verdict: str = ""
+
+
+def _json_validator(model):
+    # 校验并解析JSON文本(pydantic v2 为单次解析+校验，v1 回退到 parse_raw)
+    validate_json = getattr(model, "model_validate_json", None) or model.parse_raw
+    return lambda text: dict(validate_json(text))
+
+
+_validate = _json_validator(ResumeAnalysis)
+_validate_comparison = _json_validator(MatchComparison)
+
+# 修复请求中附带的原输出和错误信息的长度上限
+_REPAIR_CONTENT_CHARS = 4000
+_REPAIR_ERROR_CHARS = 500
+
+REPAIR_TEMPLATE = """
+你上一次的输出不是符合要求的JSON，校验错误:
+{error}
+
+上一次的输出:
+--- START ---
+{content}
+--- END ---
+
+请据此修正，只输出一个JSON对象，不要输出任何其他文字：
+{{"summary": "摘要字符串", "keywords": ["关键词", ...], "suggestions": ["建议", ...]}}
+"""
+
+
+def extract_analysis(content: str, client: str = "wrapper") -> Dict[str, Any]:
+    """
+    按 ResumeAnalysis 校验模型输出，失败时抛出 ValueError
+
+    JSON模式下输出通常可以直接解析；否则再尝试截取首尾花括号之间的部分(去掉说明文字或代码块标记)
+
+    Args:
+        content: 模型输出文本
+        client: 记录解析指标时使用的客户端名
+    """
+    return _extract(content, _validate, client)
+
+
+def extract_comparison(content: str) -> Dict[str, Any]:
+    """按 MatchComparison 校验职位匹配的比较结果，失败时抛出 ValueError；分数限制在 0~100"""
+    comparison = _extract(content, _validate_comparison, "match")
+    comparison["score"] = min(100, max(0, comparison["score"]))
+    return comparison
+
+
+def _extract(content: str, validate: Callable[[str], Dict[str, Any]], client: str) -> Dict[str, Any]:
+    try:
+        analysis = validate(content)
+    except ValidationError as error:
+        json_start = content.find('{')
+        json_end = content.rfind('}') + 1
+        if json_start < 0 or json_end <= json_start or (json_start == 0 and json_end == len(content)):
+            LLM_OUTPUT_PARSE.labels(client=client, result="invalid").inc()
+            raise ValueError(f"模型输出不符合格式要求: {error}") from None
+        try:
+            analysis = validate(content[json_start:json_end])
+        except ValidationError as salvage_error:
+            LLM_OUTPUT_PARSE.labels(client=client, result="invalid").inc()
+            raise ValueError(f"模型输出不符合格式要求: {salvage_error}") from None
+        LLM_OUTPUT_PARSE.labels(client=client, result="salvaged").inc()
+        return analysis
+    LLM_OUTPUT_PARSE.labels(client=client, result="ok").inc()
+    return analysis
+
+
+def repair_prompt(content: str, error: Exception) -> str:
+    """针对一次解析失败的修复请求"""
+    return REPAIR_TEMPLATE.format(
+        error=str(error)[:_REPAIR_ERROR_CHARS], content=content[:_REPAIR_CONTENT_CHARS]
+    )
+
+
+def _parse_repaired(content: str, client: str) -> Dict[str, Any]:
+    try:
+        analysis = extract_analysis(content, client)
+    except ValueError:
+        LLM_OUTPUT_REPAIRS.labels(client=client, result="failed").inc()
+        raise
+    LLM_OUTPUT_REPAIRS.labels(client=client, result="ok").inc()
+    return analysis
+
+
+def parse_or_repair(content: str, complete: Callable[[str], str], client: str = "wrapper") -> Dict[str, Any]:
+    """
+    解析模型输出，失败时用 complete 发起一次修复请求；仍然失败时抛出 ValueError
+
+    Args:
+        content: 模型输出文本
+        complete: 以JSON模式调用模型并返回输出文本的函数
+        client: 记录解析指标时使用的客户端名
+    """
+    try:
+        return extract_analysis(content, client)
+    except ValueError as error:
+        print(f"解析模型输出时出错，发起一次修复请求: {error}")
+        try:
+            repaired = complete(repair_prompt(content, error))
+        except Exception as repair_error:
+            LLM_OUTPUT_REPAIRS.labels(client=client, result="failed").inc()
+            raise ValueError(f"修复请求失败: {repair_error}") from None
+        return _parse_repaired(repaired, client)
+
+
+async def aparse_or_repair(content: str, acomplete: Callable[[str], Awaitable[str]],
+                           client: str = "wrapper") -> Dict[str, Any]:
+    """parse_or_repair 的异步版本"""
+    try:
+        return extract_analysis(content, client)
+    except ValueError as error:
+        print(f"解析模型输出时出错，发起一次修复请求: {error}")
+        try:
+            repaired = await acomplete(repair_prompt(content, error))
+        except Exception as repair_error:
+            LLM_OUTPUT_REPAIRS.labels(client=client, result="failed").inc()
+            raise ValueError(f"修复请求失败: {repair_error}") from None
+        return _parse_repaired(repaired, client)
+
+
+def placeholder_analysis(client: str = "wrapper") -> Dict[str, Any]:
+    """模型输出无法解析(修复后仍然失败)时返回的基本结果"""
+    JSON_PARSE_FALLBACKS.labels(client=client).inc()
+    return {
+        "summary": "无法从API响应中解析有效的摘要内容。",
+        "keywords": [],
+        "suggestions": ["API返回的数据格式有误，无法提取有效建议。"]
+    }
+
+
+def error_analysis(error: Exception) -> Dict[str, Any]:
+    """分析失败时返回的基本结果"""
+    print(f"分析简历过程中出错: {error}")
+    return {
+        "summary": f"分析过程中出错: {str(error)}",
+        "keywords": [],
+        "suggestions": ["服务暂时不可用，请稍后重试"]
+    }
@@ -0,0 +1,370 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from chunking import estimate_tokens
+from http_client import get_async_client
+from metrics import (
+    PROMPT_CHARS, PROMPT_TOKENS_ESTIMATED, PROVIDER_FALLBACKS, PROVIDER_REQUESTS, UPSTREAM_LATENCY, record_usage
+)
+from prompts import build_messages
+from rate_limit import AdmissionController, QuotaExceeded, RateLimitExceeded
+from resilience import ResilientTransport, UpstreamUnavailable, get_transport
+from settings import env_float
+
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+
+
+class ProviderConfig:
+    """一个OpenAI兼容的 Chat Completions 服务(DeepSeek、OpenAI、vLLM、Ollama等)"""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: Optional[str] = None,
+                 temperature: float = 0.5, max_tokens: int = 800, json_mode: bool = True):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        # 本地模型服务通常不需要密钥
+        self.api_key = api_key or None
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # 是否支持 response_format={"type": "json_object"}(部分本地模型服务不支持)
+        self.json_mode = json_mode
+
+    @classmethod
+    def from_env(cls, name: str, api_key: Optional[str] = None) -> Optional["ProviderConfig"]:
+        """
+        从 LLM_<NAME>_* 环境变量读取配置；名为 deepseek 的服务默认使用 DEEPSEEK_* 变量
+
+        Returns:
+            缺少地址(或 DeepSeek 缺少密钥)时返回None
+        """
+        prefix = f"LLM_{name.upper()}_"
+        if name == "deepseek":
+            base_url = os.getenv(prefix + "BASE_URL") or os.getenv("DEEPSEEK_BASE_URL", DEEPSEEK_BASE_URL)
+            api_key = api_key or os.getenv(prefix + "API_KEY") or os.getenv("DEEPSEEK_API_KEY")
+            model = os.getenv(prefix + "MODEL", "deepseek-chat")
+            if not api_key:
+                return None
+        else:
+            base_url = os.getenv(prefix + "BASE_URL")
+            api_key = os.getenv(prefix + "API_KEY")
+            model = os.getenv(prefix + "MODEL")
+            if not base_url or not model:
+                print(f"警告：模型服务 {name} 缺少 {prefix}BASE_URL 或 {prefix}MODEL，已忽略")
+                return None
+        return cls(
+            name, base_url, model, api_key,
+            temperature=env_float(prefix + "TEMPERATURE", 0.5),
+            max_tokens=int(env_float(prefix + "MAX_TOKENS", 800)),
+            json_mode=os.getenv(prefix + "JSON_MODE", "true").lower() in ("1", "true", "yes"),
+        )
+
+
+class OpenAICompatibleProvider:
+    """调用OpenAI兼容接口的客户端：共享连接池、弹性层(重试/熔断)和准入控制"""
+
+    def __init__(self, config: ProviderConfig, admission: Optional[AdmissionController] = None):
+        self.config = config
+        self.name = config.name
+        # 上游调用的限流和并发控制，默认不限制
+        self.admission = admission or AdmissionController()
+
+    @property
+    def url(self) -> str:
+        return f"{self.config.base_url}/chat/completions"
+
+    @property
+    def transport(self) -> ResilientTransport:
+        """同一上游共享的弹性层(重试、超时、对冲、熔断)"""
+        return get_transport(self.config.base_url)
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.config.api_key:
+            headers["Authorization"] = f"Bearer {self.config.api_key}"
+        return headers
+
+    def build_body(self, prompt: str, stream: bool = False, json_mode: bool = False,
+                   system: Optional[str] = None) -> str:
+        """
+        构建请求体；json_mode 时要求模型只输出JSON对象
+
+        Args:
+            prompt: 用户消息(可变内容)
+            system: 系统提示(不变内容)，默认使用通用的简历分析助手提示
+        """
+        payload = {
+            "model": self.config.model,
+            "messages": build_messages(prompt, system),
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens
+        }
+        if json_mode and self.config.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+        return json.dumps(payload)
+
+    def estimate_request_tokens(self, prompt: str, system: Optional[str] = None) -> int:
+        """预估一次调用消耗的token数(输入估算 + 输出上限)，用于限流预留，同时记录提示词大小"""
+        prompt = (system or "") + prompt
+        prompt_tokens = estimate_tokens(prompt)
+        PROMPT_CHARS.observe(len(prompt))
+        PROMPT_TOKENS_ESTIMATED.observe(prompt_tokens)
+        return prompt_tokens + self.config.max_tokens
+
+    @staticmethod
+    def _content(result: Dict[str, Any]) -> str:
+        try:
+            return result["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError("API返回的数据格式不符合预期")
+
+    def complete(self, prompt: str, max_wait: Optional[float] = None, json_mode: bool = False,
+                 system: Optional[str] = None) -> str:
+        """同步调用，返回模型输出文本"""
+        body = self.build_body(prompt, json_mode=json_mode, system=system)
+        with self.admission.acquire_sync(self.estimate_request_tokens(prompt, system), max_wait) as ticket:
+            result = self.transport.post_json(self.url, self.headers(), body)
+            ticket.settle(result.get("usage"))
+        return self._content(result)
+
+    async def acomplete(self, prompt: str, max_wait: Optional[float] = None, json_mode: bool = False,
+                        system: Optional[str] = None) -> str:
+        """异步调用，复用共享连接池"""
+        body = self.build_body(prompt, json_mode=json_mode, system=system)
+        async with self.admission.acquire(self.estimate_request_tokens(prompt, system), max_wait) as ticket:
+            result = await self.transport.apost_json(self.url, self.headers(), body)
+            await ticket.asettle(result.get("usage"))
+        return self._content(result)
+
+    async def astream(self, prompt: str, max_wait: Optional[float] = None, json_mode: bool = False,
+                      system: Optional[str] = None) -> AsyncIterator[str]:
+        """以流式方式调用，逐段产出模型输出"""
+        transport = self.transport
+        async with self.admission.acquire(self.estimate_request_tokens(prompt, system), max_wait) as ticket:
+            transport.breaker.before_call()
+            started = time.monotonic()
+            status = "error"
+            try:
+                async with get_async_client().stream(
+                    "POST",
+                    self.url,
+                    headers=self.headers(),
+                    content=self.build_body(prompt, stream=True, json_mode=json_mode, system=system),
+                    timeout=transport.httpx_timeout
+                ) as response:
+                    status = response.status_code
+                    if response.status_code >= 500:
+                        transport.breaker.record_failure()
+                    else:
+                        transport.breaker.record_success()
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        # SSE格式: "data: {...}"，以 "data: [DONE]" 结束
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except ValueError:
+                            continue
+                        # 最后一个分块中带有 usage 字段
+                        if chunk.get("usage"):
+                            await ticket.asettle(chunk["usage"])
+                            record_usage(chunk["usage"])
+                        try:
+                            delta = chunk["choices"][0].get("delta", {}).get("content")
+                        except (KeyError, IndexError):
+                            continue
+                        if delta:
+                            yield delta
+            except httpx.TransportError:
+                # 连接失败、超时计入熔断
+                transport.breaker.record_failure()
+                raise
+            finally:
+                # 流式调用记录整个响应的耗时
+                UPSTREAM_LATENCY.labels(status=status).observe(time.monotonic() - started)
+
+    async def preconnect(self, timeout: float = 5.0) -> None:
+        """
+        预先建立到上游的连接(DNS、TCP、TLS)并留在共享连接池中，首个分析请求直接复用
+
+        请求模型列表接口，不消耗token；任何HTTP响应都说明连接已建立，不检查状态码
+        """
+        await get_async_client().get(
+            f"{self.config.base_url}/models", headers=self.headers(), timeout=timeout
+        )
+
+    def unavailable_reason(self, slow_threshold: float) -> Optional[str]:
+        """熔断打开或近期延迟过高时返回原因，用于决定是否直接交给后备服务"""
+        transport = self.transport
+        if transport.breaker.state == transport.breaker.OPEN and transport.breaker.retry_after() > 0:
+            return "circuit_open"
+        if slow_threshold > 0:
+            median = transport.latency.percentile(50)
+            if median is not None and median > slow_threshold:
+                return "slow"
+        return None
+
+    def cache_identity(self) -> Tuple[Any, ...]:
+        return self.config.model, self.config.temperature, self.config.max_tokens, self.config.json_mode
+
+
+# 切换到下一个服务的错误：上游不可用(熔断/重试耗尽)或本服务排队已满
+# (客户端每日额度用完 QuotaExceeded 不切换，直接返回429)
+_FALLBACK_ERRORS = (UpstreamUnavailable, RateLimitExceeded)
+
+
+class ProviderChain:
+    """
+    按顺序排列的模型服务：主服务熔断、过慢或排队已满时，把请求交给后备服务
+
+    只有一个服务时行为与直接调用该服务相同
+    """
+
+    def __init__(self, providers: List[OpenAICompatibleProvider], slow_threshold: float = 0,
+                 probe_ratio: float = 0.1, fallback_max_wait: float = 1.0):
+        """
+        Args:
+            providers: 服务列表，第一个为主服务
+            slow_threshold: 服务近期延迟中位数超过该值(秒)时优先使用后备服务，0 表示不按延迟切换
+            probe_ratio: 服务被判定过慢时仍发给它的请求比例，用于感知其恢复
+            fallback_max_wait: 有后备服务时，在前面的服务上最多排队等待的秒数
+        """
+        if not providers:
+            raise ValueError("至少需要一个模型服务")
+        self.providers = providers
+        self.slow_threshold = slow_threshold
+        self.probe_ratio = probe_ratio
+        self.fallback_max_wait = fallback_max_wait
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str] = None,
+                 admission: Optional[AdmissionController] = None) -> Optional["ProviderChain"]:
+        """
+        按 LLM_PROVIDERS(逗号分隔，默认 deepseek)创建服务链，没有可用服务时返回None
+
+        Args:
+            api_key: DeepSeek 密钥，优先于环境变量
+            admission: 主服务的准入控制，后备服务按 LLM_<NAME>_MAX_CONCURRENCY 单独限制并发
+        """
+        names = [name.strip().lower() for name in os.getenv("LLM_PROVIDERS", "deepseek").split(",") if name.strip()]
+        providers = []
+        for name in names:
+            config = ProviderConfig.from_env(name, api_key)
+            if config is None:
+                continue
+            if providers or admission is None:
+                provider_admission = AdmissionController(
+                    max_concurrency=int(env_float(f"LLM_{name.upper()}_MAX_CONCURRENCY", 0))
+                )
+            else:
+                provider_admission = admission
+            providers.append(OpenAICompatibleProvider(config, provider_admission))
+        if not providers:
+            return None
+        return cls(
+            providers,
+            slow_threshold=env_float("LLM_FALLBACK_SLOW_SECONDS", 0),
+            probe_ratio=env_float("LLM_FALLBACK_PROBE_RATIO", 0.1),
+            fallback_max_wait=env_float("LLM_FALLBACK_MAX_WAIT", 1.0),
+        )
+
+    @property
+    def primary(self) -> OpenAICompatibleProvider:
+        return self.providers[0]
+
+    def cache_identity(self) -> Tuple[Any, ...]:
+        """参与缓存键的模型参数"""
+        return tuple(provider.cache_identity() for provider in self.providers)
+
+    def _candidates(self) -> List[Tuple[OpenAICompatibleProvider, Optional[float]]]:
+        """本次请求依次尝试的 (服务, 最长排队时间)；最后一个服务总会被尝试"""
+        candidates = []
+        last = len(self.providers) - 1
+        for index, provider in enumerate(self.providers):
+            if index == last:
+                candidates.append((provider, None))
+                break
+            reason = provider.unavailable_reason(self.slow_threshold)
+            if reason == "slow" and random.random() < self.probe_ratio:
+                reason = None
+            if reason is not None:
+                PROVIDER_FALLBACKS.labels(provider=provider.name, reason=reason).inc()
+                continue
+            candidates.append((provider, self.fallback_max_wait))
+        return candidates
+
+    @staticmethod
+    def _record_fallback(provider: OpenAICompatibleProvider, error: Exception) -> None:
+        reason = "rate_limited" if isinstance(error, RateLimitExceeded) else "unavailable"
+        PROVIDER_REQUESTS.labels(provider=provider.name, outcome=reason).inc()
+        PROVIDER_FALLBACKS.labels(provider=provider.name, reason=reason).inc()
+        print(f"模型服务 {provider.name} 不可用，切换到后备服务: {error}")
+
+    async def preconnect(self) -> None:
+        """预先连接所有模型服务，失败时只打印警告"""
+        outcomes = await asyncio.gather(*(p.preconnect() for p in self.providers), return_exceptions=True)
+        for provider, outcome in zip(self.providers, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"预先连接模型服务 {provider.name} 失败: {outcome!r}")
+
+    def complete(self, prompt: str, json_mode: bool = False, system: Optional[str] = None) -> str:
+        candidates = self._candidates()
+        for index, (provider, max_wait) in enumerate(candidates):
+            try:
+                content = provider.complete(prompt, max_wait, json_mode, system)
+            except _FALLBACK_ERRORS as e:
+                if isinstance(e, QuotaExceeded) or index == len(candidates) - 1:
+                    raise
+                self._record_fallback(provider, e)
+                continue
+            PROVIDER_REQUESTS.labels(provider=provider.name, outcome="ok").inc()
+            return content
+
+    async def acomplete(self, prompt: str, json_mode: bool = False, system: Optional[str] = None) -> str:
+        candidates = self._candidates()
+        for index, (provider, max_wait) in enumerate(candidates):
+            try:
+                content = await provider.acomplete(prompt, max_wait, json_mode, system)
+            except _FALLBACK_ERRORS as e:
+                if isinstance(e, QuotaExceeded) or index == len(candidates) - 1:
+                    raise
+                self._record_fallback(provider, e)
+                continue
+            PROVIDER_REQUESTS.labels(provider=provider.name, outcome="ok").inc()
+            return content
+
+    async def astream(self, prompt: str, json_mode: bool = False,
+                      system: Optional[str] = None) -> AsyncIterator[str]:
+        """流式调用；只在尚未产出任何内容时切换到后备服务"""
+        candidates = self._candidates()
+        for index, (provider, max_wait) in enumerate(candidates):
+            started = False
+            try:
+                async for delta in provider.astream(prompt, max_wait, json_mode, system):
+                    started = True
+                    yield delta
+            except _FALLBACK_ERRORS as e:
+                if started or isinstance(e, QuotaExceeded) or index == len(candidates) - 1:
+                    raise
+                self._record_fallback(provider, e)
+                continue
+            except httpx.HTTPError as e:
+                # 流式请求不经过重试层，连接失败或5xx时同样可以换服务
+                if started or index == len(candidates) - 1:
+                    raise
+                self._record_fallback(provider, e)
+                continue
+            PROVIDER_REQUESTS.labels(provider=provider.name, outcome="ok").inc()
+            return
@@ -1,12 +1,19 @@
-import io
+import asyncio
+import hashlib
+import json
+import math
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import signal
+import socket
+import sqlite3
+import time
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Awaitable, Callable, List, Optional, Set
 import uvicorn
-from docx import Document
-from PyPDF2 import PdfReader
 from dotenv import load_dotenv
 import sys
 import os.path
@@ -15,22 +22,155 @@ import os.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 # 从包装器导入DeepSeekWrapper
 from deepseek_wrapper import DeepSeekWrapper
+from keywords import KeywordExtractor
+from llm_output import ResumeAnalysis
+from llm_provider import ProviderChain
+from cache import TieredCache
+from http_client import close_async_client, get_async_client, open_async_client
+from rate_limit import (
+    LANE_BULK, LANE_INTERACTIVE, LANES, AdmissionController, RateLimitExceeded, client_scope, current_client,
+    parse_mapping,
+)
+from resilience import UpstreamUnavailable
+from metrics import (
+    ANALYSIS_RESPONSES, ANALYSIS_STAGE_SECONDS, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, REGISTRY, UPLOAD_BYTES,
+    UPLOAD_READ_SECONDS, monitor_event_loop_lag,
+)
+from batch import BatchLimitError, BatchManager, expand_uploads
+from extraction_pool import ExtractionPool
+from jobs import JobStore
+from matching import MatchIndex
+from quick_analysis import TIER_LLM, TIER_LOCAL, QuickAnalyzer
+from extractors import (
+    SUPPORTED_EXTENSIONS, ExtractionCancelled, ExtractionError, Source, extraction_cache_key, fingerprint
+)
+from uploads import UploadLimits, UploadTooLarge, ingest_upload
 
 # 加载环境变量
 load_dotenv()
 
 
-# 配置 DeepSeekWrapper 客户端
-deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
-if not deepseek_api_key:
-    print("警告：未找到 DEEPSEEK_API_KEY 环境变量。请设置该变量以使用 DeepSeek 功能。")
-    deepseek_wrapper = None
-else:
-    deepseek_wrapper = DeepSeekWrapper(api_key=deepseek_api_key)
+# 分析结果缓存(内存LRU + 可选磁盘层，见 ANALYSIS_CACHE_* 环境变量)
+analysis_cache = TieredCache.from_env("ANALYSIS_CACHE", name="analysis")
+# 文本提取缓存，相同文件跳过解析(见 EXTRACTION_CACHE_* 环境变量)
+extraction_cache = TieredCache.from_env("EXTRACTION_CACHE", name="extraction")
+
+# 本地关键词提取器和模型服务客户端在启动事件中创建(见 create_clients)，导入本模块时不做初始化
+keyword_extractor: Optional[KeywordExtractor] = None
+deepseek_wrapper: Optional[DeepSeekWrapper] = None
+# 本地快速分析(见 QUICK_ANALYSIS_* 环境变量)，同样在启动事件中创建
+quick_analyzer: Optional[QuickAnalyzer] = None
+
+# /api/analyze 的延迟预算(秒)：模型分析超出预算时先返回本地快速分析结果，0 表示一直等待模型结果
+analyze_latency_budget = float(os.getenv("ANALYZE_LATENCY_BUDGET", 0))
+# 超出预算后在后台继续的模型分析，完成后写入异步任务
+upgrade_tasks: Set[asyncio.Task] = set()
+
+# 文件解析工作池(进程池或线程池，见 EXTRACTION_POOL_* 环境变量)
+extraction_pool = ExtractionPool()
+
+# 上传大小限制(见 UPLOAD_* 环境变量)
+upload_limits = UploadLimits()
+
+# 异步分析任务队列(SQLite)，由独立的 worker.py 进程处理(见 JOB_* 环境变量)
+job_store = JobStore.from_env()
+
+# 职位匹配索引：已分析简历的关键词向量，保存在磁盘上(见 MATCH_* 环境变量)
+match_index = MatchIndex.from_env()
+# 分析完成的简历是否自动加入匹配索引
+match_auto_index = os.getenv("MATCH_AUTO_INDEX", "true").lower() == "true"
+# 每次匹配最多交给模型详细比较的简历数
+match_max_top_k = int(os.getenv("MATCH_MAX_TOP_K", 10))
+
+# 已登记的客户端API密钥(CLIENT_API_KEYS=名称=密钥,...)，公平调度的权重和每日额度按名称配置
+client_api_keys = {key: name for name, key in parse_mapping(os.getenv("CLIENT_API_KEYS")).items()}
+
+# 批量任务管理器，在启动事件中创建
+batch_manager: Optional[BatchManager] = None
+
+# 事件循环延迟监控任务
+lag_monitor: Optional[asyncio.Task] = None
+
+# 启动后在后台预热(预先导入解析库、启动解析进程、加载匹配索引、连接上游)，不阻塞端口监听
+startup_warmup = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+warmup_task: Optional[asyncio.Task] = None
+
+# 收到 SIGTERM 后置为True，就绪检查随即失败，负载均衡不再分配新请求
+draining = False
+# 收到 SIGTERM 后继续接收请求的时间(秒)，让负载均衡先通过 /readyz 发现实例不再就绪；应小于 gunicorn 的 graceful_timeout
+shutdown_ready_grace = float(os.getenv("SHUTDOWN_READY_GRACE", 5))
+# 关闭时等待进行中的上游调用完成的最长时间(秒)，应小于 gunicorn 的 graceful_timeout
+shutdown_drain_timeout = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 60))
+# 就绪检查的排队上限：等待上游准入或等待解析的请求超过该值时返回503
+ready_max_queue_depth = int(os.getenv("READY_MAX_QUEUE_DEPTH", 50))
+ready_max_extraction_queue = int(os.getenv("READY_MAX_EXTRACTION_QUEUE", 100))
 
 app = FastAPI(title="AI简历优化助手")
 
-# 配置CORS
+def route_template(request: Request) -> str:
+    """返回匹配到的路由模板(如 /api/batch/{job_id})，避免按原始路径产生过多标签"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """按 Content-Length 提前拒绝过大的上传，避免先接收整个请求体"""
+    if request.method == "POST":
+        limit = (upload_limits.max_batch_request_bytes if request.url.path.startswith("/api/batch")
+                 else upload_limits.max_request_bytes)
+        try:
+            content_length = int(request.headers.get("content-length", 0))
+        except ValueError:
+            content_length = 0
+        if content_length > limit:
+            return JSONResponse(status_code=413, content={"detail": str(UploadTooLarge(limit))})
+    return await call_next(request)
+
+def identify_client(request: Request) -> str:
+    """
+    按API密钥(X-API-Key 或 Authorization: Bearer)识别客户端，没有密钥时按来源IP
+    (来自 FORWARDED_ALLOW_IPS 中代理的请求，来源IP由 uvicorn 按 X-Forwarded-For 还原)
+    """
+    key = request.headers.get("x-api-key")
+    if not key:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        key = token.strip() if scheme.lower() == "bearer" else ""
+    if key:
+        # 未登记的密钥只使用其哈希，原文不出现在日志和用量记录中
+        return client_api_keys.get(key) or "key:" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+@app.middleware("http")
+async def assign_client(request: Request, call_next):
+    """标记请求中上游调用所属的客户端和优先级通道(批量任务为 bulk)，用于公平调度和每日额度"""
+    lane = LANE_BULK if request.url.path.startswith("/api/batch") else LANE_INTERACTIVE
+    # 请求中创建的后台任务(批量分析)继承该标记
+    with client_scope(identify_client(request), lane):
+        return await call_next(request)
+
+# 在上传大小限制之外注册，提前返回的413也计入请求指标
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """统计在途请求数和请求耗时(流式响应只计到响应头发出)"""
+    if request.url.path in ("/metrics", "/healthz", "/readyz"):
+        return await call_next(request)
+    started = time.perf_counter()
+    status = 500
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        HTTP_REQUEST_DURATION.labels(
+            method=request.method, path=route_template(request), status=status
+        ).observe(time.perf_counter() - started)
+
+# 配置CORS：最后注册的中间件在最外层，中间件提前返回的响应(如413)也带有CORS头，浏览器能读到错误信息
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -43,65 +183,369 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class ResumeAnalysis(BaseModel):
-    summary: str # 摘要字段
+def collect_runtime_metrics():
+    """抓取时读取缓存、准入控制、熔断器和批量任务的状态"""
+    for cache in (analysis_cache, extraction_cache):
+        info = cache.info()
+        labels = {"cache": info["name"]}
+        yield ("cache_hits_total", "counter", "缓存命中次数", [
+            (dict(labels, tier="memory"), info["memory_hits"]), (dict(labels, tier="disk"), info["disk_hits"]),
+        ])
+        yield ("cache_misses_total", "counter", "缓存未命中次数", [(labels, info["misses"])])
+        yield ("cache_evictions_total", "counter", "缓存淘汰次数", [(labels, info["evictions"])])
+        yield ("cache_memory_bytes", "gauge", "内存缓存占用字节数", [(labels, info["memory_bytes"])])
+    if deepseek_wrapper is not None:
+        providers = deepseek_wrapper.providers.providers
+        admissions = [({"provider": p.name}, p.admission.info()) for p in providers]
+        yield ("llm_requests_in_flight", "gauge", "正在调用上游的请求数",
+               [(labels, info["in_flight"]) for labels, info in admissions])
+        yield ("llm_admission_waiting", "gauge", "等待上游准入的请求数(队列深度)",
+               [(labels, info["waiting"]) for labels, info in admissions])
+        yield ("llm_admission_rejected_total", "counter", "被准入控制拒绝的请求数",
+               [(labels, info["rejected"]) for labels, info in admissions])
+        yield ("llm_scheduler_waiting", "gauge", "公平调度队列中各优先级通道的等待数", [
+            ({"provider": p.name, "lane": lane}, p.admission.scheduler.waiting(lane)) for p in providers for lane in LANES
+        ])
+        yield ("llm_circuit_breaker_open", "gauge", "熔断器是否打开(半开也计为1)", [
+            ({"provider": p.name}, 0 if p.transport.breaker.state == p.transport.breaker.CLOSED else 1)
+            for p in providers
+        ])
+        yield ("singleflight_inflight", "gauge", "正在进行、可被合并的分析数",
+               [({"name": deepseek_wrapper.inflight.name}, len(deepseek_wrapper.inflight))])
+    if batch_manager is not None:
+        yield from batch_manager.store.collect_metrics()
+    yield from extraction_pool.collect_metrics()
+    yield from job_store.collect_metrics()
+    yield from match_index.collect_metrics()
+
+REGISTRY.add_collector(collect_runtime_metrics)
+
+@app.on_event("startup")
+async def startup():
+    # 打开共享的上游连接池，所有分析请求复用keep-alive连接
+    # 开启预热时连接池在后台线程中创建(创建SSL上下文约需上百毫秒)，不推迟开始监听端口
+    global batch_manager, lag_monitor, warmup_task
+    if not startup_warmup:
+        await open_async_client()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    install_drain_handler()
+    extraction_pool.start()
+    create_clients()
+    if deepseek_wrapper is not None:
+        batch_manager = BatchManager(
+            extract=extract_text_cached, analyze=deepseek_wrapper.aanalyze_resume, on_result=index_analysis
+        )
+        batch_manager.start()
+    if startup_warmup:
+        warmup_task = asyncio.create_task(warm_up())
+
+def install_drain_handler() -> None:
+    """
+    在 uvicorn 的 SIGTERM 处理之前插入一步：先把就绪检查置为失败，
+    SHUTDOWN_READY_GRACE 秒后再交给 uvicorn 停止接收连接并进入正常的关闭流程
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+    except ValueError:
+        return
+
+    def forward() -> None:
+        # 恢复原来的处理函数并重新发出信号
+        signal.signal(signal.SIGTERM, previous)
+        signal.raise_signal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame) -> None:
+        global draining
+        if draining or shutdown_ready_grace <= 0:
+            # 再次收到 SIGTERM 时立即关闭
+            draining = True
+            forward()
+            return
+        draining = True
+        print(f"收到 SIGTERM，就绪检查返回503，{shutdown_ready_grace:.0f} 秒后停止接收新请求")
+        loop.call_soon_threadsafe(loop.call_later, shutdown_ready_grace, forward)
+
+    try:
+        signal.signal(signal.SIGTERM, on_sigterm)
+    except ValueError:
+        # 只有主线程可以设置信号处理(如测试客户端在其他线程中运行应用)
+        pass
+
+def create_clients() -> None:
+    """创建关键词提取器和模型服务客户端"""
+    global keyword_extractor, deepseek_wrapper, quick_analyzer
+    # 本地关键词提取(技能词典 + 可选spaCy实体识别)
+    keyword_extractor = KeywordExtractor.from_env()
+    # 本地快速分析：模型分析超出延迟预算或失败时使用
+    quick_analyzer = QuickAnalyzer.from_env(keyword_extractor)
+
+    # 配置模型服务链(见 LLM_PROVIDERS 环境变量，默认只使用 DeepSeek)
+    # 主服务的上游限流和准入控制见 LLM_RATE_LIMIT_* 环境变量
+    provider_chain = ProviderChain.from_env(admission=AdmissionController.from_env())
+    if provider_chain is None:
+        print("警告：未找到 DEEPSEEK_API_KEY 环境变量，也没有配置其他模型服务。请设置该变量以使用 DeepSeek 功能。")
+        return
+    deepseek_wrapper = DeepSeekWrapper(
+        providers=provider_chain,
+        cache=analysis_cache,
+        # KEYWORD_SOURCE=local 时关键词由本地提取，提示词只要求摘要和建议
+        keyword_extractor=keyword_extractor if os.getenv("KEYWORD_SOURCE", "local") == "local" else None,
+        quick_analyzer=quick_analyzer,
+    )
+
+async def warm_up() -> None:
+    """
+    后台预热：服务开始接收请求后再执行，首个请求不再承担导入解析库、启动解析进程、
+    加载spaCy模型和匹配索引、建立上游TLS连接的耗时；任何一步失败只打印警告
+    """
+    steps = [
+        ("extraction_pool", extraction_pool.warm_up),
+        ("keywords", lambda: asyncio.to_thread(keyword_extractor.warm_up)),
+        ("match_index", lambda: asyncio.to_thread(match_index.load)),
+    ]
+    steps.append(("http_client", lambda: asyncio.to_thread(get_async_client)))
+    if deepseek_wrapper is not None:
+        steps.append(("upstream", deepseek_wrapper.providers.preconnect))
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            print(f"启动预热 {name} 失败: {e!r}")
+        timings[name] = round(time.perf_counter() - started, 3)
+    print(f"启动预热完成: {timings}")
+
+async def drain_upstream_calls(timeout: float) -> None:
+    """等待进行中的分析(包括客户端已断开、仍在后台完成的调用)结束，超时后放弃"""
+    if deepseek_wrapper is None:
+        return
+    # 包括超出延迟预算、结果还要写入异步任务的分析
+    tasks = deepseek_wrapper.inflight.tasks() + list(upgrade_tasks)
+    if not tasks:
+        return
+    print(f"正在等待 {len(tasks)} 个进行中的分析完成(最多 {timeout:.0f} 秒)")
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        print(f"关闭时仍有 {len(pending)} 个分析未完成，将被取消")
+
+@app.on_event("shutdown")
+async def shutdown():
+    # 服务器已停止接收新连接并等待现有请求结束，这里再排空后台的上游调用
+    # (未经 SIGTERM 关闭时，如达到 max_requests 重启，也标记为正在关闭)
+    global draining
+    draining = True
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await drain_upstream_calls(shutdown_drain_timeout)
+    if lag_monitor is not None:
+        lag_monitor.cancel()
+    if batch_manager is not None:
+        # 进行中的简历放回队列，由其他worker进程继续处理
+        await batch_manager.shutdown()
+    await close_async_client()
+    extraction_pool.shutdown()
+    analysis_cache.close()
+    extraction_cache.close()
+    job_store.close()
+
+class AnalysisResponse(ResumeAnalysis):
+    # 结果来源：llm 为模型分析，local 为本地快速分析
+    tier: str = TIER_LLM
+    # 模型分析超出延迟预算时，后台继续分析的异步任务(完成后可获取 tier=llm 的结果)
+    job_id: Optional[str] = None
+    status_url: Optional[str] = None
+
+class KeywordResult(BaseModel):
     keywords: List[str]
-    suggestions: List[str]
+
+class MatchRequest(BaseModel):
+    job_description: str
+    # 额外指定的职位关键词，与从职位描述中提取的关键词合并
+    keywords: List[str] = []
+    # 交给模型详细比较的候选数
+    top_k: int = 5
+    # 返回的按向量得分排序的候选数
+    limit: int = 20
+
+def upstream_unavailable(error: UpstreamUnavailable) -> HTTPException:
+    """上游不可用时返回503，并通过 Retry-After 告知客户端何时重试"""
+    headers = {"Retry-After": str(max(1, math.ceil(error.retry_after)))} if error.retry_after else None
+    return HTTPException(status_code=503, detail=str(error), headers=headers)
+
+def rate_limited(error: RateLimitExceeded) -> HTTPException:
+    """超出限流时返回429，并通过 Retry-After 告知客户端何时重试"""
+    headers = {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    return HTTPException(status_code=429, detail=str(error), headers=headers)
+
+async def extract_text_cached(source: Source, file_extension: str,
+                              is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                              file_hash: Optional[str] = None) -> str:
+    """提取文本：相同文件直接复用缓存，否则在工作池中解析，失败时抛出 ExtractionError"""
+    cache_key = extraction_cache_key(file_hash or fingerprint(source), file_extension, extraction_pool.max_tokens)
+    text_content = await extraction_cache.aget(cache_key)
+    if text_content is None:
+        text_content = await extraction_pool.extract(source, file_extension, is_disconnected=is_disconnected)
+        await extraction_cache.aset(cache_key, text_content)
+    return text_content
+
+async def index_analysis(filename: Optional[str], text: str, analysis: dict) -> None:
+    """把分析完成的简历加入匹配索引(写磁盘放到线程中)，失败时只打印错误"""
+    if not match_auto_index:
+        return
+    try:
+        await asyncio.to_thread(match_index.add, text, analysis, filename)
+    except Exception as e:
+        print(f"写入匹配索引时出错: {e}")
+
+async def analyze_within_budget(filename: Optional[str], text: str, budget: float) -> dict:
+    """
+    在延迟预算内等待模型分析，超时则返回本地快速分析结果(tier=local)并附上 job_id；
+    模型分析在后台继续，完成后写入该异步任务。上游不可用或限流时直接返回本地结果
+    """
+    analysis = asyncio.ensure_future(deepseek_wrapper.aanalyze_resume(text))
+    # 本地分析与模型分析同时开始，超时后无需再等待
+    quick = asyncio.ensure_future(asyncio.to_thread(quick_analyzer.analyze, text))
+    try:
+        done, _ = await asyncio.wait({analysis}, timeout=budget)
+    except asyncio.CancelledError:
+        # 客户端断开：只取消本请求的等待，同一简历的其他请求不受影响
+        analysis.cancel()
+        raise
+    if done:
+        try:
+            return analysis.result()
+        except (UpstreamUnavailable, RateLimitExceeded) as e:
+            print(f"模型分析暂不可用，返回本地快速分析结果: {e}")
+            return await quick
+
+    partial = await quick
+    # 任务由本进程完成；进程退出导致租约到期时，由worker进程重新分析(文本按 .txt 保存)
+    client = current_client()
+    job_id = await asyncio.to_thread(
+        job_store.enqueue, filename or "resume.txt", "txt", text.encode("utf-8"),
+        worker=f"api:{socket.gethostname()}:{os.getpid()}", partial=partial, client=client.id, lane=client.lane,
+    )
+    task = asyncio.create_task(upgrade_job(job_id, filename, text, analysis))
+    upgrade_tasks.add(task)
+    task.add_done_callback(upgrade_tasks.discard)
+    return {**partial, "job_id": job_id}
+
+async def upgrade_job(job_id: str, filename: Optional[str], text: str, analysis: "asyncio.Future[dict]") -> None:
+    """等待后台的模型分析完成，把结果写入异步任务"""
+    try:
+        result = await analysis
+    except (UpstreamUnavailable, RateLimitExceeded) as e:
+        await requeue_job(job_id, str(e), max(1.0, math.ceil(e.retry_after or 0)))
+        return
+    except Exception as e:
+        print(f"后台分析任务 {job_id} 时出错: {e}")
+        await asyncio.to_thread(job_store.fail, job_id, f"调用 DeepSeek 分析服务时出错: {e}")
+        return
+    if result.get("tier") == TIER_LOCAL:
+        # 模型分析失败时包装器返回本地结果，不作为最终结果
+        await requeue_job(job_id, "模型分析失败，暂时只有本地快速分析结果", 1.0)
+        return
+    await asyncio.to_thread(job_store.complete, job_id, {
+        "summary": result.get("summary", "未能生成摘要"),
+        "keywords": result.get("keywords", []),
+        "suggestions": result.get("suggestions", []),
+        "tier": result.get("tier", TIER_LLM),
+    })
+    await index_analysis(filename, text, result)
+
+async def requeue_job(job_id: str, error: str, delay: float) -> None:
+    """
+    放回队列，由worker进程稍后重新分析；没有worker在运行时直接标记为失败，
+    任务保留本地快速分析结果，不会一直停留在执行中
+    """
+    if await asyncio.to_thread(job_store.active_workers):
+        await asyncio.to_thread(job_store.retry, job_id, error, delay)
+    else:
+        await asyncio.to_thread(job_store.fail, job_id, error)
+
+async def extract_upload_text(request: Request, file: UploadFile) -> str:
+    """读取上传文件并提取文本，失败时抛出 HTTPException"""
+    file_extension = (file.filename or "").split('.')[-1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="不支持的文件类型，请上传 .docx, .pdf 或 .txt 文件")
+
+    # 分块读取并限制大小，大文件转存到临时文件，解析器直接读取
+    try:
+        with UPLOAD_READ_SECONDS.time():
+            upload = await ingest_upload(file, upload_limits)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    UPLOAD_BYTES.observe(upload.size)
+
+    # --- 文件解析逻辑 ---
+    # 在工作池中解析，避免阻塞事件循环；客户端断开时取消任务
+    try:
+        with ANALYSIS_STAGE_SECONDS.labels(stage="extraction").time():
+            text_content = await extract_text_cached(
+                upload.source, file_extension, is_disconnected=request.is_disconnected, file_hash=upload.sha256
+            )
+    except ExtractionCancelled as e:
+        raise HTTPException(status_code=499, detail=str(e))
+    except ExtractionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        upload.close()
+    # --- 文件解析逻辑结束 ---
+
+    if not text_content.strip():
+         raise HTTPException(status_code=400, detail="无法从文件中提取有效文本内容。")
+    return text_content
 
 # 添加API前缀，匹配前端的请求路径
-@app.post("/api/analyze", response_model=ResumeAnalysis)
-async def analyze_resume(file: UploadFile = File(...)):
+@app.post("/api/analyze", response_model=AnalysisResponse)
+async def analyze_resume(request: Request, file: UploadFile = File(...), latency_budget: Optional[float] = None):
+    """
+    分析简历；tier 标明结果来源
+
+    latency_budget(秒，默认 ANALYZE_LATENCY_BUDGET)大于0时，模型分析超出预算或上游不可用就先返回
+    本地快速分析结果(tier=local)，超出预算时模型结果通过 status_url 指向的异步任务获取
+    """
     if deepseek_wrapper is None:
         raise HTTPException(status_code=503, detail="DeepSeek 服务不可用，请检查 API 密钥配置。")
 
     try:
-        content_bytes = await file.read()
-        text_content = ""
-        file_extension = file.filename.split('.')[-1].lower()
-
-        # --- 文件解析逻辑 ---
-        if file_extension == 'docx':
-            try:
-                doc = Document(io.BytesIO(content_bytes))
-                text_content = "\n".join([para.text for para in doc.paragraphs])
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"无法解析 DOCX 文件: {e}")
-        elif file_extension == 'pdf':
-            try:
-                reader = PdfReader(io.BytesIO(content_bytes))
-                text_content = "\n".join([page.extract_text() for page in reader.pages if page.extract_text()]) # 过滤空页面
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"无法解析 PDF 文件: {e}")
-        elif file_extension == 'txt':
-             try:
-                 text_content = content_bytes.decode('utf-8')
-             except UnicodeDecodeError:
-                 try:
-                     text_content = content_bytes.decode('latin-1') # 尝试其他编码
-                 except Exception as e:
-                     raise HTTPException(status_code=400, detail=f"无法解码 TXT 文件: {e}")
-        else:
-            raise HTTPException(status_code=400, detail="不支持的文件类型，请上传 .docx, .pdf 或 .txt 文件")
-        # --- 文件解析逻辑结束 ---
-
-        if not text_content.strip():
-             raise HTTPException(status_code=400, detail="无法从文件中提取有效文本内容。")
+        text_content = await extract_upload_text(request, file)
 
         # --- 使用 DeepSeekWrapper 进行分析 ---
         try:
             # 调用 DeepSeekWrapper 客户端分析简历
-            analysis_result = deepseek_wrapper.analyze_resume(text_content)
+            budget = analyze_latency_budget if latency_budget is None else latency_budget
+            with ANALYSIS_STAGE_SECONDS.labels(stage="analysis").time():
+                if budget > 0 and quick_analyzer is not None:
+                    analysis_result = await analyze_within_budget(file.filename, text_content, budget)
+                else:
+                    analysis_result = await deepseek_wrapper.aanalyze_resume(text_content)
+            job_id = analysis_result.get("job_id")
+            if job_id is None:
+                # 转入后台的分析在完成后再加入匹配索引
+                await index_analysis(file.filename, text_content, analysis_result)
             
             # 提取分析结果
             summary = analysis_result.get("summary", "未能生成摘要")
             keywords = analysis_result.get("keywords", [])
             suggestions = analysis_result.get("suggestions", [])
+            tier = analysis_result.get("tier", TIER_LLM)
+            ANALYSIS_RESPONSES.labels(tier=tier).inc()
             
-            return ResumeAnalysis(
+            return AnalysisResponse(
                 summary=summary,
                 keywords=keywords,
-                suggestions=suggestions
+                suggestions=suggestions,
+                tier=tier,
+                job_id=job_id,
+                status_url=f"/api/jobs/{job_id}" if job_id else None,
             )
+        except UpstreamUnavailable as e:
+            raise upstream_unavailable(e)
+        except RateLimitExceeded as e:
+            raise rate_limited(e)
         except Exception as e:
             print(f"调用 DeepSeek 分析服务时出错: {e}")
             raise HTTPException(status_code=500, detail=f"调用 DeepSeek 分析服务时出错: {e}")
@@ -116,14 +560,263 @@ async def analyze_resume(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"处理简历时发生意外错误: {e}")
 
 # 保留原始路径，以兼容可能的直接调用
-@app.post("/analyze", response_model=ResumeAnalysis)
-async def analyze_resume_compat(file: UploadFile = File(...)):
+@app.post("/analyze", response_model=AnalysisResponse)
+async def analyze_resume_compat(request: Request, file: UploadFile = File(...), latency_budget: Optional[float] = None):
     """兼容原始API路径的端点"""
-    return await analyze_resume(file)
+    return await analyze_resume(request, file, latency_budget)
+
+@app.post("/api/keywords", response_model=KeywordResult)
+async def extract_keywords(request: Request, file: UploadFile = File(...)):
+    """只提取关键词：完全在本地完成，不调用 DeepSeek，也不受API密钥配置影响"""
+    text_content = await extract_upload_text(request, file)
+    with ANALYSIS_STAGE_SECONDS.labels(stage="keywords").time():
+        keywords = await asyncio.to_thread(keyword_extractor.extract, text_content)
+    return KeywordResult(keywords=keywords)
+
+def format_sse(event: str, data) -> str:
+    """格式化为 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/analyze/stream")
+async def analyze_resume_stream(request: Request, file: UploadFile = File(...)):
+    """
+    流式分析端点(SSE)
+
+    事件: partial(本地快速分析结果，tier=local)、token(模型输出片段)、summary、keyword、
+    suggestion(字段完整时立即推送)、result(最终完整结果，tier 标明来源)、error、done
+    """
+    if deepseek_wrapper is None:
+        raise HTTPException(status_code=503, detail="DeepSeek 服务不可用，请检查 API 密钥配置。")
+
+    text_content = await extract_upload_text(request, file)
+
+    async def event_stream():
+        # 客户端断开时 StreamingResponse 会取消该生成器
+        async for event, data in deepseek_wrapper.astream_analysis(text_content):
+            yield format_sse(event, data)
+            if event == "result":
+                await index_analysis(file.filename, text_content, data)
+        yield format_sse("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # 关闭代理缓冲(nginx)，保证事件即时送达
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """
+    异步分析：文件写入持久化队列后立即返回任务ID，由worker进程解析和分析
+
+    适合代理超时较短的部署，通过 GET /api/jobs/{job_id} 轮询结果
+    """
+    file_extension = (file.filename or "").split('.')[-1].lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="不支持的文件类型，请上传 .docx, .pdf 或 .txt 文件")
+    # 一个租约时长内没有worker心跳时，任务不会被处理，直接拒绝而不是让客户端一直轮询
+    if not await asyncio.to_thread(job_store.active_workers):
+        raise HTTPException(status_code=503, detail="异步任务worker未运行，请稍后重试或使用 /api/analyze",
+                            headers={"Retry-After": "30"})
+    try:
+        upload = await ingest_upload(file, upload_limits)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    UPLOAD_BYTES.observe(upload.size)
+    try:
+        # 大文件已转存到磁盘，读取放到线程中
+        content = await asyncio.to_thread(upload.read_bytes)
+    finally:
+        upload.close()
+
+    # 记录提交者，worker以其名义调用上游，异步任务同样受该客户端的权重和每日额度约束
+    client = current_client()
+    job_id = await asyncio.to_thread(
+        job_store.enqueue, file.filename or f"resume.{file_extension}", file_extension, content,
+        client=client.id, lane=client.lane,
+    )
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "pending", "status_url": f"/api/jobs/{job_id}"},
+        headers={"Location": f"/api/jobs/{job_id}"},
+    )
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    查询异步任务状态，完成后 result 字段与 /api/analyze 的返回格式相同
+
+    完成前 result 可能已是本地快速分析结果(tier=local)，完成后替换为模型结果(tier=llm)
+    """
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job
+
+@app.post("/api/match")
+async def match_job(body: MatchRequest):
+    """
+    职位匹配：先用关键词向量对索引中的所有简历一次性打分，只把得分最高的 top_k 份交给模型详细比较
+
+    候选按模型给出的 comparison.score 排序(没有模型比较的候选排在后面，按向量得分排序)
+    """
+    job_description = body.job_description.strip()
+    if not job_description:
+        raise HTTPException(status_code=400, detail="职位描述不能为空")
+    job_keywords = await asyncio.to_thread(keyword_extractor.extract, job_description, 100)
+    job_keywords += [k for k in body.keywords if k not in job_keywords]
+    if not job_keywords:
+        raise HTTPException(status_code=400, detail="未能从职位描述中识别出技能关键词，请通过 keywords 字段指定")
+
+    with ANALYSIS_STAGE_SECONDS.labels(stage="match_search").time():
+        candidates = await asyncio.to_thread(match_index.search, job_keywords, max(1, min(body.limit, 200)))
+
+    top_k = max(0, min(body.top_k, match_max_top_k, len(candidates)))
+    if top_k and deepseek_wrapper is not None:
+        async def compare(candidate):
+            text = await asyncio.to_thread(match_index.resume_text, candidate["resume_id"])
+            try:
+                candidate["comparison"] = await deepseek_wrapper.acompare_with_job(job_description, text)
+            except Exception as e:
+                print(f"职位匹配详细比较时出错: {e}")
+                candidate["comparison_error"] = str(e)
+
+        with ANALYSIS_STAGE_SECONDS.labels(stage="match_compare").time():
+            await asyncio.gather(*(compare(candidate) for candidate in candidates[:top_k]))
+        candidates[:top_k] = sorted(
+            candidates[:top_k], key=lambda c: -c["comparison"]["score"] if "comparison" in c else 1
+        )
+
+    return {
+        "job_keywords": job_keywords,
+        # 统计时会读取其他进程追加的记录，同样放到线程中
+        "total_indexed": await asyncio.to_thread(len, match_index),
+        "candidates": candidates,
+    }
+
+@app.get("/api/match/index")
+async def match_index_info():
+    """匹配索引的状态"""
+    return await asyncio.to_thread(match_index.info)
+
+@app.post("/api/batch")
+async def create_batch(files: List[UploadFile] = File(...)):
+    """创建批量分析任务，支持多个文件或zip压缩包"""
+    if batch_manager is None:
+        raise HTTPException(status_code=503, detail="DeepSeek 服务不可用，请检查 API 密钥配置。")
+
+    uploads = []
+    for file in files:
+        # zip压缩包按整个批量请求的上限计算，单个简历按单文件上限
+        is_archive = (file.filename or "").lower().endswith(".zip")
+        limits = UploadLimits(max_bytes=upload_limits.max_batch_request_bytes) if is_archive else upload_limits
+        try:
+            upload = await ingest_upload(file, limits)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=f"{file.filename}: {e}")
+        try:
+            uploads.append((upload.filename, await asyncio.to_thread(upload.read_bytes)))
+        finally:
+            upload.close()
+    try:
+        # 读取和解压zip较慢，放到线程中执行
+        items = await asyncio.to_thread(
+            expand_uploads, uploads, SUPPORTED_EXTENSIONS, int(os.getenv("BATCH_MAX_FILES", 500))
+        )
+    except BatchLimitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="未找到可分析的简历文件，请上传 .docx, .pdf 或 .txt 文件")
+
+    # 任务写入共享的数据库，由各worker进程领取处理，轮询请求可以落到任意进程
+    return await batch_manager.create_job(items)
+
+def batch_not_found() -> HTTPException:
+    return HTTPException(status_code=404, detail="批量任务不存在或已过期")
+
+@app.get("/api/batch/{job_id}")
+async def batch_status(job_id: str):
+    """查询批量任务状态和进度"""
+    progress = await batch_manager.get(job_id) if batch_manager is not None else None
+    if progress is None:
+        raise batch_not_found()
+    return progress
+
+@app.get("/api/batch/{job_id}/results")
+async def batch_results(job_id: str, offset: int = 0, limit: int = 100):
+    """分页获取批量任务中每份简历的结果"""
+    results = await batch_manager.results(job_id, offset, limit) if batch_manager is not None else None
+    if results is None:
+        raise batch_not_found()
+    return results
+
+@app.get("/api/usage")
+async def client_usage():
+    """当前客户端(按API密钥或IP识别)今日的上游用量和额度，用量来自API返回的 usage 字段"""
+    if deepseek_wrapper is None:
+        raise HTTPException(status_code=503, detail="DeepSeek 服务不可用，请检查 API 密钥配置。")
+    client = current_client()
+    scheduler = deepseek_wrapper.admission.scheduler
+    try:
+        usage = await asyncio.to_thread(scheduler.ledger.get, client.id)
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=503, detail=f"用量存储暂时不可用，请稍后重试: {e}", headers={"Retry-After": "1"})
+    limit = scheduler.daily_limit(client.id)
+    return {
+        "client": client.id,
+        "usage": usage,
+        "daily_token_limit": limit or None,
+        "remaining_tokens": max(0, limit - usage["total_tokens"]) if limit else None,
+        "in_flight": scheduler.client_in_flight(client.id),
+    }
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """缓存命中/未命中/淘汰统计"""
+    return {"analysis": analysis_cache.info(), "extraction": extraction_cache.info()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 文本格式的指标(按进程统计，多worker部署时需逐个抓取)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/healthz")
+async def healthz():
+    """存活检查：事件循环能够响应即视为存活"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """就绪检查：正在关闭、所有上游都已熔断或排队过长时返回503"""
+    checks = {"draining": draining}
+    if warmup_task is not None:
+        # 预热未完成不影响就绪，只是首批请求可能较慢
+        checks["warmup"] = "done" if warmup_task.done() else "running"
+    ready = not draining
+    if deepseek_wrapper is None:
+        checks["upstream"] = "not_configured"
+    else:
+        providers = deepseek_wrapper.providers.providers
+        checks["upstream"] = {p.name: p.transport.breaker.info() for p in providers}
+        if all(p.transport.breaker.state == p.transport.breaker.OPEN for p in providers):
+            ready = False
+        waiting = sum(p.admission.waiting for p in providers)
+        checks["admission_waiting"] = waiting
+        if waiting > ready_max_queue_depth:
+            ready = False
+    checks["extraction_pending"] = extraction_pool.pending
+    if extraction_pool.pending > ready_max_extraction_queue:
+        ready = False
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "unavailable", "checks": checks},
+    )
 
 @app.get("/")
 async def read_root():
     return {"message": "欢迎使用AI简历优化助手 (类LangChain风格实现)"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # 本地开发用的单进程服务器；生产环境使用 gunicorn -c gunicorn.conf.py
+    uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", 8000)))
\ No newline at end of file
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from cache import make_cache_key, normalize_text
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl 模块，此时只在进程内加锁(多进程共享索引需要类Unix系统)
+    fcntl = None
+
+# NumPy在首次使用索引时才导入，不影响服务冷启动
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# 索引格式版本，特征提取方式变化时递增(旧索引需要重建)
+INDEX_VERSION = 1
+
+_TERM_SPLIT_PATTERN = re.compile(r"[\s/|,，、;；()（）]+")
+
+
+def normalize_term(term: str) -> str:
+    """关键词规范化：统一Unicode形式、小写、合并空白"""
+    return " ".join(unicodedata.normalize("NFKC", term).lower().split())
+
+
+def feature_terms(keywords: Iterable[str]) -> List[str]:
+    """
+    关键词转为特征词：完整关键词 + 多词关键词拆出的各个部分
+
+    例如 "Spring Boot / 微服务" 得到 "spring boot / 微服务"、"spring"、"boot"、"微服务"
+    """
+    terms = []
+    seen = set()
+    for keyword in keywords:
+        term = normalize_term(keyword)
+        if not term:
+            continue
+        parts = [part for part in _TERM_SPLIT_PATTERN.split(term) if part]
+        for candidate in [term] + (parts if len(parts) > 1 else []):
+            if candidate not in seen:
+                seen.add(candidate)
+                terms.append(candidate)
+    return terms
+
+
+def hash_features(terms: Iterable[str], dim: int) -> List[int]:
+    """
+    特征哈希：每个特征词映射到 [0, dim) 中的一个维度
+
+    使用稳定的哈希(不受 PYTHONHASHSEED 影响)，不同进程和重启后结果一致
+    """
+    features = set()
+    for term in terms:
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+        features.add(int.from_bytes(digest, "little") % dim)
+    return sorted(features)
+
+
+class MatchIndex:
+    """
+    已分析简历的增量索引：每份简历保存为稀疏的哈希特征向量，按TF-IDF余弦相似度与职位描述打分
+
+    磁盘上只追加写入(meta.jsonl 每行一份简历，texts.txt 保存简历文本)，多个进程通过文件锁
+    共享同一个索引；每个进程在查询前读取其他进程新追加的条目。
+    内存中的特征以CSR形式保存在NumPy数组中，一次查询是对所有简历的一次向量化计算
+    """
+
+    def __init__(self, path: str, dim: int = 2048):
+        """
+        Args:
+            path: 索引目录
+            dim: 哈希特征维度(已有索引以其创建时的维度为准)
+        """
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._opened = False
+        self._meta_offset = 0
+        self.entries: List[Dict[str, Any]] = []
+        self._ids: Dict[str, int] = {}
+        # 新读入、尚未合并到NumPy数组的特征
+        self._pending: List[List[int]] = []
+        self._indices: Optional["np.ndarray"] = None
+        self._rows: Optional["np.ndarray"] = None
+        self._df: Optional["np.ndarray"] = None
+        self._norms: Optional["np.ndarray"] = None
+
+    @classmethod
+    def from_env(cls) -> "MatchIndex":
+        path = os.getenv("MATCH_INDEX_PATH") or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "data", "match_index"
+        )
+        return cls(path, dim=int(os.getenv("MATCH_VECTOR_DIM", 2048)))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self) -> None:
+        # 首次使用时才创建索引目录
+        if self._opened:
+            return
+        import numpy as np
+
+        os.makedirs(self.path, exist_ok=True)
+        info_path = self._file("index.json")
+        if os.path.exists(info_path):
+            with open(info_path, encoding="utf-8") as f:
+                info = json.load(f)
+            if info.get("version") != INDEX_VERSION:
+                raise ValueError(f"匹配索引版本不兼容({info.get('version')})，请删除 {self.path} 后重建")
+            self.dim = info["dim"]
+        else:
+            with open(info_path, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "dim": self.dim}, f)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._df = np.zeros(self.dim, dtype=np.int64)
+        self._opened = True
+
+    def _refresh(self) -> None:
+        """读取(包括其他进程)新追加的条目；只读取完整的行，写到一半的行留到下次"""
+        self._open()
+        meta_path = self._file("meta.jsonl")
+        if not os.path.exists(meta_path) or os.path.getsize(meta_path) <= self._meta_offset:
+            return
+        with open(meta_path, "rb") as f:
+            f.seek(self._meta_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry["id"] in self._ids:
+                continue
+            features = entry.pop("features")
+            self._ids[entry["id"]] = len(self.entries)
+            self.entries.append(entry)
+            self._pending.append(features)
+        self._meta_offset += end
+
+    def _compact(self) -> None:
+        """把新条目的特征合并到CSR数组，并更新文档频率"""
+        if not self._pending:
+            return
+        import numpy as np
+
+        start = len(self.entries) - len(self._pending)
+        lengths = [len(features) for features in self._pending]
+        new_indices = np.fromiter(
+            (index for features in self._pending for index in features), dtype=np.int32, count=sum(lengths)
+        )
+        new_rows = np.repeat(np.arange(start, len(self.entries), dtype=np.int32), lengths)
+        self._indices = np.concatenate([self._indices, new_indices])
+        self._rows = np.concatenate([self._rows, new_rows])
+        self._df += np.bincount(new_indices, minlength=self.dim)
+        self._pending = []
+        # 文档数变化后IDF变化，行范数需要重新计算
+        self._norms = None
+
+    def load(self) -> None:
+        """读取磁盘上的索引并构建NumPy数组(启动预热时调用，首次匹配请求不再等待)"""
+        with self._lock:
+            self._refresh()
+            self._compact()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self.entries)
+
+    def contains(self, text: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return self.document_id(text) in self._ids
+
+    @staticmethod
+    def document_id(text: str) -> str:
+        return make_cache_key("resume", normalize_text(text))
+
+    def add(self, text: str, analysis: Dict[str, Any], filename: Optional[str] = None) -> Optional[str]:
+        """
+        把一份已分析的简历加入索引，已存在(文本相同)时跳过
+
+        Args:
+            text: 简历文本(详细比较时发送给模型)
+            analysis: 分析结果，使用其中的 keywords 作为特征
+            filename: 原始文件名
+
+        Returns:
+            新条目的ID，已存在或没有关键词时返回None
+        """
+        keywords = [keyword for keyword in analysis.get("keywords") or [] if isinstance(keyword, str)]
+        if not keywords:
+            return None
+        doc_id = self.document_id(text)
+        with self._lock:
+            self._refresh()
+            if doc_id in self._ids:
+                return None
+            with open(self._file("index.lock"), "a") as lock_file:
+                # 文件锁保证多个进程追加的文本和元数据一一对应
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    if doc_id in self._ids:
+                        return None
+                    self._append(doc_id, text, analysis, keywords, filename)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._refresh()
+        return doc_id
+
+    def _append(self, doc_id: str, text: str, analysis: Dict[str, Any], keywords: List[str],
+                filename: Optional[str]) -> None:
+        # 进程在两次写入之间崩溃时，文本文件中可能留下无人引用的内容，元数据中记录了偏移量，不受影响
+        encoded = text.encode("utf-8")
+        with open(self._file("texts.txt"), "ab") as f:
+            offset = f.tell()
+            f.write(encoded)
+        meta_path = self._file("meta.jsonl")
+        with open(meta_path, "ab+") as f:
+            # 丢弃上次写到一半的行
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    f.seek(0)
+                    data = f.read()
+                    f.truncate(data.rfind(b"\n") + 1)
+            entry = {
+                "id": doc_id,
+                "filename": filename,
+                "summary": analysis.get("summary", ""),
+                "keywords": keywords,
+                "features": hash_features(feature_terms(keywords), self.dim),
+                "text_offset": offset,
+                "text_length": len(encoded),
+                "added_at": time.time(),
+            }
+            f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def resume_text(self, resume_id: str) -> Optional[str]:
+        """读取索引中保存的简历文本，不存在时返回None"""
+        with self._lock:
+            position = self._ids.get(resume_id)
+            if position is None:
+                return None
+            entry = self.entries[position]
+        with open(self._file("texts.txt"), "rb") as f:
+            f.seek(entry["text_offset"])
+            return f.read(entry["text_length"]).decode("utf-8")
+
+    def search(self, keywords: Iterable[str], limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        按关键词向量对所有简历打分，返回得分最高的若干条
+
+        得分为TF-IDF加权的余弦相似度(0~1)；matched_keywords 为职位描述与简历共同的关键词
+        """
+        import numpy as np
+
+        terms = feature_terms(keywords)
+        query = np.array(hash_features(terms, self.dim), dtype=np.int32)
+        with self._lock:
+            self._refresh()
+            self._compact()
+            count = len(self.entries)
+            if count == 0 or query.size == 0:
+                return []
+            # 平滑IDF，与 sklearn TfidfVectorizer(smooth_idf=True) 相同
+            idf = np.log((1 + count) / (1 + self._df)) + 1
+            weights = idf * idf
+            if self._norms is None:
+                self._norms = np.sqrt(np.bincount(self._rows, weights=weights[self._indices], minlength=count))
+            query_weights = np.zeros(self.dim)
+            query_weights[query] = weights[query]
+            dots = np.bincount(self._rows, weights=query_weights[self._indices], minlength=count)
+            denominator = self._norms * math.sqrt(weights[query].sum())
+            scores = np.divide(dots, denominator, out=np.zeros(count), where=denominator > 0)
+
+            limit = min(limit, count)
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            entries = [(self.entries[i], float(scores[i])) for i in top if scores[i] > 0]
+
+        query_terms = set(terms)
+        results = []
+        for entry, score in entries:
+            results.append({
+                "resume_id": entry["id"],
+                "filename": entry.get("filename"),
+                "summary": entry.get("summary", ""),
+                "score": round(score, 4),
+                "matched_keywords": [k for k in entry["keywords"] if normalize_term(k) in query_terms],
+            })
+        return results
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {"path": self.path, "dim": self.dim, "resumes": len(self.entries)}
+
+    def collect_metrics(self):
+        """供 /metrics 抓取的索引规模(未创建索引时不输出)"""
+        if not self._opened:
+            return
+        yield ("match_index_resumes", "gauge", "匹配索引中的简历数", [({}, len(self.entries))])
@@ -0,0 +1,292 @@
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# 采集函数返回 (指标名, 类型, 说明, [(标签, 值)])
+Sample = Tuple[Dict[str, str], float]
+Collected = Tuple[str, str, str, List[Sample]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """指标基类，按标签值保存子序列"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _new_child(self):
+        return type(self)(self.name, self.documentation)
+
+    def _series(self) -> Iterable[Tuple[Dict[str, str], "_Metric"]]:
+        if not self.labelnames:
+            yield {}, self
+            return
+        for key, child in list(self._children.items()):
+            yield dict(zip(self.labelnames, key)), child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for labels, child in self._series():
+            lines.extend(child._render_samples(labels))
+        return lines
+
+    @abstractmethod
+    def _render_samples(self, labels: Dict[str, str]) -> List[str]:
+        pass
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def _render_samples(self, labels: Dict[str, str]) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def _render_samples(self, labels: Dict[str, str]) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(self.value)}"]
+
+
+# 默认延迟分桶(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+class Histogram(_Metric):
+    """直方图：按分桶统计分布"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self.buckets[:-1])
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def _render_samples(self, labels: Dict[str, str]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            bucket_labels = dict(labels, le=_format_value(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+
+class Registry:
+    """指标注册表，按Prometheus文本格式导出"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Collected]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Collected]]) -> None:
+        """注册在抓取时才计算的指标(例如缓存统计、队列长度)"""
+        self._collectors.append(collector)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                print(f"采集指标时出错: {e}")
+                continue
+            for name, type_name, documentation, samples in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+CHAR_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+PAGE_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# --- HTTP ---
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "正在处理的HTTP请求数")
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP请求处理耗时", ["method", "path", "status"]
+)
+
+# --- 上传与解析 ---
+UPLOAD_READ_SECONDS = REGISTRY.histogram("resume_upload_read_seconds", "读取上传文件耗时")
+UPLOAD_BYTES = REGISTRY.histogram("resume_upload_bytes", "上传文件大小(字节)", buckets=SIZE_BUCKETS)
+EXTRACTION_SECONDS = REGISTRY.histogram("resume_extraction_seconds", "文本提取耗时(含排队)", ["format"])
+EXTRACTION_PAGES = REGISTRY.histogram("resume_extraction_pages", "文档页数", ["format"], buckets=PAGE_BUCKETS)
+EXTRACTION_TRUNCATED = REGISTRY.counter("resume_extraction_truncated_total", "达到文本预算而提前停止解析的次数", ["format"])
+PDF_PAGE_SECONDS = REGISTRY.histogram("resume_pdf_page_seconds", "PDF单页解析耗时")
+PDF_PAGES_SKIPPED = REGISTRY.counter("resume_pdf_pages_skipped_total", "跳过的空白/纯图片/损坏PDF页数")
+EXTRACTION_FAILURES = REGISTRY.counter("resume_extraction_failures_total", "文本提取失败次数", ["format", "reason"])
+
+# --- LLM ---
+PROMPT_CHARS = REGISTRY.histogram("llm_prompt_chars", "提示词字符数", buckets=CHAR_BUCKETS)
+PROMPT_TOKENS_ESTIMATED = REGISTRY.histogram("llm_prompt_tokens_estimated", "本地估算的提示词token数", buckets=TOKEN_BUCKETS)
+UPSTREAM_LATENCY = REGISTRY.histogram("llm_upstream_latency_seconds", "上游单次请求耗时", ["status"])
+UPSTREAM_RETRIES = REGISTRY.counter("llm_upstream_retries_total", "上游请求重试次数")
+UPSTREAM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "API usage 字段报告的token数(prompt_cached 为其中命中前缀缓存的输入token)", ["kind"]
+)
+JSON_PARSE_FALLBACKS = REGISTRY.counter(
+    "llm_json_parse_fallbacks_total", "模型输出无法解析为JSON而返回占位结果的次数", ["client"]
+)
+LLM_OUTPUT_PARSE = REGISTRY.counter(
+    "llm_output_parse_total", "模型输出按schema校验的结果(ok/salvaged/invalid)", ["client", "result"]
+)
+LLM_OUTPUT_REPAIRS = REGISTRY.counter("llm_output_repairs_total", "解析失败后修复请求的结果", ["client", "result"])
+PROVIDER_REQUESTS = REGISTRY.counter("llm_provider_requests_total", "各模型服务的调用次数", ["provider", "outcome"])
+PROVIDER_FALLBACKS = REGISTRY.counter(
+    "llm_provider_fallbacks_total", "跳过或放弃某个模型服务、转到下一个服务的次数", ["provider", "reason"]
+)
+SCHEDULER_WAIT_SECONDS = REGISTRY.histogram(
+    "llm_scheduler_wait_seconds", "上游调用在公平调度队列中的等待时间", ["lane"]
+)
+ANALYSIS_RESPONSES = REGISTRY.counter(
+    "resume_analysis_responses_total", "/api/analyze 按结果来源(llm/local)统计的响应数", ["tier"]
+)
+ANALYSIS_STAGE_SECONDS = REGISTRY.histogram("resume_analysis_stage_seconds", "分析流程各阶段耗时", ["stage"])
+
+
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "事件循环调度延迟(定时器实际触发时间与预期之差)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+async def monitor_event_loop_lag(interval: float = 0.1) -> None:
+    """周期性测量事件循环延迟，持续偏高说明有同步代码阻塞了事件循环"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+
+def record_usage(usage: Optional[Dict[str, int]]) -> None:
+    """记录API返回的 usage 字段"""
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            UPSTREAM_TOKENS.labels(kind=kind.replace("_tokens", "")).inc(usage[kind])
+    # 命中上游前缀缓存的输入token：DeepSeek 为 prompt_cache_hit_tokens，OpenAI 为 prompt_tokens_details.cached_tokens
+    cached = usage.get("prompt_cache_hit_tokens")
+    if cached is None:
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached:
+        UPSTREAM_TOKENS.labels(kind="prompt_cached").inc(cached)
@@ -0,0 +1,105 @@
+import re
+from typing import Dict, List, Optional
+
+
+# 所有分析请求共用的系统提示，放在消息最前面，保证上游的前缀缓存可以命中
+SYSTEM_PROMPT = "你是一个专业的简历分析助手，擅长提取简历中的关键信息并给出改进建议。"
+
+# 用户消息只包含简历文本等可变内容
+RESUME_USER_TEMPLATE = """简历内容:
+--- START ---
+{resume_text}
+--- END ---"""
+
+# 职位匹配的详细比较：要求和输出格式放在系统提示中，职位描述和简历放在用户消息中
+MATCH_INSTRUCTIONS = "请对照职位描述评估候选人简历的匹配程度，指出匹配的优势和欠缺之处。"
+
+MATCH_FORMAT_INSTRUCTIONS = """
+请以JSON格式返回结果，包含以下字段：
+- score: 0到100之间的整数，表示匹配程度
+- strengths: 字符串数组，候选人符合职位要求的方面
+- gaps: 字符串数组，候选人欠缺或需要确认的方面
+- verdict: 字符串，一句话结论
+
+JSON格式示例：
+{"score": 80, "strengths": ["优势1", "优势2"], "gaps": ["欠缺1"], "verdict": "结论"}
+"""
+
+MATCH_USER_TEMPLATE = """职位描述:
+--- START ---
+{job_description}
+--- END ---
+
+简历内容:
+--- START ---
+{resume_text}
+--- END ---"""
+
+_SLOT_PATTERN = re.compile(r"\{(\w+)\}")
+
+
+class PromptTemplate:
+    """
+    提示模板，类似于LangChain的PromptTemplate
+
+    创建时编译为静态片段和变量槽位：部分变量立即代入，format 时只按顺序拼接，
+    不再对整个模板做多次 str.replace
+    """
+
+    def __init__(self, template: str, input_variables: List[str], partial_variables: Dict[str, str] = None):
+        self.template = template
+        self.input_variables = input_variables
+        self.partial_variables = partial_variables or {}
+        # 偶数位置为静态文本，奇数位置为输入变量名
+        self._parts: List[str] = []
+        literal = []
+        position = 0
+        for match in _SLOT_PATTERN.finditer(template):
+            literal.append(template[position:match.start()])
+            name = match.group(1)
+            if name in self.partial_variables:
+                literal.append(self.partial_variables[name])
+            elif name in input_variables:
+                self._parts.extend(["".join(literal), name])
+                literal = []
+            else:
+                # 未声明的占位符原样保留
+                literal.append(match.group(0))
+            position = match.end()
+        literal.append(template[position:])
+        self._parts.append("".join(literal))
+
+    @property
+    def static_prefix(self) -> str:
+        """第一个变量之前的静态部分"""
+        return self._parts[0]
+
+    def format(self, **kwargs) -> str:
+        """填充输入变量；未提供的变量保留占位符"""
+        parts = self._parts
+        rendered = [parts[0]]
+        for index in range(1, len(parts), 2):
+            name = parts[index]
+            rendered.append(kwargs[name] if name in kwargs else f"{{{name}}}")
+            rendered.append(parts[index + 1])
+        return "".join(rendered)
+
+
+def analysis_system_prompt(instructions: str, format_instructions: Optional[str] = None) -> str:
+    """
+    把不变的分析要求和输出格式说明拼入系统提示
+
+    同一配置下每次请求的系统提示逐字节相同，上游可以复用缓存的前缀
+    """
+    sections = [SYSTEM_PROMPT, instructions.strip()]
+    if format_instructions:
+        sections.append(format_instructions.strip())
+    return "\n\n".join(sections)
+
+
+def build_messages(prompt: str, system: Optional[str] = None) -> List[Dict[str, str]]:
+    """构建 Chat Completions 消息列表：固定的系统提示在前，可变内容在后"""
+    return [
+        {"role": "system", "content": system or SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
@@ -0,0 +1,164 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from chunking import clean_resume_text, estimate_tokens, section_heading
+from keywords import KeywordExtractor
+
+
+# 分析结果的来源：local 为本地规则快速分析，llm 为模型分析
+TIER_LOCAL = "local"
+TIER_LLM = "llm"
+
+# 章节标题归类(标题见 chunking._SECTION_HEADINGS)
+_SECTION_KINDS = {
+    "profile": ("个人简介", "自我评价", "个人总结", "求职意向", "summary", "profile", "objective", "about me"),
+    "contact": ("个人信息", "基本信息", "联系方式"),
+    "education": ("教育背景", "教育经历", "education"),
+    "experience": (
+        "工作经历", "工作经验", "实习经历", "experience", "work experience", "professional experience",
+        "employment", "internship", "internships",
+    ),
+    "projects": ("项目经历", "项目经验", "projects", "project experience"),
+    "skills": ("专业技能", "技能特长", "技能", "skills", "technical skills"),
+}
+_KIND_OF_HEADING = {heading: kind for kind, headings in _SECTION_KINDS.items() for heading in headings}
+
+# 缺失时给出建议的章节
+_REQUIRED_SECTIONS = (
+    ("education", "教育背景"),
+    (("experience", "projects"), "工作、实习或项目经历"),
+    ("skills", "专业技能"),
+)
+
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+_PHONE_PATTERN = re.compile(
+    r"(?<!\d)(\+?86[\s-]?)?1[3-9]\d[\s-]?\d{4}[\s-]?\d{4}(?!\d)|(?<!\d)\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}(?!\d)"
+)
+# 量化成果：数字后跟百分比、倍数、金额、人数等单位
+_METRIC_PATTERN = re.compile(r"\d+(\.\d+)?\s*(%|％|倍|万|千|亿|人|个|家|次|ms|秒|x\b|k\b)", re.IGNORECASE)
+_SENTENCE_PATTERN = re.compile(r"[^。！？；!?;\n]+[。！？；!?;]?")
+
+_SUMMARY_MAX_CHARS = 150
+
+
+Section = Tuple[Optional[str], str, str]
+
+
+class QuickAnalyzer:
+    """
+    本地快速分析：章节识别、抽取式摘要、技能词典关键词和规则建议，不调用模型
+
+    耗时为毫秒级，在模型分析超出延迟预算或上游不可用时先返回该结果(tier=local)
+    """
+
+    def __init__(self, keyword_extractor: Optional[KeywordExtractor] = None,
+                 max_section_tokens: int = 800, max_resume_chars: int = 4000, min_resume_chars: int = 200):
+        """
+        Args:
+            keyword_extractor: 本地关键词提取器(只使用技能词典，不做实体识别)
+            max_section_tokens: 单个章节超过该token数时建议精简
+            max_resume_chars: 简历整体超过该字数时建议精简
+            min_resume_chars: 简历整体少于该字数时建议补充
+        """
+        self.keyword_extractor = keyword_extractor
+        self.max_section_tokens = max_section_tokens
+        self.max_resume_chars = max_resume_chars
+        self.min_resume_chars = min_resume_chars
+
+    @classmethod
+    def from_env(cls, keyword_extractor: Optional[KeywordExtractor] = None) -> Optional["QuickAnalyzer"]:
+        """按 QUICK_ANALYSIS_* 环境变量创建，QUICK_ANALYSIS=false 时返回None"""
+        if os.getenv("QUICK_ANALYSIS", "true").lower() != "true":
+            return None
+        return cls(
+            keyword_extractor,
+            max_section_tokens=int(os.getenv("QUICK_ANALYSIS_MAX_SECTION_TOKENS", 800)),
+            max_resume_chars=int(os.getenv("QUICK_ANALYSIS_MAX_RESUME_CHARS", 4000)),
+        )
+
+    @staticmethod
+    def sections(text: str) -> List[Section]:
+        """按章节标题拆分，返回 (章节类别, 标题, 正文) 列表；标题之前的内容(通常是姓名和联系方式)类别为None"""
+        sections: List[Section] = []
+        kind, heading, lines = None, "", []
+        for line in text.splitlines():
+            found = section_heading(line)
+            if found is not None:
+                if lines or heading:
+                    sections.append((kind, heading, "\n".join(lines).strip()))
+                kind, heading, lines = _KIND_OF_HEADING.get(found), line.strip(" #*【】[]:："), []
+            else:
+                lines.append(line)
+        if lines or heading:
+            sections.append((kind, heading, "\n".join(lines).strip()))
+        return sections
+
+    def analyze(self, resume_text: str) -> Dict[str, Any]:
+        """返回与模型分析相同格式的结果(summary、keywords、suggestions)，tier 为 local"""
+        text = clean_resume_text(resume_text) or resume_text.strip()
+        sections = self.sections(text)
+        keywords = self.keyword_extractor.extract(text, entities=False) if self.keyword_extractor else []
+        return {
+            "summary": self._summary(sections, keywords),
+            "keywords": keywords,
+            "suggestions": self._suggestions(text, sections, keywords),
+            "tier": TIER_LOCAL,
+        }
+
+    @staticmethod
+    def _summary(sections: List[Section], keywords: List[str]) -> str:
+        """有个人简介时直接摘取；否则从经历中选出包含技能关键词最多的句子，再附上主要技能"""
+        profile = " ".join(body.replace("\n", " ") for kind, _, body in sections if kind == "profile" and body)
+        parts = []
+        if profile:
+            parts.append(profile)
+        else:
+            lowered = [keyword.lower() for keyword in keywords]
+            sentences = [
+                sentence.strip()
+                for kind, _, body in sections if kind in ("experience", "projects")
+                for sentence in _SENTENCE_PATTERN.findall(body) if len(sentence.strip()) >= 8
+            ]
+            scored = sorted(
+                range(len(sentences)),
+                key=lambda i: (-sum(keyword in sentences[i].lower() for keyword in lowered), i),
+            )
+            parts.extend(sentences[i] for i in sorted(scored[:2]))
+        if keywords:
+            parts.append(f"主要技能: {'、'.join(keywords[:5])}")
+        summary = "；".join(part.rstrip("。；;") for part in parts)
+        if not summary:
+            return "未能从简历中识别出经历或技能信息。"
+        if len(summary) > _SUMMARY_MAX_CHARS:
+            summary = summary[:_SUMMARY_MAX_CHARS - 1] + "…"
+        return summary
+
+    def _suggestions(self, text: str, sections: List[Section], keywords: List[str]) -> List[str]:
+        suggestions = []
+        if not _EMAIL_PATTERN.search(text) or not _PHONE_PATTERN.search(text):
+            suggestions.append("补充完整的联系方式(手机号和邮箱)，放在简历开头")
+
+        kinds = {kind for kind, _, _ in sections}
+        for required, name in _REQUIRED_SECTIONS:
+            required_kinds = required if isinstance(required, tuple) else (required,)
+            if not kinds.intersection(required_kinds):
+                suggestions.append(f"补充「{name}」部分，并使用清晰的章节标题")
+
+        for kind, heading, body in sections:
+            if kind is not None and estimate_tokens(body) > self.max_section_tokens:
+                suggestions.append(f"「{heading}」部分篇幅过长，建议只保留与目标岗位最相关的内容")
+
+        experience = "\n".join(body for kind, _, body in sections if kind in ("experience", "projects"))
+        if experience and not _METRIC_PATTERN.search(experience):
+            suggestions.append("用数字量化工作成果，例如性能提升比例、用户规模或节省的成本")
+        if len(keywords) < 3:
+            suggestions.append("补充与目标岗位相关的技能关键词，便于筛选系统识别")
+
+        if len(text) > self.max_resume_chars:
+            suggestions.append("简历整体篇幅偏长，建议精简到1-2页")
+        elif len(text) < self.min_resume_chars:
+            suggestions.append("简历内容偏少，建议补充项目细节和个人贡献")
+        if not suggestions:
+            suggestions.append("简历结构完整，可针对目标岗位调整技能和经历的描述顺序")
+        return suggestions[:5]
@@ -0,0 +1,661 @@
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from metrics import SCHEDULER_WAIT_SECONDS
+
+
+class AsyncTokenBucket:
+    """令牌桶限流器：按每分钟速率补充令牌，令牌不足时等待"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数，<=0 表示不限流
+            burst: 桶容量，默认等于每秒速率(至少为1)
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """获取令牌，不足时等待补充"""
+        if not self.enabled:
+            return
+        # 超过桶容量的请求按满桶处理，避免永远等待
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimitExceeded(Exception):
+    """超出限流且排队等待会超过上限，对应HTTP 429"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(RateLimitExceeded):
+    """客户端当日的token额度已用完，对应HTTP 429，次日零点恢复"""
+
+
+# 优先级通道：交互式请求(单份上传、流式分析、职位匹配)优先于批量任务
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+
+class Client:
+    """发起上游调用的客户端(按API密钥或IP识别)及其优先级通道"""
+
+    def __init__(self, client_id: str, lane: str = LANE_INTERACTIVE):
+        self.id = client_id
+        self.lane = lane if lane in LANES else LANE_INTERACTIVE
+
+
+# 当前请求的客户端，由HTTP中间件设置；后台任务(批量分析、单飞调用)创建时继承
+_current_client: ContextVar[Client] = ContextVar("llm_client", default=Client("anonymous"))
+
+
+def current_client() -> Client:
+    return _current_client.get()
+
+
+@contextmanager
+def client_scope(client_id: str, lane: str = LANE_INTERACTIVE) -> Iterator[Client]:
+    """在该范围内(包括其中创建的任务)发起的上游调用归属于指定客户端和通道"""
+    client = Client(client_id, lane)
+    token = _current_client.set(client)
+    try:
+        yield client
+    finally:
+        _current_client.reset(token)
+
+
+def parse_mapping(value: Optional[str]) -> Dict[str, str]:
+    """解析 "a=1,b=2" 形式的环境变量"""
+    mapping = {}
+    for pair in (value or "").split(","):
+        name, sep, item = pair.partition("=")
+        if sep and name.strip():
+            mapping[name.strip()] = item.strip()
+    return mapping
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+def _seconds_until_tomorrow() -> float:
+    now = datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1.0, (tomorrow - now).total_seconds())
+
+
+_USAGE_FIELDS = ("requests", "prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class MemoryUsageLedger:
+    """进程内的客户端每日用量(按API返回的 usage 字段记账)"""
+
+    def __init__(self):
+        self._day = _today()
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _roll(self) -> None:
+        # 跨天后清空前一天的用量
+        day = _today()
+        if day != self._day:
+            self._day = day
+            self._usage = {}
+
+    def add(self, client_id: str, usage: Dict[str, Any]) -> None:
+        with self._lock:
+            self._roll()
+            entry = self._usage.setdefault(client_id, dict.fromkeys(_USAGE_FIELDS, 0))
+            entry["requests"] += 1
+            for field in _USAGE_FIELDS[1:]:
+                entry[field] += int(usage.get(field) or 0)
+
+    def get(self, client_id: str) -> Dict[str, int]:
+        """客户端当日的用量"""
+        with self._lock:
+            self._roll()
+            return dict(self._usage.get(client_id) or dict.fromkeys(_USAGE_FIELDS, 0))
+
+
+class SQLiteUsageLedger(MemoryUsageLedger):
+    """基于SQLite文件的每日用量，同一台机器上的多个worker进程共享额度"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS client_usage (day TEXT NOT NULL, client TEXT NOT NULL, "
+            "requests INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, "
+            "total_tokens INTEGER NOT NULL, PRIMARY KEY (day, client))"
+        )
+
+    def add(self, client_id: str, usage: Dict[str, Any]) -> None:
+        values = [int(usage.get(field) or 0) for field in _USAGE_FIELDS[1:]]
+        day = _today()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO client_usage (day, client, requests, prompt_tokens, completion_tokens, total_tokens) "
+                "VALUES (?, ?, 1, ?, ?, ?) ON CONFLICT (day, client) DO UPDATE SET requests = requests + 1, "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "total_tokens = total_tokens + excluded.total_tokens",
+                (day, client_id, *values),
+            )
+            if day != self._day:
+                self._day = day
+                self._conn.execute("DELETE FROM client_usage WHERE day < ?", (day,))
+
+    def get(self, client_id: str) -> Dict[str, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT requests, prompt_tokens, completion_tokens, total_tokens FROM client_usage "
+                "WHERE day = ? AND client = ?", (_today(), client_id)
+            ).fetchone()
+        return dict(zip(_USAGE_FIELDS, row or (0, 0, 0, 0)))
+
+
+class FairScheduler:
+    """
+    上游调用的公平调度
+
+    交互通道的请求总是先于批量通道；同一通道内按客户端做加权公平排队(start-time fair queuing)：
+    每个客户端只有最早的请求参与调度，开始标签为 max(虚拟时间, 该客户端上一个获准请求的结束标签)，
+    获准时结束标签推进 预估token数/权重，标签最小的请求先获准。持续大量提交的客户端标签增长快，
+    不会挤占其他客户端；排队超时或被取消的请求不推进标签。
+    同时限制总并发、单个客户端的并发和每日token额度
+    """
+
+    def __init__(self, capacity: int = 0, max_per_client: int = 0, weights: Optional[Dict[str, float]] = None,
+                 daily_tokens: int = 0, daily_token_limits: Optional[Dict[str, int]] = None,
+                 ledger: Optional[MemoryUsageLedger] = None):
+        """
+        Args:
+            capacity: 总并发上限，0 表示不限制
+            max_per_client: 单个客户端的并发上限，0 表示不限制
+            weights: 客户端权重(默认1)，权重为2的客户端获得约两倍的份额
+            daily_tokens: 每个客户端每日的token额度，0 表示不限制
+            daily_token_limits: 个别客户端的每日额度(覆盖 daily_tokens)
+            ledger: 用量记录，默认为进程内存储
+        """
+        self.capacity = capacity
+        self.max_per_client = max_per_client
+        self.weights = weights or {}
+        self.daily_tokens = daily_tokens
+        self.daily_token_limits = daily_token_limits or {}
+        self.ledger = ledger or MemoryUsageLedger()
+        self.in_flight = 0
+        self._client_in_flight: Dict[str, int] = {}
+        self._finish_tags: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        # 每个通道的调度堆，只包含各客户端最早的请求 [开始标签, 序号, 客户端, future, 代价]
+        self._queues: Dict[str, List[list]] = {lane: [] for lane in LANES}
+        # 各(通道, 客户端)按提交顺序排队的请求，队首即调度堆中的请求
+        self._backlogs: Dict[Tuple[str, str], Deque[list]] = {}
+        self._sequence = itertools.count()
+
+    @classmethod
+    def from_env(cls, capacity: int = 0) -> "FairScheduler":
+        """从 LLM_CLIENT_* 环境变量创建"""
+        spec = os.getenv("LLM_CLIENT_USAGE_BACKEND", "memory")
+        ledger = SQLiteUsageLedger(spec[len("sqlite://"):]) if spec.startswith("sqlite://") else MemoryUsageLedger()
+        return cls(
+            capacity=capacity,
+            max_per_client=int(os.getenv("LLM_CLIENT_MAX_CONCURRENCY", 0)),
+            weights={name: float(value) for name, value in parse_mapping(os.getenv("LLM_CLIENT_WEIGHTS")).items()},
+            daily_tokens=int(os.getenv("LLM_CLIENT_DAILY_TOKENS", 0)),
+            daily_token_limits={
+                name: int(value) for name, value in parse_mapping(os.getenv("LLM_CLIENT_DAILY_TOKEN_LIMITS")).items()
+            },
+            ledger=ledger,
+        )
+
+    def daily_limit(self, client_id: str) -> int:
+        return self.daily_token_limits.get(client_id, self.daily_tokens)
+
+    def check_quota(self, client: Client) -> None:
+        """当日额度已用完时抛出 QuotaExceeded"""
+        limit = self.daily_limit(client.id)
+        if not limit:
+            return
+        try:
+            used = self.ledger.get(client.id)["total_tokens"]
+        except sqlite3.OperationalError as e:
+            # 用量存储被其他进程锁住，按可重试的限流处理
+            raise RateLimitExceeded(f"用量存储暂时不可用，请稍后重试: {e}", 1.0)
+        if used >= limit:
+            raise QuotaExceeded(f"今日的token额度({limit})已用完，请明天再试", _seconds_until_tomorrow())
+
+    async def acheck_quota(self, client: Client) -> None:
+        """异步路径的额度检查：SQLite 用量存储的读取在线程中执行"""
+        if self.daily_limit(client.id):
+            await asyncio.to_thread(self.check_quota, client)
+
+    def record_usage(self, client: Client, usage: Dict[str, Any]) -> None:
+        try:
+            self.ledger.add(client.id, usage)
+        except sqlite3.OperationalError as e:
+            # 调用已经完成，记账失败只记录日志
+            print(f"记录客户端用量时出错: {e}")
+
+    def waiting(self, lane: Optional[str] = None) -> int:
+        lanes = [lane] if lane else LANES
+        return sum(
+            1 for (name, _), backlog in self._backlogs.items() if name in lanes
+            for waiter in backlog if not waiter[3].done()
+        )
+
+    def client_in_flight(self, client_id: str) -> int:
+        return self._client_in_flight.get(client_id, 0)
+
+    async def acquire(self, client: Client, cost: float, timeout: float) -> None:
+        """
+        排队等待一个调用名额
+
+        Args:
+            cost: 预估token数，决定该请求推进客户端标签的幅度
+            timeout: 最长排队时间(秒)，超时抛出 RateLimitExceeded
+        """
+        await self.acheck_quota(client)
+        future = asyncio.get_running_loop().create_future()
+        key = (client.lane, client.id)
+        backlog = self._backlogs.setdefault(key, deque())
+        backlog.append([0.0, next(self._sequence), client.id, future, max(cost, 1.0)])
+        if len(backlog) == 1:
+            self._push_head(key)
+        self._dispatch()
+        if future.done():
+            SCHEDULER_WAIT_SECONDS.labels(lane=client.lane).observe(0)
+            return
+        started = time.monotonic()
+        try:
+            # shield: 超时不会取消名额，下面判断超时的同时是否已经获准
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            # 未获准的请求在调度时跳过，标签不推进
+            if not future.done():
+                future.cancel()
+                raise RateLimitExceeded("并发请求过多，请稍后重试", 1.0)
+        except BaseException:
+            # 调用方被取消：已获准时归还名额
+            if future.done():
+                self.release(client)
+            else:
+                future.cancel()
+            raise
+        finally:
+            SCHEDULER_WAIT_SECONDS.labels(lane=client.lane).observe(time.monotonic() - started)
+
+    def release(self, client: Client) -> None:
+        """调用结束，归还名额并让下一个请求开始"""
+        self.in_flight -= 1
+        remaining = self._client_in_flight.get(client.id, 0) - 1
+        if remaining > 0:
+            self._client_in_flight[client.id] = remaining
+        else:
+            self._client_in_flight.pop(client.id, None)
+        self._dispatch()
+
+    def _eligible(self, client_id: str) -> bool:
+        return not self.max_per_client or self._client_in_flight.get(client_id, 0) < self.max_per_client
+
+    def _push_head(self, key: Tuple[str, str]) -> None:
+        """把客户端最早的未取消请求放入通道的调度堆，开始标签按当前的虚拟时间和结束标签计算"""
+        backlog = self._backlogs.get(key)
+        while backlog and backlog[0][3].done():
+            backlog.popleft()
+        if not backlog:
+            self._backlogs.pop(key, None)
+            return
+        lane, client_id = key
+        head = backlog[0]
+        head[0] = max(self._virtual_time, self._finish_tags.get(client_id, 0.0))
+        heapq.heappush(self._queues[lane], head)
+
+    def _dispatch(self) -> None:
+        """按通道优先级和标签顺序放行排队的请求，直到没有空闲名额"""
+        while not self.capacity or self.in_flight < self.capacity:
+            found = self._next_waiter()
+            if found is None:
+                break
+            lane, (start, _, client_id, future, cost) = found
+            self._backlogs[(lane, client_id)].popleft()
+            self.in_flight += 1
+            self._client_in_flight[client_id] = self._client_in_flight.get(client_id, 0) + 1
+            # 获准时才推进该客户端的结束标签
+            self._finish_tags[client_id] = start + cost / self.weights.get(client_id, 1.0)
+            self._virtual_time = max(self._virtual_time, start)
+            future.set_result(None)
+            self._push_head((lane, client_id))
+        if len(self._finish_tags) > 1024:
+            # 标签不超过虚拟时间的客户端与新客户端等价，删除以免无限增长
+            self._finish_tags = {k: v for k, v in self._finish_tags.items() if v > self._virtual_time}
+
+    def _next_waiter(self) -> Optional[Tuple[str, list]]:
+        for lane in LANES:
+            queue = self._queues[lane]
+            skipped = []
+            found = None
+            while queue:
+                waiter = heapq.heappop(queue)
+                if waiter[3].done():
+                    # 已超时或被取消：由该客户端的下一个请求接替
+                    self._push_head((lane, waiter[2]))
+                    continue
+                if self._eligible(waiter[2]):
+                    found = waiter
+                    break
+                skipped.append(waiter)
+            for waiter in skipped:
+                heapq.heappush(queue, waiter)
+            if found is not None:
+                return lane, found
+        return None
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity or None,
+            "max_per_client": self.max_per_client or None,
+            "in_flight": self.in_flight,
+            "clients_in_flight": len(self._client_in_flight),
+            "waiting": {lane: self.waiting(lane) for lane in LANES},
+            "daily_tokens": self.daily_tokens or None,
+            "ledger": type(self.ledger).__name__,
+        }
+
+
+class BucketSpec:
+    """令牌桶参数：每秒补充速率和桶容量"""
+
+    def __init__(self, name: str, per_minute: float, burst_fraction: float = 0.1):
+        self.name = name
+        self.rate = per_minute / 60.0
+        # 桶容量为每分钟额度的一部分，避免瞬时突发打满上游
+        self.capacity = max(1.0, per_minute * burst_fraction)
+
+
+class MemoryBucketBackend:
+    """进程内令牌桶存储"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, requests: List[Tuple[BucketSpec, float]], max_wait: float) -> Tuple[bool, float]:
+        """
+        原子地在多个桶中预留令牌；允许令牌为负(排队)，等待时间超过 max_wait 时拒绝
+
+        Returns:
+            (是否预留成功, 需要等待的秒数)
+        """
+        with self._lock:
+            now = time.time()
+            states = {spec.name: self._refilled(spec, now) for spec, _ in requests}
+            wait = max(
+                (max(0.0, amount - states[spec.name]) / spec.rate for spec, amount in requests),
+                default=0.0,
+            )
+            if wait > max_wait:
+                return False, wait
+            for spec, amount in requests:
+                self._buckets[spec.name] = (states[spec.name] - amount, now)
+            return True, wait
+
+    def refund(self, spec: BucketSpec, amount: float) -> None:
+        with self._lock:
+            now = time.time()
+            self._buckets[spec.name] = (min(spec.capacity, self._refilled(spec, now) + amount), now)
+
+    def _refilled(self, spec: BucketSpec, now: float) -> float:
+        tokens, updated_at = self._buckets.get(spec.name, (spec.capacity, now))
+        return min(spec.capacity, tokens + (now - updated_at) * spec.rate)
+
+
+class SQLiteBucketBackend(MemoryBucketBackend):
+    """基于SQLite文件的令牌桶存储，同一台机器上的多个worker进程共享额度"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _load(self) -> None:
+        self._buckets = {
+            name: (tokens, updated_at)
+            for name, tokens, updated_at in self._conn.execute("SELECT name, tokens, updated_at FROM buckets")
+        }
+
+    def _store(self, names: List[str]) -> None:
+        for name in names:
+            tokens, updated_at = self._buckets[name]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (name, tokens, updated_at),
+            )
+
+    def reserve(self, requests: List[Tuple[BucketSpec, float]], max_wait: float) -> Tuple[bool, float]:
+        with self._lock:
+            # BEGIN IMMEDIATE 获取写锁，保证跨进程的读-改-写是原子的
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._load()
+                now = time.time()
+                states = {spec.name: self._refilled(spec, now) for spec, _ in requests}
+                wait = max(
+                    (max(0.0, amount - states[spec.name]) / spec.rate for spec, amount in requests),
+                    default=0.0,
+                )
+                if wait <= max_wait:
+                    for spec, amount in requests:
+                        self._buckets[spec.name] = (states[spec.name] - amount, now)
+                    self._store([spec.name for spec, _ in requests])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return wait <= max_wait, wait
+
+    def refund(self, spec: BucketSpec, amount: float) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._load()
+                now = time.time()
+                self._buckets[spec.name] = (min(spec.capacity, self._refilled(spec, now) + amount), now)
+                self._store([spec.name])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class AdmissionTicket:
+    """一次获准的上游调用，调用结束后用实际用量修正令牌并记入客户端的每日用量"""
+
+    def __init__(self, controller: "AdmissionController", reserved_tokens: float, client: Optional[Client] = None):
+        self.controller = controller
+        self.reserved_tokens = reserved_tokens
+        self.client = client or current_client()
+
+    def settle(self, usage: Optional[Dict[str, Any]]) -> None:
+        """根据API返回的 usage 字段退还多预留的token额度，并按客户端记账"""
+        if not usage:
+            return
+        self.controller.scheduler.record_usage(self.client, usage)
+        spec = self.controller.tokens_spec
+        if spec is None or "total_tokens" not in usage:
+            return
+        unused = self.reserved_tokens - usage["total_tokens"]
+        if unused > 0:
+            try:
+                self.controller.backend.refund(spec, unused)
+            except sqlite3.OperationalError as e:
+                # 退还失败只会让限流略偏保守，不影响已完成的调用
+                print(f"退还token额度时出错: {e}")
+
+    async def asettle(self, usage: Optional[Dict[str, Any]]) -> None:
+        """异步调用路径的 settle：共享存储的写入在线程中执行，不阻塞事件循环"""
+        if usage:
+            await asyncio.to_thread(self.settle, usage)
+
+
+class AdmissionController:
+    """
+    上游调用的准入控制：按每分钟请求数/token数限流，
+    并由 FairScheduler 按客户端公平分配单个worker的并发名额；排队超过上限时拒绝(429)
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_concurrency: int = 0,
+                 max_wait: float = 10.0, backend: Optional[MemoryBucketBackend] = None,
+                 scheduler: Optional[FairScheduler] = None):
+        self.requests_spec = BucketSpec("requests", rpm) if rpm > 0 else None
+        self.tokens_spec = BucketSpec("tokens", tpm) if tpm > 0 else None
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.backend = backend or MemoryBucketBackend()
+        # 并发名额的排队顺序、单客户端并发和每日额度(默认只限制总并发)
+        self.scheduler = scheduler or FairScheduler(capacity=max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """从 LLM_RATE_LIMIT_*、LLM_CLIENT_* 等环境变量创建"""
+        spec = os.getenv("LLM_RATE_LIMIT_BACKEND", "memory")
+        if spec.startswith("sqlite://"):
+            backend = SQLiteBucketBackend(spec[len("sqlite://"):])
+        else:
+            backend = MemoryBucketBackend()
+        max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", 0))
+        return cls(
+            rpm=float(os.getenv("LLM_RATE_LIMIT_RPM", 0)),
+            tpm=float(os.getenv("LLM_RATE_LIMIT_TPM", 0)),
+            max_concurrency=max_concurrency,
+            max_wait=float(os.getenv("LLM_ADMISSION_MAX_WAIT", 10)),
+            backend=backend,
+            scheduler=FairScheduler.from_env(max_concurrency),
+        )
+
+    def _reserve(self, estimated_tokens: float, max_wait: float, client: Client) -> Tuple[AdmissionTicket, float]:
+        requests = []
+        if self.requests_spec is not None:
+            requests.append((self.requests_spec, 1.0))
+        if self.tokens_spec is not None:
+            requests.append((self.tokens_spec, estimated_tokens))
+        if not requests:
+            return AdmissionTicket(self, 0, client), 0.0
+        try:
+            granted, wait = self.backend.reserve(requests, max_wait)
+        except sqlite3.OperationalError as e:
+            # 共享存储被其他进程长时间锁住，按可重试的限流处理
+            self.rejected += 1
+            raise RateLimitExceeded(f"限流存储暂时不可用，请稍后重试: {e}", 1.0)
+        if not granted:
+            self.rejected += 1
+            raise RateLimitExceeded("请求过多，超出上游调用额度，请稍后重试", wait)
+        return AdmissionTicket(self, estimated_tokens, client), wait
+
+    @asynccontextmanager
+    async def acquire(self, estimated_tokens: float, max_wait: Optional[float] = None):
+        """
+        获取一次上游调用的许可，调用归属于当前客户端(见 client_scope)
+
+        Args:
+            estimated_tokens: 预估的输入+输出token数
+            max_wait: 最长排队时间(秒)，默认使用 max_wait 配置
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        client = current_client()
+        self.waiting += 1
+        acquired = False
+        try:
+            try:
+                await self.scheduler.acquire(client, estimated_tokens, max_wait)
+            except RateLimitExceeded:
+                self.rejected += 1
+                raise
+            acquired = True
+            # SQLite 令牌桶的写事务可能等待其他进程的锁，在线程中执行
+            ticket, wait = await asyncio.to_thread(
+                self._reserve, estimated_tokens, max(0.0, deadline - time.monotonic()), client
+            )
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            if acquired:
+                self.scheduler.release(client)
+            raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield ticket
+        finally:
+            self.in_flight -= 1
+            self.scheduler.release(client)
+
+    @contextmanager
+    def acquire_sync(self, estimated_tokens: float, max_wait: Optional[float] = None):
+        """同步调用路径的许可(只做限流和每日额度检查，不限制并发)"""
+        client = current_client()
+        self.scheduler.check_quota(client)
+        ticket, wait = self._reserve(estimated_tokens, self.max_wait if max_wait is None else max_wait, client)
+        if wait > 0:
+            time.sleep(wait)
+        yield ticket
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "rpm": self.requests_spec.rate * 60 if self.requests_spec else None,
+            "tpm": self.tokens_spec.rate * 60 if self.tokens_spec else None,
+            "max_concurrency": self.max_concurrency or None,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "backend": type(self.backend).__name__,
+            "scheduler": self.scheduler.info(),
+        }
@@ -0,0 +1,320 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+from http_client import get_async_client, get_sync_session
+from metrics import UPSTREAM_LATENCY, UPSTREAM_RETRIES, record_usage
+from settings import env_float
+
+
+# 可重试的上游状态码
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """上游不可用(熔断打开或重试耗尽)，对应HTTP 503"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头(秒数或HTTP日期)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """带抖动的指数退避重试策略"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 max_retry_after: float = 30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Retry-After 超过该值时不再等待，直接失败
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次(从0开始)失败后的等待时间；优先遵守 Retry-After"""
+        if retry_after is not None:
+            return retry_after
+        # full jitter: [0, min(max_delay, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后打开，冷却后放行一次探测请求"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.recovery_timeout - time.monotonic())
+
+    def before_call(self) -> None:
+        """请求前检查，熔断打开时立即抛出 UpstreamUnavailable"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    raise UpstreamUnavailable("上游服务暂时不可用(熔断中)，请稍后重试", self.retry_after())
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                # 探测请求被取消时不会回报结果，超过冷却时间后允许新的探测
+                probe_alive = time.monotonic() - self._probe_started_at < self.recovery_timeout
+                if self._probe_in_flight and probe_alive:
+                    raise UpstreamUnavailable("上游服务正在恢复中，请稍后重试", 1.0)
+                self._probe_in_flight = True
+                self._probe_started_at = time.monotonic()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def info(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "retry_after": round(self.retry_after(), 1)}
+
+
+class LatencyTracker:
+    """记录最近的上游延迟，用于计算对冲请求的触发时间"""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+
+class ResilientTransport:
+    """
+    上游调用的弹性层：重试(指数退避+抖动，遵守Retry-After)、
+    连接/读取分离的超时、可选的对冲请求和熔断器
+    """
+
+    def __init__(self):
+        self.retry = RetryPolicy(
+            max_attempts=int(env_float("LLM_MAX_ATTEMPTS", 3)),
+            base_delay=env_float("LLM_RETRY_BASE_DELAY", 0.5),
+            max_delay=env_float("LLM_RETRY_MAX_DELAY", 8.0),
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(env_float("LLM_BREAKER_THRESHOLD", 5)),
+            recovery_timeout=env_float("LLM_BREAKER_RESET", 30.0),
+        )
+        self.latency = LatencyTracker()
+        self.connect_timeout = env_float("LLM_CONNECT_TIMEOUT", 5.0)
+        self.read_timeout = env_float("LLM_READ_TIMEOUT", 60.0)
+        # 所有重试加起来的总时限
+        self.total_timeout = env_float("LLM_TOTAL_TIMEOUT", 90.0)
+        # 延迟超过该百分位时发出对冲请求，0 表示关闭
+        self.hedge_percentile = env_float("LLM_HEDGE_PERCENTILE", 0)
+        self.hedge_min_samples = 20
+
+    @property
+    def httpx_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def _classify(self, status_code: int) -> bool:
+        """返回该状态码是否可重试；5xx计入熔断失败"""
+        if status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            # 4xx 说明上游可达
+            self.breaker.record_success()
+        return status_code in RETRYABLE_STATUSES
+
+    def _next_delay(self, attempt: int, retry_after: Optional[float], deadline: float) -> Optional[float]:
+        """计算下次重试前的等待时间，不能重试时返回None"""
+        if attempt + 1 >= self.retry.max_attempts:
+            return None
+        if retry_after is not None and retry_after > self.retry.max_retry_after:
+            return None
+        delay = self.retry.delay(attempt, retry_after)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_percentile or len(self.latency.samples) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    async def _asend(self, url: str, headers: Dict[str, str], body: str) -> httpx.Response:
+        started = time.monotonic()
+        try:
+            response = await get_async_client().post(url, headers=headers, content=body, timeout=self.httpx_timeout)
+        except httpx.TransportError:
+            UPSTREAM_LATENCY.labels(status="error").observe(time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        UPSTREAM_LATENCY.labels(status=response.status_code).observe(elapsed)
+        if response.status_code < 400:
+            self.latency.record(elapsed)
+        return response
+
+    async def _ahedged_send(self, url: str, headers: Dict[str, str], body: str) -> httpx.Response:
+        """
+        发送请求；首个请求慢于历史延迟百分位时再发一个对冲请求，取先成功者
+
+        错误响应(429/5xx)不会提前返回，等另一个请求也结束后才交给调用方重试
+        """
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await self._asend(url, headers, body)
+
+        tasks = [asyncio.ensure_future(self._asend(url, headers, body))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(self._asend(url, headers, body)))
+            last_error: Optional[BaseException] = None
+            error_response: Optional[httpx.Response] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                    elif task.result().status_code < 400:
+                        return task.result()
+                    else:
+                        error_response = task.result()
+            if error_response is not None:
+                return error_response
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def apost_json(self, url: str, headers: Dict[str, str], body: str) -> Dict[str, Any]:
+        """异步POST并返回JSON，失败时按策略重试"""
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            retry_after = None
+            try:
+                response = await self._ahedged_send(url, headers, body)
+            except httpx.TransportError as e:
+                # 连接失败、超时等
+                self.breaker.record_failure()
+                error: Exception = e
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    result = response.json()
+                    record_usage(result.get("usage"))
+                    return result
+                if not self._classify(response.status_code):
+                    response.raise_for_status()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = httpx.HTTPStatusError(
+                    f"上游返回 {response.status_code}", request=response.request, response=response
+                )
+
+            delay = self._next_delay(attempt, retry_after, deadline)
+            if delay is None:
+                raise UpstreamUnavailable(f"上游服务暂时不可用: {error}", retry_after or self.breaker.retry_after() or None)
+            print(f"调用上游失败，{delay:.2f}秒后重试({attempt + 1}/{self.retry.max_attempts}): {error}")
+            UPSTREAM_RETRIES.inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def post_json(self, url: str, headers: Dict[str, str], body: str) -> Dict[str, Any]:
+        """同步POST并返回JSON，失败时按策略重试(不做对冲)"""
+        import requests
+
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            retry_after = None
+            try:
+                started = time.monotonic()
+                response = get_sync_session().post(
+                    url, headers=headers, data=body, timeout=(self.connect_timeout, self.read_timeout)
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                UPSTREAM_LATENCY.labels(status="error").observe(time.monotonic() - started)
+                self.breaker.record_failure()
+                error: Exception = e
+            else:
+                elapsed = time.monotonic() - started
+                UPSTREAM_LATENCY.labels(status=response.status_code).observe(elapsed)
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    self.latency.record(elapsed)
+                    result = response.json()
+                    record_usage(result.get("usage"))
+                    return result
+                if not self._classify(response.status_code):
+                    response.raise_for_status()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = requests.HTTPError(f"上游返回 {response.status_code}", response=response)
+
+            delay = self._next_delay(attempt, retry_after, deadline)
+            if delay is None:
+                raise UpstreamUnavailable(f"上游服务暂时不可用: {error}", retry_after or self.breaker.retry_after() or None)
+            print(f"调用上游失败，{delay:.2f}秒后重试({attempt + 1}/{self.retry.max_attempts}): {error}")
+            UPSTREAM_RETRIES.inc()
+            time.sleep(delay)
+            attempt += 1
+
+
+_transports: Dict[str, ResilientTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(base_url: str) -> ResilientTransport:
+    """按上游地址获取共享的弹性层，同一上游的所有客户端共用熔断器和延迟统计"""
+    with _transports_lock:
+        transport = _transports.get(base_url)
+        if transport is None:
+            transport = _transports[base_url] = ResilientTransport()
+        return transport
@@ -0,0 +1,17 @@
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    """读取整数环境变量，缺失或非法时使用默认值"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """读取浮点数环境变量，缺失或非法时使用默认值"""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
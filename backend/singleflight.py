@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import REGISTRY
+
+
+COALESCED = REGISTRY.counter(
+    "singleflight_coalesced_total", "与进行中的相同请求合并、未单独调用上游的次数", ["name"]
+)
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用：同一时刻只执行一次，其余调用方等待同一个结果
+
+    共享的调用在独立任务中执行，调用方被取消(例如客户端断开)时只取消自己的等待，
+    不影响其他调用方；所有调用方都离开时任务仍会完成，结果可以写入缓存供重试使用
+    """
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tasks) + len(self._futures)
+
+    def inflight(self, key: str) -> Optional[asyncio.Task]:
+        """返回该键正在进行的异步调用(没有时返回None)"""
+        return self._tasks.get(key)
+
+    def tasks(self) -> List[asyncio.Task]:
+        """当前进行中的异步调用(用于关闭前等待其完成)"""
+        return list(self._tasks.values())
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入一次异步调用
+
+        Args:
+            key: 合并键，相同键的并发调用只执行一次
+            func: 返回协程的函数，只有第一个调用方会执行
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            COALESCED.labels(name=self.name).inc()
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # 所有调用方都已取消时，避免 "Task exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def do_sync(self, key: str, func: Callable[[], Any]) -> Any:
+        """同步版本：第一个线程执行调用，其余线程阻塞等待同一结果"""
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+        if not leader:
+            COALESCED.labels(name=self.name).inc()
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._futures.pop(key, None)
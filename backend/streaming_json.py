@@ -0,0 +1,103 @@
+import json
+from typing import List, Optional, Tuple
+
+
+class IncrementalAnalysisParser:
+    """
+    增量JSON解析器：边接收模型输出边解析，
+    summary、keywords 和 suggestions 中的每一项一旦完整即产出事件
+    """
+
+    # 数组字段 -> 单项事件名
+    LIST_FIELDS = {"keywords": "keyword", "suggestions": "suggestion"}
+    STRING_FIELDS = {"summary": "summary"}
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.finished = False
+        self.in_string = False
+        self.escaped = False
+        self.string_chars: List[str] = []
+        self.expect_key = False
+        self.current_key: Optional[str] = None
+        # 记录每层容器类型，'{' 或 '['
+        self.containers: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        输入一段模型输出
+
+        Returns:
+            新完成的 (事件名, 值) 列表
+        """
+        events = []
+        for ch in chunk:
+            if self.finished:
+                break
+            if self.in_string:
+                self._feed_string_char(ch, events)
+            elif not self.started:
+                # 忽略第一个 '{' 之前的内容(例如 ```json)
+                if ch == '{':
+                    self.started = True
+                    self._open('{')
+            else:
+                self._feed_structural_char(ch)
+        return events
+
+    def _open(self, container: str) -> None:
+        self.containers.append(container)
+        self.depth += 1
+        if self.depth == 1:
+            self.expect_key = True
+
+    def _close(self) -> None:
+        if self.containers:
+            self.containers.pop()
+        self.depth -= 1
+        if self.depth == 0:
+            self.finished = True
+
+    def _feed_structural_char(self, ch: str) -> None:
+        if ch == '"':
+            self.in_string = True
+            self.string_chars = []
+        elif ch in '{[':
+            self._open(ch)
+        elif ch in '}]':
+            self._close()
+        elif ch == ':' and self.depth == 1:
+            self.expect_key = False
+        elif ch == ',' and self.depth == 1:
+            self.expect_key = True
+            self.current_key = None
+
+    def _feed_string_char(self, ch: str, events: List[Tuple[str, str]]) -> None:
+        if self.escaped:
+            self.escaped = False
+            self.string_chars.append(ch)
+        elif ch == '\\':
+            self.escaped = True
+            self.string_chars.append(ch)
+        elif ch == '"':
+            self.in_string = False
+            self._on_string(self._decode("".join(self.string_chars)), events)
+        else:
+            self.string_chars.append(ch)
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return raw
+
+    def _on_string(self, value: str, events: List[Tuple[str, str]]) -> None:
+        if self.depth == 1:
+            if self.expect_key:
+                self.current_key = value
+            elif self.current_key in self.STRING_FIELDS:
+                events.append((self.STRING_FIELDS[self.current_key], value))
+        elif self.depth == 2 and self.containers[-1] == '[' and self.current_key in self.LIST_FIELDS:
+            events.append((self.LIST_FIELDS[self.current_key], value))
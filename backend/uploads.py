@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional
+
+from starlette.datastructures import UploadFile
+
+from extractors import Source
+from settings import env_int
+
+
+# 每次读取的块大小
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """上传文件超出大小限制，对应HTTP 413"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"文件过大，最大支持 {max_bytes // (1024 * 1024)} MB")
+        self.max_bytes = max_bytes
+
+
+class UploadLimits:
+    """上传大小限制配置"""
+
+    def __init__(self, max_bytes: Optional[int] = None, spool_threshold: Optional[int] = None,
+                 max_request_bytes: Optional[int] = None, max_batch_request_bytes: Optional[int] = None,
+                 spool_dir: Optional[str] = None):
+        """
+        Args:
+            max_bytes: 单个文件的大小上限
+            spool_threshold: 超过该大小的文件写入临时文件，否则留在内存
+            max_request_bytes: 单文件上传请求体上限(按Content-Length提前拒绝)
+            max_batch_request_bytes: 批量上传请求体上限
+            spool_dir: 临时文件目录，默认使用系统临时目录
+        """
+        self.max_bytes = max_bytes or env_int("UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+        self.spool_threshold = spool_threshold if spool_threshold is not None else env_int(
+            "UPLOAD_SPOOL_THRESHOLD", 1024 * 1024
+        )
+        # multipart 边界和表单字段的额外开销
+        self.max_request_bytes = max_request_bytes or self.max_bytes + 64 * 1024
+        self.max_batch_request_bytes = max_batch_request_bytes or env_int(
+            "BATCH_MAX_UPLOAD_BYTES", 100 * 1024 * 1024
+        )
+        self.spool_dir = spool_dir or os.getenv("UPLOAD_SPOOL_DIR") or None
+
+
+class IngestedUpload:
+    """已接收的上传文件：小文件留在内存，大文件在临时文件中，解析器直接读取"""
+
+    def __init__(self, filename: str, size: int, sha256: str,
+                 data: Optional[bytes] = None, path: Optional[str] = None):
+        self.filename = filename
+        self.extension = filename.split('.')[-1].lower()
+        self.size = size
+        self.sha256 = sha256
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self) -> Source:
+        return self.data if self.data is not None else self.path
+
+    def read_bytes(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        """删除临时文件"""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self.data = None
+
+
+def _copy_upload(src: BinaryIO, filename: str, limits: UploadLimits) -> IngestedUpload:
+    """分块读取上传内容，同时计算指纹；超过阈值后转存到临时文件"""
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spool = None
+    size = 0
+    try:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limits.max_bytes:
+                raise UploadTooLarge(limits.max_bytes)
+            digest.update(chunk)
+            if spool is None and len(buffer) + len(chunk) > limits.spool_threshold:
+                spool = tempfile.NamedTemporaryFile(prefix="upload-", dir=limits.spool_dir, delete=False)
+                spool.write(buffer)
+                buffer = bytearray()
+            if spool is not None:
+                spool.write(chunk)
+            else:
+                buffer.extend(chunk)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        raise
+
+    if spool is not None:
+        spool.close()
+        return IngestedUpload(filename, size, digest.hexdigest(), path=spool.name)
+    return IngestedUpload(filename, size, digest.hexdigest(), data=bytes(buffer))
+
+
+async def ingest_upload(file: UploadFile, limits: UploadLimits) -> IngestedUpload:
+    """
+    分块接收上传文件，超出大小上限时抛出 UploadTooLarge
+
+    Args:
+        file: FastAPI/Starlette 的上传文件
+        limits: 大小限制配置
+
+    Returns:
+        IngestedUpload，使用完毕后需调用 close()
+    """
+    await file.seek(0)
+    # 上传内容可能已被Starlette转存到磁盘，读取和写入都在线程中完成
+    return await asyncio.to_thread(_copy_upload, file.file, file.filename or "", limits)
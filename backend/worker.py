@@ -0,0 +1,182 @@
+"""
+异步分析任务的worker进程：从持久化队列(jobs.py)领取任务，解析文件并调用 DeepSeekWrapper 分析
+
+用法:
+    cd backend && python worker.py --processes 2
+
+API进程(POST /api/jobs)只负责写入队列，分析耗时不再占用HTTP连接。
+收到 SIGTERM/SIGINT 后完成当前任务再退出；被强制杀死时，任务在租约到期后由其他worker重新领取
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache import TieredCache
+from deepseek_wrapper import DeepSeekWrapper
+from extractors import ExtractionError, extract_text
+from jobs import JobStore
+from keywords import KeywordExtractor
+from matching import MatchIndex
+from quick_analysis import TIER_LLM, TIER_LOCAL, QuickAnalyzer
+from rate_limit import LANE_BULK, AdmissionController, RateLimitExceeded, client_scope
+from resilience import UpstreamUnavailable
+from settings import env_float
+
+
+class JobWorker:
+    """单个worker进程的任务循环"""
+
+    def __init__(self, store: JobStore, wrapper: DeepSeekWrapper, name: str,
+                 poll_interval: Optional[float] = None, job_ttl: Optional[float] = None,
+                 match_index: Optional[MatchIndex] = None):
+        self.store = store
+        self.wrapper = wrapper
+        # 分析完成的简历加入职位匹配索引(可选)
+        self.match_index = match_index
+        self.name = name
+        self.poll_interval = poll_interval or env_float("JOB_POLL_INTERVAL", 1.0)
+        self.job_ttl = job_ttl or env_float("JOB_TTL", 7 * 24 * 3600)
+        self.extraction_timeout = env_float("EXTRACTION_TIMEOUT", 20.0)
+        self.extraction_max_tokens = int(env_float("EXTRACTION_MAX_TOKENS", 16000))
+        self.stopping = False
+
+    def stop(self, *_) -> None:
+        self.stopping = True
+
+    def run(self) -> None:
+        print(f"worker {self.name} 已启动，队列: {self.store.path}")
+        last_prune = 0.0
+        last_heartbeat = 0.0
+        # 心跳间隔远小于租约，API在一个租约时长内没有收到心跳时才认为没有worker
+        heartbeat_interval = max(self.poll_interval, min(30.0, self.store.lease_seconds / 4))
+        # 多进程模式下父进程被强制杀死时随之退出，不留下孤儿进程
+        parent = multiprocessing.parent_process()
+        while not self.stopping and (parent is None or parent.is_alive()):
+            if time.monotonic() - last_prune > 3600:
+                last_prune = time.monotonic()
+                self.store.prune(self.job_ttl)
+            if time.monotonic() - last_heartbeat > heartbeat_interval:
+                last_heartbeat = time.monotonic()
+                self.store.heartbeat(self.name)
+            job = self.store.claim(self.name)
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+            self.process(job)
+        self.store.retire(self.name)
+        self.store.close()
+        print(f"worker {self.name} 已退出")
+
+    def process(self, job) -> None:
+        try:
+            text = extract_text(
+                job["content"], job["extension"],
+                time_limit=self.extraction_timeout, max_tokens=self.extraction_max_tokens,
+            )
+            if not text.strip():
+                raise ExtractionError("无法从文件中提取有效文本内容。")
+        except ExtractionError as e:
+            # 文件本身的问题，重试也不会成功
+            self.store.fail(job["id"], str(e))
+            return
+        except Exception as e:
+            print(f"解析任务 {job['id']} 的文件时出错: {e}")
+            self.store.fail(job["id"], f"文件解析失败: {e}")
+            return
+
+        # 先记录本地快速分析结果，轮询的客户端在模型分析完成前即可显示(tier=local)
+        if self.wrapper.quick_analyzer is not None:
+            try:
+                self.store.set_partial(job["id"], self.wrapper.quick_analyzer.analyze(text))
+            except Exception as e:
+                print(f"本地快速分析任务 {job['id']} 时出错: {e}")
+
+        try:
+            # 以提交者的名义调用上游：计入其每日额度，并按其权重和通道参与公平调度
+            with client_scope(job["client"] or "jobs", job["lane"] or LANE_BULK):
+                result = self.wrapper.analyze_resume(text)
+        except (UpstreamUnavailable, RateLimitExceeded) as e:
+            # 上游暂时不可用或限流：按 Retry-After 延迟后重新排队
+            delay = max(1.0, math.ceil(getattr(e, "retry_after", 0) or 0))
+            self.store.retry(job["id"], str(e), delay=delay)
+            return
+        except Exception as e:
+            print(f"分析任务 {job['id']} 时出错: {e}")
+            self.store.retry(job["id"], f"调用 DeepSeek 分析服务时出错: {e}", delay=self.poll_interval)
+            return
+        if result.get("tier") == TIER_LOCAL:
+            # 模型分析失败时包装器返回本地结果，任务保留该部分结果并重新排队等待模型分析
+            self.store.retry(job["id"], "模型分析失败，暂时只有本地快速分析结果", delay=self.poll_interval)
+            return
+        analysis = {
+            "summary": result.get("summary", "未能生成摘要"),
+            "keywords": result.get("keywords", []),
+            "suggestions": result.get("suggestions", []),
+            "tier": result.get("tier", TIER_LLM),
+        }
+        self.store.complete(job["id"], analysis)
+        if self.match_index is not None:
+            try:
+                self.match_index.add(text, analysis, job["filename"])
+            except Exception as e:
+                print(f"写入匹配索引时出错: {e}")
+
+
+def run_worker(index: int) -> None:
+    """worker进程入口：每个进程创建自己的队列连接、上游连接池和缓存"""
+    load_dotenv()
+    keyword_extractor = KeywordExtractor.from_env()
+    wrapper = DeepSeekWrapper(
+        admission=AdmissionController.from_env(),
+        cache=TieredCache.from_env("ANALYSIS_CACHE", name="analysis"),
+        keyword_extractor=keyword_extractor if os.getenv("KEYWORD_SOURCE", "local") == "local" else None,
+        quick_analyzer=QuickAnalyzer.from_env(keyword_extractor),
+    )
+    match_index = MatchIndex.from_env() if os.getenv("MATCH_AUTO_INDEX", "true").lower() == "true" else None
+    worker = JobWorker(
+        JobStore.from_env(), wrapper, name=f"{socket.gethostname()}:{os.getpid()}:{index}", match_index=match_index
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="异步简历分析任务worker")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("JOB_WORKERS", 0) or 1),
+                        help="worker进程数(默认 JOB_WORKERS 或 1)")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(0)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(i,), name=f"job-worker-{i}") for i in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()